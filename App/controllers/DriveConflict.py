@@ -0,0 +1,110 @@
+from App.models import Drive
+from App.database import db
+from App.utils.intervals import IntervalIndex
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import select
+
+MAX_DURATION_MINUTES = 240
+
+
+def max_drive_duration():
+    return current_app.config.get("DRIVE_MAX_DURATION_MINUTES", MAX_DURATION_MINUTES)
+
+
+def check_duration(duration_minutes):
+    limit = max_drive_duration()
+    if (
+        isinstance(duration_minutes, bool)
+        or not isinstance(duration_minutes, int)
+        or not 1 <= duration_minutes <= limit
+    ):
+        raise ValueError(f"Duration must be between 1 and {limit} minutes.")
+    return duration_minutes
+
+
+def load_driver_intervals(driver_id, start, end, exclude_drive_ids=()):
+    """
+    Builds an IntervalIndex of the driver's drives that could overlap
+    [start, end), from one range query on (driver_id, scheduled_time).
+    A drive is never longer than the maximum duration, so nothing starting
+    earlier than that before start can reach into the window.
+    """
+    rows = db.session.execute(
+        select(Drive.id, Drive.scheduled_time, Drive.duration_minutes).where(
+            Drive.driver_id == driver_id,
+            Drive.scheduled_time >= start - timedelta(minutes=max_drive_duration()),
+            Drive.scheduled_time < end,
+        )
+    )
+    excluded = set(exclude_drive_ids)
+    return IntervalIndex(
+        (
+            row.scheduled_time,
+            row.scheduled_time + timedelta(minutes=row.duration_minutes),
+            row.id,
+        )
+        for row in rows
+        if row.id not in excluded
+    )
+
+
+def find_drive_conflicts(driver_id, slots, exclude_drive_ids=()):
+    """
+    Checks (scheduled_time, duration_minutes) slots for the driver against
+    their existing drives and against each other. Returns one entry per
+    clashing slot: its position in slots and the drive it clashes with
+    (None when that is an earlier slot).
+    """
+    if not slots:
+        return []
+    slots = [
+        (start, start + timedelta(minutes=duration), position)
+        for position, (start, duration) in enumerate(slots)
+    ]
+    index = load_driver_intervals(
+        driver_id,
+        min(start for start, end, position in slots),
+        max(end for start, end, position in slots),
+        exclude_drive_ids,
+    )
+    conflicts = []
+    for start, end, position in slots:
+        overlap = index.find_overlap(start, end)
+        if overlap is None:
+            # Accepted slots block the ones after them
+            index.add(start, end, ("slot", position))
+            continue
+        clash_start, clash_end, key = overlap
+        conflicts.append(
+            {
+                "slot": position,
+                "scheduled_time": start,
+                "end_time": end,
+                "conflicting_drive_id": None if isinstance(key, tuple) else key,
+                "conflicting_start": clash_start,
+                "conflicting_end": clash_end,
+            }
+        )
+    return conflicts
+
+
+def check_drive_conflicts(driver_id, slots, exclude_drive_ids=()):
+    """Raises ValueError describing the first clash, if any slot has one."""
+    conflicts = find_drive_conflicts(driver_id, slots, exclude_drive_ids)
+    if conflicts:
+        raise ValueError(describe_conflict(conflicts[0]))
+
+
+def describe_conflict(conflict):
+    start = conflict["scheduled_time"].strftime("%Y-%m-%d %H:%M")
+    clash = (
+        f"drive {conflict['conflicting_drive_id']}"
+        if conflict["conflicting_drive_id"]
+        else "another drive being scheduled"
+    )
+    return (
+        f"Drive at {start} overlaps {clash} "
+        f"({conflict['conflicting_start'].strftime('%Y-%m-%d %H:%M')}"
+        f"-{conflict['conflicting_end'].strftime('%H:%M')})"
+    )
@@ -0,0 +1,384 @@
+from App.models import (
+    Driver,
+    Drive,
+    DriveSchedule,
+    StopRequest,
+    DEFAULT_DURATION_MINUTES,
+)
+from App.database import db
+from App.utils.cache import invalidate_reference_data
+from App.utils.recurrence import parse_weekdays, occurrences
+from App.utils.scheduler import start_periodic_task
+from .Street import get_street_id_by_name
+from .DriveConflict import check_duration, find_drive_conflicts, describe_conflict
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+
+def _parse_clock_time(time_str):
+    try:
+        return datetime.strptime(time_str, "%H:%M").time()
+    except (TypeError, ValueError):
+        raise ValueError("Invalid time format. Please use 'HH:MM'.")
+
+
+def _parse_day(day_str):
+    try:
+        return datetime.strptime(day_str, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError("Invalid date format. Please use 'YYYY-MM-DD'.")
+
+
+def _get_owned_schedule(schedule_id, driver_id=None):
+    schedule = db.session.get(DriveSchedule, schedule_id)
+    # Another driver's schedule is reported as missing rather than forbidden
+    if not schedule or (driver_id is not None and schedule.driver_id != driver_id):
+        raise ValueError("Schedule not found")
+    return schedule
+
+
+"""
+Series
+"""
+
+
+def _horizon_end(today, horizon_days=None):
+    if horizon_days is None:
+        horizon_days = current_app.config.get("DRIVE_SCHEDULE_HORIZON_DAYS", 28)
+    return today + timedelta(days=horizon_days)
+
+
+def preview_drive_schedule(
+    driver_id,
+    weekdays,
+    time_str,
+    starts_on=None,
+    ends_on=None,
+    duration_minutes=DEFAULT_DURATION_MINUTES,
+    now=None,
+):
+    """
+    Dry run of create_drive_schedule: the drive times it would create over
+    the horizon and which of them clash with the driver's other drives.
+    """
+    now = now or datetime.now()
+    starts_on = _parse_day(starts_on) if starts_on else now.date()
+    ends_on = _parse_day(ends_on) if ends_on else None
+    if ends_on and ends_on < starts_on:
+        raise ValueError("The series cannot end before it starts.")
+    check_duration(duration_minutes)
+    mask, time_of_day = parse_weekdays(weekdays), _parse_clock_time(time_str)
+
+    last = _horizon_end(now.date())
+    times = [
+        scheduled_time
+        for scheduled_time in occurrences(
+            mask, time_of_day, max(now.date(), starts_on), min(last, ends_on or last)
+        )
+        if scheduled_time >= now
+    ]
+    conflicts = find_drive_conflicts(
+        driver_id, [(scheduled_time, duration_minutes) for scheduled_time in times]
+    )
+    return {"drives": times, "conflicts": conflicts}
+
+
+def create_drive_schedule(
+    driver_id,
+    street_name,
+    weekdays,
+    time_str,
+    starts_on=None,
+    ends_on=None,
+    duration_minutes=DEFAULT_DURATION_MINUTES,
+):
+    """
+    Creates a weekly series of drives, e.g. weekdays "MO,WE,FR" at "09:30",
+    and materializes its drives over the horizon straight away. Refused if
+    any of those drives would overlap one the driver already has.
+    """
+    if not db.session.get(Driver, driver_id):
+        raise ValueError("Driver not found")
+    street_id = get_street_id_by_name(street_name, cached=False)
+    if not street_id:
+        raise ValueError(f"Street '{street_name}' not found")
+
+    preview = preview_drive_schedule(
+        driver_id, weekdays, time_str, starts_on, ends_on, duration_minutes
+    )
+    if preview["conflicts"]:
+        raise ValueError(describe_conflict(preview["conflicts"][0]))
+
+    schedule = DriveSchedule(
+        driver_id,
+        street_id,
+        parse_weekdays(weekdays),
+        _parse_clock_time(time_str),
+        _parse_day(starts_on) if starts_on else date.today(),
+        _parse_day(ends_on) if ends_on else None,
+        duration_minutes,
+    )
+    db.session.add(schedule)
+    db.session.commit()
+    materialize_drive_schedules(schedule_ids=[schedule.id])
+    return schedule
+
+
+def get_drive_schedules_for_driver(driver_id):
+    schedules = db.session.scalars(
+        select(DriveSchedule)
+        .where(DriveSchedule.driver_id == driver_id)
+        .order_by(DriveSchedule.id)
+    )
+    return [schedule.get_json() for schedule in schedules]
+
+
+def _future_drives(schedule, now):
+    return select(Drive.id).where(
+        Drive.schedule_id == schedule.id, Drive.scheduled_time >= now
+    )
+
+
+def _delete_stop_requests(drive_ids):
+    db.session.execute(
+        delete(StopRequest)
+        .where(StopRequest.drive_id.in_(drive_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _delete_drives(drive_ids):
+    # Stop requests for a cancelled drive go with it
+    _delete_stop_requests(drive_ids)
+    db.session.execute(
+        delete(Drive)
+        .where(Drive.id.in_(drive_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def update_drive_schedule(
+    schedule_id,
+    driver_id=None,
+    weekdays=None,
+    time_str=None,
+    street_name=None,
+    ends_on=None,
+    now=None,
+):
+    """
+    Edits a whole series at once. Future drives move to the new time and
+    street in one bulk UPDATE, drives on dropped weekdays, past the new end
+    or whose new time has already gone by are removed, and any newly added
+    days are materialized. Moving to another street drops the moved drives'
+    stop requests, made by residents of the old one. Past drives are left
+    as they were. Refused if a moved drive would overlap another.
+    """
+    schedule = _get_owned_schedule(schedule_id, driver_id)
+    if not schedule.active:
+        raise ValueError("Schedule has been cancelled")
+    now = now or datetime.now()
+
+    # Check every change before applying any of them
+    changes = {}
+    if weekdays is not None:
+        changes["weekday_mask"] = parse_weekdays(weekdays)
+    if time_str is not None:
+        changes["time_of_day"] = _parse_clock_time(time_str)
+    if street_name is not None:
+        changes["street_id"] = get_street_id_by_name(street_name, cached=False)
+        if not changes["street_id"]:
+            raise ValueError(f"Street '{street_name}' not found")
+    if ends_on is not None:
+        # An empty string clears the end date
+        changes["ends_on"] = _parse_day(ends_on) if ends_on else None
+        if changes["ends_on"] and changes["ends_on"] < schedule.starts_on:
+            raise ValueError("The series cannot end before it starts.")
+    mask = changes.get("weekday_mask", schedule.weekday_mask)
+    time_of_day = changes.get("time_of_day", schedule.time_of_day)
+    last_day = changes.get("ends_on", schedule.ends_on)
+
+    drives = db.session.execute(
+        select(Drive.id, Drive.scheduled_time).where(
+            Drive.id.in_(_future_drives(schedule, now))
+        )
+    ).all()
+    street_id = changes.get("street_id", schedule.street_id)
+    street_changed = street_id != schedule.street_id
+    dropped, moved = [], []
+    for drive in drives:
+        day = drive.scheduled_time.date()
+        scheduled_time = datetime.combine(day, time_of_day)
+        if (
+            not mask >> day.weekday() & 1
+            or (last_day and day > last_day)
+            # Today's drive moved to a time that has already passed
+            or scheduled_time < now
+        ):
+            dropped.append(drive.id)
+        else:
+            moved.append(
+                {
+                    "id": drive.id,
+                    "scheduled_time": scheduled_time,
+                    "street_id": street_id,
+                }
+            )
+
+    # The series' own future drives are all moving, so only others can clash
+    conflicts = find_drive_conflicts(
+        schedule.driver_id,
+        [(drive["scheduled_time"], schedule.duration_minutes) for drive in moved],
+        exclude_drive_ids=[drive.id for drive in drives],
+    )
+    if conflicts:
+        raise ValueError(describe_conflict(conflicts[0]))
+
+    for field, value in changes.items():
+        setattr(schedule, field, value)
+    if dropped:
+        _delete_drives(dropped)
+    if moved:
+        if street_changed:
+            _delete_stop_requests([drive["id"] for drive in moved])
+        # One executemany UPDATE keyed on the primary key
+        db.session.execute(update(Drive), moved)
+    # Rematerialize from today so newly added weekdays are filled in
+    schedule.materialized_until = None
+    db.session.commit()
+    materialize_drive_schedules(now=now, schedule_ids=[schedule.id])
+    # Rescheduled drives keep their ids, so cached versions must move on
+    invalidate_reference_data("drives")
+    return schedule
+
+
+def cancel_drive_schedule(schedule_id, driver_id=None, now=None):
+    """Ends a series now, removing its future drives. Returns how many were removed."""
+    schedule = _get_owned_schedule(schedule_id, driver_id)
+    now = now or datetime.now()
+    drive_ids = db.session.scalars(_future_drives(schedule, now)).all()
+    if drive_ids:
+        _delete_drives(drive_ids)
+    schedule.active = False
+    schedule.ends_on = now.date()
+    db.session.commit()
+    invalidate_reference_data("drives")
+    return len(drive_ids)
+
+
+"""
+Materialization
+"""
+
+
+def materialize_drive_schedules(now=None, horizon_days=None, schedule_ids=None):
+    """
+    Creates the Drive rows of every active series from now up to
+    horizon_days ahead, in a single bulk INSERT, and returns how many were
+    created.
+
+    Each series remembers how far it has been materialized, so a run only
+    looks at days past that. Days that already have the series' drive are
+    skipped, as are drives that would overlap another of the driver's (they
+    are logged), and the unique (schedule_id, scheduled_time) constraint keeps
+    two workers materializing at once from creating duplicates.
+    """
+    now = now or datetime.now()
+    today = now.date()
+    horizon_end = _horizon_end(today, horizon_days)
+
+    query = select(DriveSchedule).where(
+        DriveSchedule.active.is_(True),
+        or_(DriveSchedule.ends_on.is_(None), DriveSchedule.ends_on >= today),
+        or_(
+            DriveSchedule.materialized_until.is_(None),
+            DriveSchedule.materialized_until < horizon_end,
+        ),
+    )
+    if schedule_ids is not None:
+        query = query.where(DriveSchedule.id.in_(schedule_ids))
+    schedules = db.session.scalars(query).all()
+    if not schedules:
+        return 0
+
+    existing = set(
+        db.session.execute(
+            select(Drive.schedule_id, Drive.scheduled_time).where(
+                Drive.schedule_id.in_([s.id for s in schedules]),
+                Drive.scheduled_time >= now,
+            )
+        ).all()
+    )
+    rows = []
+    for schedule in schedules:
+        first = max(today, schedule.starts_on)
+        if schedule.materialized_until:
+            first = max(first, schedule.materialized_until + timedelta(days=1))
+        last = min(horizon_end, schedule.ends_on or horizon_end)
+        for scheduled_time in occurrences(
+            schedule.weekday_mask, schedule.time_of_day, first, last
+        ):
+            if scheduled_time >= now and (schedule.id, scheduled_time) not in existing:
+                rows.append(
+                    {
+                        "driver_id": schedule.driver_id,
+                        "street_id": schedule.street_id,
+                        "schedule_id": schedule.id,
+                        "scheduled_time": scheduled_time,
+                        "duration_minutes": schedule.duration_minutes,
+                    }
+                )
+        schedule.materialized_until = horizon_end
+    rows = _without_conflicts(rows)
+
+    try:
+        if rows:
+            db.session.execute(insert(Drive), rows)
+        db.session.commit()
+    except IntegrityError:
+        # Another worker materialized the same days first
+        db.session.rollback()
+        return 0
+    return len(rows)
+
+
+def _without_conflicts(rows):
+    """
+    Drops drives that would overlap one their driver already has, or an
+    earlier one in rows; one interval index per driver checks them all.
+    """
+    by_driver = {}
+    for row in rows:
+        by_driver.setdefault(row["driver_id"], []).append(row)
+    kept = []
+    for driver_id, driver_rows in by_driver.items():
+        driver_rows.sort(key=lambda row: row["scheduled_time"])
+        conflicts = find_drive_conflicts(
+            driver_id,
+            [(row["scheduled_time"], row["duration_minutes"]) for row in driver_rows],
+        )
+        clashing = {conflict["slot"] for conflict in conflicts}
+        for conflict in conflicts:
+            current_app.logger.warning(
+                "Skipped recurring drive of schedule %s: %s",
+                driver_rows[conflict["slot"]]["schedule_id"],
+                describe_conflict(conflict),
+            )
+        kept.extend(row for slot, row in enumerate(driver_rows) if slot not in clashing)
+    return kept
+
+
+def start_drive_schedule_materializer(app):
+    """
+    Keeps recurring drives materialized over the rolling horizon, every
+    DRIVE_SCHEDULE_MATERIALIZE_INTERVAL seconds, in this process.
+    """
+    return start_periodic_task(
+        app,
+        "drive-schedule-materializer",
+        app.config.get("DRIVE_SCHEDULE_MATERIALIZE_INTERVAL", 3600),
+        materialize_drive_schedules,
+        db.session,
+    )
@@ -1,7 +1,33 @@
-from App.models import Driver, User, Street, Drive, StopRequest
+from App.models import (
+    Driver,
+    User,
+    Resident,
+    Street,
+    Drive,
+    StopRequest,
+    DriverLocation,
+    DEFAULT_DURATION_MINUTES,
+)
 from App.database import db
-from datetime import datetime
-from sqlalchemy.orm import joinedload, selectinload
+from App.utils.pagination import keyset_page_by_id, STREAM_BATCH_SIZE
+from App.utils.pubsub import hub, get_relay
+from App.utils.status_buffer import get_status_buffer
+from App.utils.spatial import get_driver_index, haversine_km
+from App.utils.routing import plan_visiting_order
+from App.utils.cache import get_reference_cache, invalidate_reference_data
+from App.utils.formatting import (
+    format_driver_summary,
+    format_page,
+    format_stop_requests,
+)
+from .Street import get_street_id_by_name
+from .DriverLocation import insert_location_points
+from .DriveConflict import check_duration, check_drive_conflicts, find_drive_conflicts
+from datetime import datetime, timedelta
+from flask import current_app
+import threading
+import time
+from sqlalchemy import func
 
 
 """
@@ -9,14 +35,16 @@ Required Command for Driver
 """
 
 
-def schedule_drive(driver_id, street_name, time_str):
+def schedule_drive(
+    driver_id, street_name, time_str, duration_minutes=DEFAULT_DURATION_MINUTES
+):
     # Fetch driver and street
     driver = db.session.get(Driver, driver_id)
     if not driver:
         raise ValueError("Driver not found")
 
-    street = Street.query.filter_by(name=street_name).first()
-    if not street:
+    street_id = get_street_id_by_name(street_name, cached=False)
+    if not street_id:
         raise ValueError(f"Street '{street_name}' not found")
 
     try:
@@ -24,13 +52,31 @@ def schedule_drive(driver_id, street_name, time_str):
     except ValueError:
         raise ValueError("Invalid time format. Please use 'YYYY-MM-DD HH:MM'.")
 
+    # The driver cannot be on two streets at once
+    check_duration(duration_minutes)
+    check_drive_conflicts(driver.id, [(scheduled_time, duration_minutes)])
+
     # Create and save the drive
     new_drive = Drive(
-        driver_id=driver.id, street_id=street.id, scheduled_time=scheduled_time
+        driver_id=driver.id,
+        street_id=street_id,
+        scheduled_time=scheduled_time,
+        duration_minutes=duration_minutes,
     )
     db.session.add(new_drive)
     db.session.commit()
-    return f"Success: Drive scheduled for {driver.username} on {street.name} at {scheduled_time}"
+    return f"Success: Drive scheduled for {driver.username} on {street_name} at {scheduled_time}"
+
+
+def preview_drive(driver_id, time_str, duration_minutes=DEFAULT_DURATION_MINUTES):
+    """Dry run of schedule_drive's overlap check, in preview_drive_schedule's shape."""
+    try:
+        scheduled_time = datetime.strptime(time_str, "%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        raise ValueError("Invalid time format. Please use 'YYYY-MM-DD HH:MM'.")
+    check_duration(duration_minutes)
+    conflicts = find_drive_conflicts(driver_id, [(scheduled_time, duration_minutes)])
+    return {"drives": [scheduled_time], "conflicts": conflicts}
 
 
 """
@@ -53,6 +99,7 @@ def add_driver(
         )
         db.session.add(new_driver)
         db.session.commit()
+        invalidate_reference_data("drivers")
         return new_driver
     else:
         raise ValueError(f"Driver '{username}' already exists")
@@ -78,43 +125,129 @@ def get_all_drivers():
 
 
 def get_all_drivers_json():
-    drivers = Driver.query.all()
-    if not drivers:
-        return []
-    return [driver.get_json() for driver in drivers]
+    rows = db.session.execute(Driver.json_select().order_by(Driver.id))
+    return [row._asdict() for row in rows]
+
+
+def get_all_drivers_summary_data():
+    # Only names are cached; status and location change with every ping
+    def load():
+        rows = db.session.execute(
+            db.select(Driver.id, Driver.username).order_by(Driver.id)
+        )
+        return tuple(row._asdict() for row in rows)
+
+    drivers = get_reference_cache().get_or_load("drivers", "summary", load)
+    return [dict(driver) for driver in drivers]
+
+
+def get_drivers_summary_page_data(limit=None, cursor=None):
+    drivers, next_cursor = keyset_page_by_id(
+        db.session, db.select(Driver.id, Driver.username), Driver.id, limit, cursor
+    )
+    return {
+        "items": [driver._asdict() for driver in drivers],
+        "next_cursor": next_cursor,
+    }
+
+
+def iter_drivers_summary_data(batch_size=STREAM_BATCH_SIZE):
+    # Server-side iteration, only batch_size drivers are held in memory at a time
+    stmt = (
+        db.select(Driver.id, Driver.username)
+        .order_by(Driver.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for driver in db.session.execute(stmt):
+        yield driver._asdict()
 
 
 def get_all_drivers_summary():
-    drivers = Driver.query.all()
-    if not drivers:
-        return ["No drivers found"]
-    return [f"ID: {d.id} | Driver: {d.username}" for d in drivers]
+    drivers = get_all_drivers_summary_data()
+    return [format_driver_summary(d) for d in drivers] or ["No drivers found"]
 
 
-def get_stop_requests_for_driver(driver_id):
-    # Fetch driver with related drives and stop requests
-    driver = Driver.query.options(
-        selectinload(Driver.drives)
-        .selectinload(Drive.stop_requests)
-        .joinedload(StopRequest.resident)
-    ).get(driver_id)
+def get_drivers_summary_page(limit=None, cursor=None):
+    return format_page(
+        get_drivers_summary_page_data(limit, cursor), format_driver_summary
+    )
 
-    if not driver:
+
+def iter_drivers_summary(batch_size=STREAM_BATCH_SIZE):
+    for driver in iter_drivers_summary_data(batch_size):
+        yield format_driver_summary(driver)
+
+
+def get_stop_requests_for_driver_data(driver_id):
+    # Only the columns needed, joined in one query with no ORM objects
+    driver_name = db.session.scalar(
+        db.select(Driver.username).where(Driver.id == driver_id)
+    )
+    if driver_name is None:
         raise ValueError("Driver not found")
 
-    requests = [
-        f"Drive ID: {d.id} | Time: {d.scheduled_time.strftime('%Y-%m-%d %I:%M %p')} | Resident: {r.resident.username} | Message: {r.message}"
-        for d in driver.drives
-        for r in d.stop_requests
-    ]
+    rows = db.session.execute(
+        db.select(
+            StopRequest.id.label("stop_request_id"),
+            Drive.id.label("drive_id"),
+            Drive.scheduled_time,
+            StopRequest.resident_id,
+            User.username.label("resident"),
+            StopRequest.message,
+        )
+        .join(StopRequest, StopRequest.drive_id == Drive.id)
+        .join(User, StopRequest.resident_id == User.id)
+        .where(Drive.driver_id == driver_id)
+    ).all()
+    # Sorted here rather than in SQL, which would need a temporary B-tree
+    rows.sort(key=lambda row: (row.drive_id, row.stop_request_id))
+
+    return {
+        "driver_id": driver_id,
+        "driver": driver_name,
+        "requests": [row._asdict() for row in rows],
+    }
+
+
+def get_stop_requests_for_driver(driver_id):
+    return format_stop_requests(get_stop_requests_for_driver_data(driver_id))
+
+
+def get_driver_requests_version(driver_id):
+    """
+    Cheap token that changes whenever get_stop_requests_for_driver would:
+    the count and newest id of stop requests on the driver's drives, plus
+    the version stamps of resident names and of rescheduled drives.
+    """
+    count, newest = db.session.execute(
+        db.select(func.count(StopRequest.id), func.max(StopRequest.id))
+        .join(Drive, StopRequest.drive_id == Drive.id)
+        .where(Drive.driver_id == driver_id)
+    ).one()
+    versions = get_reference_cache().versions
+    return (
+        "requests",
+        driver_id,
+        count,
+        newest,
+        versions.get("residents"),
+        versions.get("drives"),
+    )
+
 
-    return requests or [f"No stop requests found for driver '{driver.username}'"]
+def get_drivers_list_version():
+    count, newest = db.session.execute(
+        db.select(func.count(Driver.id), func.max(Driver.id))
+    ).one()
+    return ("drivers", count, newest, get_reference_cache().versions.get("drivers"))
 
 
 # UPDATE
 
 
-def update_driver_status(driver_id, new_status, new_location):
+def update_driver_status(
+    driver_id, new_status, new_location, latitude=None, longitude=None
+):
     # Fetch driver
     driver = Driver.query.get(driver_id)
     if not driver:
@@ -122,6 +255,415 @@ def update_driver_status(driver_id, new_status, new_location):
 
     driver.status = new_status
     driver.current_location = new_location
+    if latitude is not None and longitude is not None:
+        driver.latitude = latitude
+        driver.longitude = longitude
+    db.session.add(DriverLocation(driver.id, new_status, new_location))
+    payload = driver.get_json()
     db.session.commit()
 
-    return f"Success: {driver.username}'s status updated to '{new_status}' at '{new_location}'."
+    # This write is newer than any ping still waiting in the write-behind buffer
+    get_status_buffer().discard(driver.id)
+    index_driver_location(payload)
+    publish_driver_status(payload)
+    return f"Success: {payload['username']}'s status updated to '{new_status}' at '{new_location}'."
+
+
+def get_driver_street_ids_for_day(driver_id, day=None):
+    # Streets the driver has drives on that day, served by the (driver_id, scheduled_time) index
+    start = datetime.combine(day or datetime.now().date(), datetime.min.time())
+    return db.session.scalars(
+        db.select(Drive.street_id)
+        .where(
+            Drive.driver_id == driver_id,
+            Drive.scheduled_time >= start,
+            Drive.scheduled_time < start + timedelta(days=1),
+        )
+        .distinct()
+    ).all()
+
+
+def publish_driver_status(payload):
+    """
+    Pushes a driver's status to its subscribers in every worker: through the
+    relay to the others, when PUBSUB_DIR is set, and straight to this one's.
+    """
+    relay = get_relay()
+    if relay is not None:
+        relay.send(payload)
+    deliver_driver_status(payload)
+
+
+def listen_for_driver_status():
+    """Has this worker receive the statuses the others publish; called on subscribing."""
+    relay = get_relay()
+    if relay is not None:
+        relay.listen(
+            current_app._get_current_object(), deliver_driver_status, db.session
+        )
+
+
+def deliver_driver_status(payload):
+    """Pushes a driver's status to this worker's subscribers of it and of today's streets."""
+    keys = [("driver", payload["id"])]
+    # Only look up the driver's streets when someone is listening on a street
+    if hub.has_subscribers_for("street"):
+        keys.extend(
+            ("street", street_id)
+            for street_id in get_driver_street_ids_for_day(payload["id"])
+        )
+    hub.publish(keys, "status", payload)
+
+
+"""
+Write-behind ingestion for high-frequency status pings
+"""
+
+
+def record_driver_status_ping(
+    driver_id, new_status, new_location, latitude=None, longitude=None
+):
+    # The username is read once per driver, later pings never touch the database
+    buffer = get_status_buffer()
+    username = buffer.username(driver_id)
+    if username is None:
+        driver = db.session.get(Driver, driver_id)
+        if not driver:
+            raise ValueError("Driver not found")
+        username = driver.username
+
+    buffer.record(driver_id, username, new_status, new_location, latitude, longitude)
+    start_status_flusher(current_app._get_current_object())
+    payload = {
+        "id": driver_id,
+        "username": username,
+        "status": new_status,
+        "current_location": new_location,
+    }
+    if latitude is not None and longitude is not None:
+        payload["latitude"] = latitude
+        payload["longitude"] = longitude
+    index_driver_location(payload)
+    publish_driver_status(payload)
+    return f"Accepted: {username}'s status will be updated to '{new_status}' at '{new_location}'."
+
+
+def flush_driver_status_buffer():
+    """Writes the latest buffered status of every pinged driver in batched UPDATEs."""
+    buffer = get_status_buffer()
+    batch = buffer.drain()
+    history = buffer.drain_history()
+    dropped = buffer.take_dropped_history()
+    if dropped:
+        current_app.logger.warning(
+            "Dropped the %d oldest location history points: the buffer was full",
+            dropped,
+        )
+    if not batch and not history:
+        return 0
+    try:
+        # Pings without coordinates leave the stored ones alone, so they go in a
+        # second executemany with fewer columns
+        located, unlocated = [], []
+        for driver_id, (_, status, location, latitude, longitude) in batch.items():
+            values = {"id": driver_id, "status": status, "current_location": location}
+            if latitude is not None and longitude is not None:
+                values.update(latitude=latitude, longitude=longitude)
+                located.append(values)
+            else:
+                unlocated.append(values)
+        for rows in (located, unlocated):
+            if rows:
+                db.session.execute(db.update(Driver), rows)
+        # Every ping, not just the latest, goes to the location history
+        insert_location_points(history)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        buffer.restore(batch)
+        buffer.restore_history(history)
+        raise
+    buffer.flushed(batch)
+    return len(batch)
+
+
+def start_status_flusher(app):
+    """Starts this process's background flusher once, on the first buffered ping."""
+    buffer = get_status_buffer(app)
+    interval = app.config.get("DRIVER_STATUS_FLUSH_INTERVAL", 2)
+    # An interval of 0 leaves flushing to explicit flush_driver_status_buffer() calls
+    if buffer.flusher is not None or not interval:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    flush_driver_status_buffer()
+                except Exception:
+                    app.logger.exception("Failed to flush driver status buffer")
+                finally:
+                    db.session.remove()
+
+    # A daemon thread, or a greenlet once gevent has patched threading
+    flusher = threading.Thread(target=run, name="driver-status-flusher", daemon=True)
+    buffer.flusher = flusher
+    flusher.start()
+
+
+"""
+Nearest van queries, served from an in-memory spatial index
+"""
+
+
+def index_driver_location(payload):
+    """Keeps this worker's spatial index in step with a status change."""
+    index = get_driver_index()
+    if payload["status"] == "Off Duty":
+        index.remove(payload["id"])
+        return
+    latitude, longitude = payload.get("latitude"), payload.get("longitude")
+    if latitude is None or longitude is None:
+        # A ping without coordinates keeps the van where it was last seen
+        known = index.get(payload["id"])
+        if known is None:
+            return
+        latitude, longitude = known[:2]
+    index.update(
+        payload["id"],
+        latitude,
+        longitude,
+        dict(payload, latitude=latitude, longitude=longitude),
+    )
+
+
+def load_driver_index(force=False):
+    """
+    Returns the spatial index, rebuilding it from the database when it is older
+    than SPATIAL_INDEX_REFRESH_SECONDS so changes made by other workers show up.
+    """
+    index = get_driver_index()
+    refresh = current_app.config.get("SPATIAL_INDEX_REFRESH_SECONDS", 30)
+    if (
+        not force
+        and index.loaded_at is not None
+        and time.monotonic() - index.loaded_at < refresh
+    ):
+        return index
+
+    rows = db.session.execute(
+        db.select(
+            Driver.id,
+            Driver.username,
+            Driver.status,
+            Driver.current_location,
+            Driver.latitude,
+            Driver.longitude,
+        ).where(
+            Driver.status != "Off Duty",
+            Driver.latitude.is_not(None),
+            Driver.longitude.is_not(None),
+        )
+    ).all()
+    index.replace_all(
+        (
+            row.id,
+            row.latitude,
+            row.longitude,
+            {
+                "id": row.id,
+                "username": row.username,
+                "status": row.status,
+                "current_location": row.current_location,
+                "latitude": row.latitude,
+                "longitude": row.longitude,
+            },
+        )
+        for row in rows
+    )
+    index.loaded_at = time.monotonic()
+
+    # Pings still in the write-behind buffer are newer than what was just read
+    for driver_id, entry in get_status_buffer().snapshot().items():
+        username, status, location, latitude, longitude = entry
+        payload = {
+            "id": driver_id,
+            "username": username,
+            "status": status,
+            "current_location": location,
+        }
+        if latitude is not None and longitude is not None:
+            payload.update(latitude=latitude, longitude=longitude)
+        index_driver_location(payload)
+    return index
+
+
+def get_nearest_drivers(latitude, longitude, k=5, max_km=None):
+    """The k closest vans that are not off duty, each with its distance in km."""
+    nearest = load_driver_index().nearest(latitude, longitude, k, max_km)
+    return [
+        dict(payload, distance_km=round(distance, 3))
+        for distance, _, payload in nearest
+    ]
+
+
+"""
+Route planning for a driver's stop requests
+"""
+
+
+def _drives_to_plan(driver_id, drive_id=None, day=None):
+    query = (
+        db.select(
+            Drive.id,
+            Drive.scheduled_time,
+            Street.name,
+            Street.latitude,
+            Street.longitude,
+        )
+        .join(Street, Drive.street_id == Street.id)
+        .where(Drive.driver_id == driver_id)
+    )
+    if drive_id is not None:
+        query = query.where(Drive.id == drive_id)
+    else:
+        start = datetime.combine(day or datetime.now().date(), datetime.min.time())
+        query = query.where(
+            Drive.scheduled_time >= start,
+            Drive.scheduled_time < start + timedelta(days=1),
+        )
+    return db.session.execute(query.order_by(Drive.scheduled_time)).all()
+
+
+def _stops_by_drive(drive_ids):
+    # One query for every stop on every drive, with the resident's street as a fallback point
+    rows = db.session.execute(
+        db.select(
+            StopRequest.id,
+            StopRequest.drive_id,
+            StopRequest.message,
+            StopRequest.latitude,
+            StopRequest.longitude,
+            Resident.username,
+            Street.latitude.label("street_latitude"),
+            Street.longitude.label("street_longitude"),
+        )
+        .join(Resident, StopRequest.resident_id == Resident.id)
+        .join(Street, Resident.street_id == Street.id)
+        .where(StopRequest.drive_id.in_(drive_ids))
+    ).all()
+    # Sorted here rather than in SQL, which would need a temp B-tree over every row
+    stops = {}
+    for row in sorted(rows, key=lambda row: row.id):
+        stops.setdefault(row.drive_id, []).append(row)
+    return stops
+
+
+def _stop_point(stop, drive):
+    for latitude, longitude in (
+        (stop.latitude, stop.longitude),
+        (stop.street_latitude, stop.street_longitude),
+        (drive.latitude, drive.longitude),
+    ):
+        if latitude is not None and longitude is not None:
+            return (latitude, longitude)
+    return None
+
+
+def plan_driver_route(driver_id, drive_id=None, day=None):
+    """
+    Orders stop requests into a short visiting sequence with an ETA for each.
+
+    Plans a single drive, or every drive the driver has on day (today by
+    default). Drives keep their scheduled order and each one starts where the
+    previous one ended, beginning from the van's last known position.
+    Stops with no known position are listed last without an ETA.
+    """
+    driver = db.session.get(Driver, driver_id)
+    if not driver:
+        raise ValueError("Driver not found")
+
+    drives = _drives_to_plan(driver_id, drive_id, day)
+    if drive_id is not None and not drives:
+        raise ValueError("Drive not found")
+    stops_by_drive = _stops_by_drive([drive.id for drive in drives]) if drives else {}
+
+    config = current_app.config
+    speed_kmh = config.get("ROUTE_SPEED_KMH", 25)
+    dwell = timedelta(minutes=config.get("ROUTE_STOP_MINUTES", 2))
+    # The time budget is for the whole request, shared between its drives
+    budget = config.get("ROUTE_TIME_BUDGET_MS", 50) / 1000 / max(1, len(drives))
+
+    position = None
+    if driver.latitude is not None and driver.longitude is not None:
+        position = (driver.latitude, driver.longitude)
+    clock = None
+    total_distance = 0
+    planned = []
+    for drive in drives:
+        located, unlocated = [], []
+        for stop in stops_by_drive.get(drive.id, []):
+            point = _stop_point(stop, drive)
+            if point:
+                located.append((stop, point))
+            else:
+                unlocated.append(stop)
+
+        start = position
+        if start is None and located:
+            start = located[0][1]
+        order = plan_visiting_order(start, [point for _, point in located], budget)
+
+        # A drive cannot start before its scheduled time, but may start late
+        clock = max(drive.scheduled_time, clock or drive.scheduled_time)
+        distance = 0
+        stops = []
+        for index in order:
+            stop, point = located[index]
+            leg = haversine_km(*start, *point)
+            distance += leg
+            clock += timedelta(hours=leg / speed_kmh)
+            stops.append(
+                {
+                    "stop_request_id": stop.id,
+                    "resident": stop.username,
+                    "message": stop.message,
+                    "latitude": point[0],
+                    "longitude": point[1],
+                    "distance_km": round(leg, 3),
+                    "eta": clock,
+                }
+            )
+            clock += dwell
+            start = point
+        stops.extend(
+            {
+                "stop_request_id": stop.id,
+                "resident": stop.username,
+                "message": stop.message,
+                "latitude": None,
+                "longitude": None,
+                "distance_km": None,
+                "eta": None,
+            }
+            for stop in unlocated
+        )
+
+        position = start
+        total_distance += distance
+        planned.append(
+            {
+                "drive_id": drive.id,
+                "street": drive.name,
+                "scheduled_time": drive.scheduled_time,
+                "distance_km": round(distance, 3),
+                "stops": stops,
+            }
+        )
+
+    return {
+        "driver_id": driver.id,
+        "distance_km": round(total_distance, 3),
+        "drives": planned,
+    }
@@ -0,0 +1,199 @@
+from App.models import DriverLocation, DriverLocationRollup
+from App.database import db
+from App.utils.scheduler import start_periodic_task
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+"""
+Recording
+"""
+
+
+def insert_location_points(points):
+    """Queues raw (driver_id, status, location, recorded_at) points as one executemany INSERT."""
+    if not points:
+        return
+    db.session.execute(
+        insert(DriverLocation),
+        [
+            {
+                "driver_id": driver_id,
+                "status": status,
+                "location": location,
+                "recorded_at": recorded_at,
+            }
+            for driver_id, status, location, recorded_at in points
+        ],
+    )
+
+
+"""
+Downsampling
+"""
+
+
+def _minute(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def _compact_window(start, end):
+    # Claim the window's points by deleting them. When several workers compact
+    # at once, the others' DELETE waits for the first to commit and then finds
+    # nothing, so each point is rolled up by exactly one of them
+    points = db.session.execute(
+        delete(DriverLocation)
+        .where(DriverLocation.recorded_at >= start, DriverLocation.recorded_at < end)
+        .returning(
+            DriverLocation.id,
+            DriverLocation.driver_id,
+            DriverLocation.recorded_at,
+            DriverLocation.status,
+            DriverLocation.location,
+        )
+        .execution_options(synchronize_session=False)
+    ).all()
+    points.sort(key=lambda point: (point.recorded_at, point.id))
+
+    # One bucket per driver, minute and location, keeping the last status seen
+    buckets = {}
+    for _, driver_id, recorded_at, status, location in points:
+        key = (driver_id, _minute(recorded_at), location)
+        _, count = buckets.get(key, (None, 0))
+        buckets[key] = (status, count + 1)
+    if not buckets:
+        return 0
+
+    # Merge into buckets a previous run already wrote for the same minutes,
+    # adding in SQL so that a concurrent merge cannot be overwritten
+    existing = {
+        (driver_id, bucket_start, location): rollup_id
+        for rollup_id, driver_id, bucket_start, location in db.session.execute(
+            select(
+                DriverLocationRollup.id,
+                DriverLocationRollup.driver_id,
+                DriverLocationRollup.bucket_start,
+                DriverLocationRollup.location,
+            ).where(
+                DriverLocationRollup.bucket_start >= start,
+                DriverLocationRollup.bucket_start < end,
+            )
+        )
+    }
+    new_rollups = []
+    for (driver_id, bucket_start, location), (status, count) in buckets.items():
+        rollup_id = existing.get((driver_id, bucket_start, location))
+        if rollup_id:
+            db.session.execute(
+                update(DriverLocationRollup)
+                .where(DriverLocationRollup.id == rollup_id)
+                .values(
+                    sample_count=DriverLocationRollup.sample_count + count,
+                    status=status,
+                )
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            new_rollups.append(
+                {
+                    "driver_id": driver_id,
+                    "bucket_start": bucket_start,
+                    "location": location,
+                    "status": status,
+                    "sample_count": count,
+                }
+            )
+    if new_rollups:
+        db.session.execute(insert(DriverLocationRollup), new_rollups)
+    return len(points)
+
+
+def compact_location_history(now=None, retention_hours=None, window_hours=1):
+    """
+    Rolls raw points older than the retention window up into per-minute buckets,
+    one window at a time so memory stays bounded, committing after each window.
+    Safe to run in several workers at once: each point is counted once.
+    """
+    if retention_hours is None:
+        retention_hours = current_app.config.get("LOCATION_HISTORY_RETENTION_HOURS", 24)
+    cutoff = _minute((now or datetime.now()) - timedelta(hours=retention_hours))
+
+    compacted = 0
+    while True:
+        oldest = db.session.scalar(
+            select(func.min(DriverLocation.recorded_at)).where(
+                DriverLocation.recorded_at < cutoff
+            )
+        )
+        if oldest is None:
+            break
+        window_start = _minute(oldest)
+        window_end = min(window_start + timedelta(hours=window_hours), cutoff)
+        try:
+            compacted += _compact_window(window_start, window_end)
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created one of the buckets first; the rollback
+            # puts the points back and the next pass merges into its bucket
+            db.session.rollback()
+    return compacted
+
+
+def start_location_history_compactor(app):
+    """
+    Compacts this process's database every LOCATION_HISTORY_COMPACT_INTERVAL
+    seconds, whether or not drivers send buffered pings.
+    """
+    return start_periodic_task(
+        app,
+        "location-history-compactor",
+        app.config.get("LOCATION_HISTORY_COMPACT_INTERVAL", 3600),
+        compact_location_history,
+        db.session,
+    )
+
+
+"""
+Queries
+"""
+
+
+def get_driver_location_history(driver_id, start, end):
+    """Raw points and rolled-up buckets for a driver between start and end, oldest first."""
+    raw = db.session.execute(
+        select(
+            DriverLocation.recorded_at, DriverLocation.status, DriverLocation.location
+        )
+        .where(
+            DriverLocation.driver_id == driver_id,
+            DriverLocation.recorded_at >= start,
+            DriverLocation.recorded_at < end,
+        )
+        .order_by(DriverLocation.recorded_at)
+    ).all()
+    rolled = db.session.execute(
+        select(
+            DriverLocationRollup.bucket_start,
+            DriverLocationRollup.status,
+            DriverLocationRollup.location,
+            DriverLocationRollup.sample_count,
+        )
+        .where(
+            DriverLocationRollup.driver_id == driver_id,
+            DriverLocationRollup.bucket_start >= start,
+            DriverLocationRollup.bucket_start < end,
+        )
+        .order_by(DriverLocationRollup.bucket_start, DriverLocationRollup.id)
+    ).all()
+
+    history = [
+        {"recorded_at": time, "status": status, "location": location, "samples": count}
+        for time, status, location, count in rolled
+    ] + [
+        {"recorded_at": time, "status": status, "location": location, "samples": 1}
+        for time, status, location in raw
+    ]
+    # Rollups always predate the raw window, but a stable sort keeps this safe
+    history.sort(key=lambda point: point["recorded_at"])
+    return history
@@ -1,5 +1,25 @@
 from App.models import StopRequest, User, Resident, Drive, Driver, Street
 from App.database import db
+from App.utils.pubsub import hub, format_sse
+from App.utils.status_buffer import get_status_buffer
+from App.utils.cache import get_reference_cache, invalidate_reference_data
+from App.utils.formatting import (
+    format_inbox,
+    format_inbox_drive,
+    format_page,
+    format_resident_summary,
+)
+from .Street import get_street_id_by_name
+from .Driver import listen_for_driver_status
+from App.utils.pagination import (
+    clamp_page_size,
+    encode_cursor,
+    decode_cursor,
+    keyset_page_by_id,
+    STREAM_BATCH_SIZE,
+)
+from datetime import datetime
+from sqlalchemy import and_, or_, func, select
 from sqlalchemy.orm import joinedload
 
 """
@@ -7,36 +27,139 @@ Required Commands for Resident
 """
 
 
-def get_resident_inbox(resident_id):
-    # Fetch resident and their street's drives (inbox)
-    resident = Resident.query.get(resident_id)
+def get_resident_inbox_data(resident_id):
+    # Fetch the resident's street, then its drives (inbox) as plain rows
+    resident = db.session.execute(
+        select(Resident.street_id, Street.name)
+        .join(Street, Resident.street_id == Street.id)
+        .where(Resident.id == resident_id)
+    ).first()
     if not resident:
         raise ValueError("Resident not found")
 
-    drives = (
-        Drive.query.options(joinedload(Drive.driver))
-        .filter_by(street_id=resident.street_id)
+    drives = db.session.execute(
+        _inbox_select()
+        .where(Drive.street_id == resident.street_id)
         .order_by(Drive.scheduled_time.asc())
-        .all()
     )
+    return {
+        "street_id": resident.street_id,
+        "street_name": resident.name,
+        "drives": [drive._asdict() for drive in drives],
+    }
 
-    if not drives:
-        return [f"No upcoming drives scheduled for street '{resident.street.name}'"]
-    else:
-        inbox = [
-            f"Drive ID: {d.id} | Driver: {d.driver.username} | Scheduled Time: {d.scheduled_time.strftime('%Y-%m-%d %H:%M')}"
-            for d in drives
-        ]
-        return inbox
 
+def get_resident_inbox(resident_id):
+    return format_inbox(get_resident_inbox_data(resident_id))
+
+
+def _inbox_select():
+    return select(
+        Drive.id.label("drive_id"),
+        Drive.driver_id,
+        User.username.label("driver"),
+        Drive.scheduled_time,
+    ).join(User, Drive.driver_id == User.id)
+
+
+def get_resident_inbox_version(resident_id):
+    """
+    Cheap token that changes whenever get_resident_inbox would: the street,
+    its drive count and newest drive id, plus the version stamps of names
+    and of rescheduled drives.
+    None when the resident does not exist.
+    """
+    street_id = db.session.scalar(
+        select(Resident.__table__.c.street_id).where(
+            Resident.__table__.c.id == resident_id
+        )
+    )
+    if street_id is None:
+        return None
+    # Both aggregates are answered from the (street_id, scheduled_time) index
+    count, newest = db.session.execute(
+        select(func.count(Drive.id), func.max(Drive.id)).where(
+            Drive.street_id == street_id
+        )
+    ).one()
+    versions = get_reference_cache().versions
+    return (
+        "inbox",
+        street_id,
+        count,
+        newest,
+        versions.get("drivers"),
+        versions.get("streets"),
+        versions.get("drives"),
+    )
+
+
+def get_upcoming_inbox_page_data(resident_id, limit=None, cursor=None, now=None):
+    street_id = db.session.scalar(
+        select(Resident.street_id).where(Resident.id == resident_id)
+    )
+    if street_id is None:
+        raise ValueError("Resident not found")
+
+    limit = clamp_page_size(limit)
+    lower_bound = now or datetime.now()
+
+    # Keyset pagination on (scheduled_time, id) so each page is a bounded index range scan
+    after_time = after_id = None
+    if cursor:
+        after_time, after_id = decode_cursor(cursor, 2)
+        try:
+            after_time = datetime.fromisoformat(after_time)
+            after_id = int(after_id)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        lower_bound = max(lower_bound, after_time)
+
+    query = _inbox_select().where(
+        Drive.street_id == street_id, Drive.scheduled_time >= lower_bound
+    )
+    if after_time is not None:
+        query = query.where(
+            or_(
+                Drive.scheduled_time > after_time,
+                and_(Drive.scheduled_time == after_time, Drive.id > after_id),
+            )
+        )
+
+    # Fetch one extra row to know whether another page exists
+    drives = db.session.execute(
+        query.order_by(Drive.scheduled_time.asc(), Drive.id.asc()).limit(limit + 1)
+    ).all()
+    has_more = len(drives) > limit
+    drives = drives[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = drives[-1]
+        next_cursor = encode_cursor(last.scheduled_time.isoformat(), last.drive_id)
 
-def request_stop(resident_id, drive_id, message):
+    return {
+        "items": [drive._asdict() for drive in drives],
+        "next_cursor": next_cursor,
+    }
+
+
+def get_upcoming_inbox_page(resident_id, limit=None, cursor=None, now=None):
+    return format_page(
+        get_upcoming_inbox_page_data(resident_id, limit, cursor, now),
+        format_inbox_drive,
+    )
+
+
+def request_stop(resident_id, drive_id, message, latitude=None, longitude=None):
     # Fetch resident and drive
     resident = Resident.query.get(resident_id)
     if not resident:
         raise ValueError("Resident not found")
 
-    drive = Drive.query.options(joinedload(Drive.driver)).get(drive_id)
+    # Inner join: every drive has a driver, and an outer join to the joined
+    # user/driver tables makes SQLite scan every user
+    drive = Drive.query.options(joinedload(Drive.driver, innerjoin=True)).get(drive_id)
     if not drive:
         raise ValueError("Drive not found")
 
@@ -44,7 +167,11 @@ def request_stop(resident_id, drive_id, message):
         raise ValueError("Error: You can only request stops for drives on your street")
 
     new_request = StopRequest(
-        resident_id=resident.id, drive_id=drive.id, message=message
+        resident_id=resident.id,
+        drive_id=drive.id,
+        message=message,
+        latitude=latitude,
+        longitude=longitude,
     )
     db.session.add(new_request)
     db.session.commit()
@@ -52,6 +179,12 @@ def request_stop(resident_id, drive_id, message):
 
 
 def get_driver_status_and_location(driver_id):
+    # Buffered pings are newer than the database, serve them without a query
+    buffered = get_status_buffer().get(driver_id)
+    if buffered:
+        username, status, location = buffered[:3]
+        return f"Driver: {username} | Status: {status} | Current Location: {location}"
+
     # Fetch driver
     driver = db.session.get(Driver, driver_id)
     if not driver:
@@ -59,6 +192,36 @@ def get_driver_status_and_location(driver_id):
     return f"Driver: {driver.username} | Status: {driver.status} | Current Location: {driver.current_location}"
 
 
+def stream_driver_status(driver_id, heartbeat=15):
+    # Fetch driver for the initial snapshot
+    driver = db.session.get(Driver, driver_id)
+    if not driver:
+        raise ValueError("Driver not found")
+    snapshot = driver.get_json()
+    buffered = get_status_buffer().get(driver_id)
+    if buffered:
+        snapshot["status"], snapshot["current_location"] = buffered[1:3]
+    initial_frame = format_sse("status", snapshot)
+
+    # End the read transaction so the open stream holds no pooled connection
+    db.session.commit()
+    listen_for_driver_status()
+    return hub.subscribe(("driver", driver_id), initial_frame, heartbeat)
+
+
+def stream_street_driver_status(resident_id, heartbeat=15):
+    # Fetch resident to find their street
+    resident = db.session.get(Resident, resident_id)
+    if not resident:
+        raise ValueError("Resident not found")
+    street_id = resident.street_id
+
+    # End the read transaction so the open stream holds no pooled connection
+    db.session.commit()
+    listen_for_driver_status()
+    return hub.subscribe(("street", street_id), None, heartbeat)
+
+
 """
 Extra CRUD Operations for Resident
 """
@@ -70,15 +233,16 @@ def add_resident(username, password, street_name):
     # Check if resident with the same username already exists
     if not User.query.filter_by(username=username).first():
         # Check if street exists
-        street = Street.query.filter_by(name=street_name).first()
-        if not street:
+        street_id = get_street_id_by_name(street_name, cached=False)
+        if not street_id:
             raise ValueError(f"Street '{street_name}' not found")
 
         new_resident = Resident(
-            username=username, password=password, street_id=street.id
+            username=username, password=password, street_id=street_id
         )
         db.session.add(new_resident)
         db.session.commit()
+        invalidate_reference_data("residents")
         return new_resident
     else:
         raise ValueError(f"Resident '{username}' already exists")
@@ -97,20 +261,54 @@ def get_all_residents():
 
 
 def get_all_residents_json():
-    residents = Resident.query.options(joinedload(Resident.street)).all()
-    if not residents:
-        return []
-    return [resident.get_json() for resident in residents]
+    rows = db.session.execute(Resident.json_select().order_by(Resident.id))
+    return [row._asdict() for row in rows]
+
+
+def get_all_residents_summary_data():
+    def load():
+        rows = db.session.execute(Resident.json_select().order_by(Resident.id))
+        return tuple(row._asdict() for row in rows)
+
+    residents = get_reference_cache().get_or_load("residents", "summary", load)
+    return [dict(resident) for resident in residents]
+
+
+def get_residents_summary_page_data(limit=None, cursor=None):
+    residents, next_cursor = keyset_page_by_id(
+        db.session, Resident.json_select(), Resident.id, limit, cursor
+    )
+    return {
+        "items": [resident._asdict() for resident in residents],
+        "next_cursor": next_cursor,
+    }
+
+
+def iter_residents_summary_data(batch_size=STREAM_BATCH_SIZE):
+    # Server-side iteration, only batch_size residents are held in memory at a time
+    stmt = (
+        Resident.json_select()
+        .order_by(Resident.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for resident in db.session.execute(stmt):
+        yield resident._asdict()
 
 
 def get_all_residents_summary():
-    residents = Resident.query.options(joinedload(Resident.street)).all()
-    if not residents:
-        return ["No residents found"]
-    return [
-        f"ID: {r.id} | Resident: {r.username} | Street: {r.street.name}"
-        for r in residents
-    ]
+    residents = get_all_residents_summary_data()
+    return [format_resident_summary(r) for r in residents] or ["No residents found"]
+
+
+def get_residents_summary_page(limit=None, cursor=None):
+    return format_page(
+        get_residents_summary_page_data(limit, cursor), format_resident_summary
+    )
+
+
+def iter_residents_summary(batch_size=STREAM_BATCH_SIZE):
+    for resident in iter_residents_summary_data(batch_size):
+        yield format_resident_summary(resident)
 
 
 # UPDATE
@@ -123,12 +321,13 @@ def update_resident_street(resident_id, new_street_name):
         raise ValueError("Resident not found")
 
     # Fetch new street
-    new_street = Street.query.filter_by(name=new_street_name).first()
-    if not new_street:
+    new_street_id = get_street_id_by_name(new_street_name, cached=False)
+    if not new_street_id:
         raise ValueError(f"Street '{new_street_name}' not found")
 
     # Update resident's street
-    resident.street_id = new_street.id
+    resident.street_id = new_street_id
     db.session.add(resident)
     db.session.commit()
+    invalidate_reference_data("residents")
     return resident
@@ -1,14 +1,16 @@
 from App.models import Street
 from App.database import db
+from App.utils.cache import get_reference_cache, invalidate_reference_data
 
 
 # CREATE
-def add_street(name):
+def add_street(name, latitude=None, longitude=None):
     # Check if street already exists
     if not Street.query.filter_by(name=name).first():
-        new_street = Street(name=name)
+        new_street = Street(name=name, latitude=latitude, longitude=longitude)
         db.session.add(new_street)
         db.session.commit()
+        invalidate_reference_data("streets")
         return new_street
     else:
         raise ValueError(f"Street '{name}' already exists")
@@ -19,20 +21,46 @@ def get_street_by_id(street_id):
     return db.session.get(Street, street_id)
 
 
+def get_street_id_by_name(name, cached=True):
+    """
+    The id of the named street, or None. Writes pass cached=False: a cached
+    id may belong to a street deleted since, and SQLite does not enforce
+    the foreign key that would catch it.
+    """
+
+    # Only the id is cached; ORM objects cannot outlive their session
+    def load():
+        return db.session.scalar(db.select(Street.id).where(Street.name == name))
+
+    if not cached:
+        return load()
+    return get_reference_cache().get_or_load("streets", ("id", name), load)
+
+
 def get_street_by_name(name):
-    return Street.query.filter_by(name=name).first()
+    street_id = get_street_id_by_name(name)
+    return db.session.get(Street, street_id) if street_id else None
 
 
 def get_all_streets():
-    streets = Street.query.all()
-    return [str(s) for s in streets] or ["No streets found"]
+    def load():
+        rows = db.session.execute(db.select(Street.id, Street.name))
+        return tuple(f"ID: {s.id} | Street {s.name}" for s in rows) or (
+            "No streets found",
+        )
+
+    return list(get_reference_cache().get_or_load("streets", "all", load))
 
 
 def get_all_streets_json():
-    streets = Street.query.all()
-    if not streets:
-        return []
-    return [street.get_json() for street in streets]
+    def load():
+        rows = db.session.execute(Street.json_select())
+        return tuple(row._asdict() for row in rows)
+
+    return [
+        dict(street)
+        for street in get_reference_cache().get_or_load("streets", "json", load)
+    ]
 
 
 # UPDATE
@@ -41,6 +69,19 @@ def update_street_name(street_id, street_name):
     if street:
         street.name = street_name
         db.session.commit()
+        # Resident summaries show the street name
+        invalidate_reference_data("streets", "residents")
+        return True
+    return None
+
+
+def update_street_location(street_id, latitude, longitude):
+    street = get_street_by_id(street_id)
+    if street:
+        street.latitude = latitude
+        street.longitude = longitude
+        db.session.commit()
+        invalidate_reference_data("streets")
         return True
     return None
 
@@ -51,5 +92,6 @@ def delete_street(street_id):
     if street:
         db.session.delete(street)
         db.session.commit()
+        invalidate_reference_data("streets", "residents")
         return True
     return None
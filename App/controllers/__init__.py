@@ -3,4 +3,10 @@ from .auth import *
 from .Driver import *
 from .Resident import *
 from .Street import *
+from .DriverLocation import *
+from .importer import *
 from .initialize import *
+from .perf import *
+from .DriveSchedule import *
+from .DriveConflict import *
+from .seed import *
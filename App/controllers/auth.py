@@ -1,14 +1,67 @@
-from flask_jwt_extended import create_access_token, jwt_required, JWTManager, get_jwt_identity, verify_jwt_in_request
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import create_access_token, jwt_required, JWTManager, get_jwt_identity, verify_jwt_in_request, get_current_user
+from flask_jwt_extended.exceptions import JWTExtendedException, UserLookupError
+from jwt.exceptions import PyJWTError
+from werkzeug.local import LocalProxy
 
-from App.models import User
+from App.models import User, Driver, Resident
 from App.database import db
 
+# Subtype model to load for each role claim, so one query fetches both tables
+ROLE_MODELS = {"driver": Driver, "resident": Resident, "user": User}
+
+_UNLOADED = object()
+
+
+class Identity:
+  """
+  The authenticated user for the current request, built from the token claims.
+  Role checks need no query; the database entity is loaded on first use and
+  at most once per request. Other attributes are read from the entity; if
+  the user has been deleted since the token was issued, reading one raises
+  UserLookupError, which flask_jwt_extended answers with a 401.
+  """
+
+  def __init__(self, user_id, role=None, jwt_header=None, jwt_data=None):
+    self.id = user_id
+    self.role = role
+    self._entity = _UNLOADED
+    self._jwt_header = jwt_header or {}
+    self._jwt_data = jwt_data or {"sub": str(user_id)}
+    if role is None:
+      # Tokens issued before the role claim existed: fall back to the database
+      self.role = getattr(self.entity, "role", None)
+
+  @property
+  def entity(self):
+    if self._entity is _UNLOADED:
+      self._entity = db.session.get(ROLE_MODELS.get(self.role, User), self.id)
+    return self._entity
+
+  def __getattr__(self, name):
+    if name.startswith("_"):
+      raise AttributeError(name)
+    entity = self.entity
+    if entity is None:
+      raise UserLookupError(
+        f"Error loading the user {self.id}", self._jwt_header, self._jwt_data
+      )
+    return getattr(entity, name)
+
+  def __repr__(self):
+    return f"Identity(id={self.id}, role={self.role})"
+
+
 def login(username, password):
   result = db.session.execute(db.select(User).filter_by(username=username))
   user = result.scalar_one_or_none()
   if user and user.check_password(password):
-    # Store ONLY the user id as a string in JWT 'sub'
-    return create_access_token(identity=str(user.id))
+    # Upgrade hashes made with an older cost now that we know the plaintext
+    if user.password_needs_rehash():
+      user.set_password(password)
+      db.session.commit()
+    # Store the user id as a string in JWT 'sub' and the role as a claim
+    return create_access_token(identity=str(user.id), additional_claims={"role": user.role})
   return None
 
 
@@ -30,23 +83,62 @@ def setup_jwt(app):
       user_id = int(identity)
     except (TypeError, ValueError):
       return None
-    return db.session.get(User, user_id)
+    identity = Identity(user_id, jwt_data.get("role"), _jwt_header, jwt_data)
+    if identity.role is None:
+      return None
+    # Keep it on g so the template context can reuse it without decoding again
+    g.identity = identity
+    return identity
 
   return jwt
 
 
-# Context processor to make 'is_authenticated' available to all templates
+def get_current_identity():
+  """Returns the Identity of the request; only valid inside @jwt_required routes."""
+  return get_current_user()
+
+
+# Context processor to make 'is_authenticated' and 'current_user' available to all templates
 def add_auth_context(app):
+  @app.before_request
+  def reset_identity():
+    # g outlives a request when requests share a pushed app context (e.g. the test client)
+    g.pop("identity", None)
+    g.pop("template_identity", None)
+
   @app.context_processor
   def inject_user():
-      try:
-          verify_jwt_in_request()
-          identity = get_jwt_identity()
-          user_id = int(identity) if identity is not None else None
-          current_user = db.session.get(User, user_id) if user_id is not None else None
-          is_authenticated = current_user is not None
-      except Exception as e:
-          print(e)
-          is_authenticated = False
-          current_user = None
-      return dict(is_authenticated=is_authenticated, current_user=current_user)
\ No newline at end of file
+    # Both are proxies, so pages that never use them pay nothing
+    return dict(
+      is_authenticated=LocalProxy(lambda: get_template_identity() is not None),
+      current_user=LocalProxy(get_template_identity),
+    )
+
+
+def _request_has_token():
+  return (
+    current_app.config["JWT_ACCESS_COOKIE_NAME"] in request.cookies
+    or "Authorization" in request.headers
+  )
+
+
+def get_template_identity():
+  """Resolves the Identity for templates at most once per request, or None when anonymous."""
+  if not has_request_context():
+    return None
+  if "template_identity" in g:
+    return g.template_identity
+
+  # Reuse the identity @jwt_required already resolved; anonymous requests skip token parsing
+  identity = g.get("identity")
+  if identity is None and _request_has_token():
+    try:
+      verify_jwt_in_request(optional=True)
+      identity = get_current_user()
+    except (JWTExtendedException, PyJWTError):
+      identity = None
+  # A token outliving its user renders the page as anonymous
+  if identity is not None and identity.entity is None:
+    identity = None
+  g.template_identity = identity
+  return identity
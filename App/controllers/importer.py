@@ -0,0 +1,275 @@
+import csv
+import json
+from sqlalchemy import insert, select
+
+from App.models import User, Driver, Resident, Street
+from App.database import db
+from App.utils.hashing import hash_passwords
+from App.utils.cache import invalidate_reference_data
+from App.utils.validation import (
+    validate_username,
+    validate_password,
+    check_required,
+    check_string_length,
+    check_driver_status,
+    validate_optional_coordinates,
+    combine_validation_errors,
+)
+
+IMPORT_KINDS = ("streets", "drivers", "residents")
+IMPORT_FORMATS = ("csv", "jsonl")
+IMPORT_CHUNK_SIZE = 1000
+
+
+"""
+Parsing
+"""
+
+
+def detect_import_format(filename=None, content_type=None):
+    if filename and filename.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if content_type and ("ndjson" in content_type or "jsonl" in content_type):
+        return "jsonl"
+    return "csv"
+
+
+def parse_import_rows(lines, fmt="csv"):
+    """Yields (row_number, row_dict_or_None, error) for each data row in a CSV or JSONL stream."""
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format '{fmt}'")
+
+    if fmt == "csv":
+        for row_number, row in enumerate(csv.DictReader(lines), start=1):
+            yield row_number, row, None
+        return
+
+    row_number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield row_number, None, "Invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "Each line must be a JSON object"
+            continue
+        yield row_number, row, None
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _existing_values(column, values):
+    if not values:
+        return set()
+    return set(db.session.scalars(select(column).where(column.in_(values))))
+
+
+"""
+Row validation
+"""
+
+
+def _row_coordinates(row):
+    # CSV cells arrive as strings; anything unparsable is left for the validator
+    coordinates = []
+    for field in ("latitude", "longitude"):
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+            try:
+                value = float(value) if value else None
+            except ValueError:
+                pass
+        coordinates.append(value)
+    return coordinates
+
+
+def _validate_street_row(row):
+    name = row.get("name")
+    return combine_validation_errors(
+        check_required(name, "Street name"),
+        check_string_length(name, "Street name", max_length=100),
+        validate_optional_coordinates(*_row_coordinates(row)),
+    )
+
+
+def _validate_driver_row(row):
+    return combine_validation_errors(
+        validate_username(row.get("username")),
+        validate_password(row.get("password")),
+        check_driver_status(row.get("status") or "Off Duty"),
+        check_string_length(
+            row.get("current_location") or "Unknown", "Location", max_length=120
+        ),
+    )
+
+
+def _validate_resident_row(row):
+    street_name = row.get("street_name")
+    return combine_validation_errors(
+        validate_username(row.get("username")),
+        validate_password(row.get("password")),
+        check_required(street_name, "Street name"),
+        check_string_length(street_name, "Street name", max_length=100),
+    )
+
+
+VALIDATORS = {
+    "streets": _validate_street_row,
+    "drivers": _validate_driver_row,
+    "residents": _validate_resident_row,
+}
+
+
+def _validated_rows(kind, parsed_rows, report):
+    """Returns the rows that passed validation, recording errors for the rest."""
+    validate = VALIDATORS[kind]
+    key = "name" if kind == "streets" else "username"
+    seen = set()
+    valid = []
+    for row_number, row, error in parsed_rows:
+        errors = [error] if error else validate(row)
+        if not errors and row[key] in seen:
+            errors = [f"Duplicate '{row[key]}' in import file"]
+        if errors:
+            report["errors"].append({"row": row_number, "errors": errors})
+            continue
+        seen.add(row[key])
+        valid.append((row_number, row))
+    return valid
+
+
+"""
+Chunked inserts
+"""
+
+
+def _insert_streets(chunk, report):
+    existing = _existing_values(Street.name, [row["name"] for _, row in chunk])
+    new_rows = []
+    for row_number, row in chunk:
+        if row["name"] in existing:
+            report["errors"].append(
+                {
+                    "row": row_number,
+                    "errors": [f"Street '{row['name']}' already exists"],
+                }
+            )
+        else:
+            latitude, longitude = _row_coordinates(row)
+            new_rows.append(
+                {"name": row["name"], "latitude": latitude, "longitude": longitude}
+            )
+    if new_rows:
+        db.session.execute(insert(Street.__table__), new_rows)
+    return len(new_rows)
+
+
+def _insert_users(chunk, role, report, subtype_values):
+    """Inserts the user rows of a chunk, then the matching driver/resident rows."""
+    existing = _existing_values(User.username, [row["username"] for _, row in chunk])
+    accepted = []
+    for row_number, row in chunk:
+        if row["username"] in existing:
+            report["errors"].append(
+                {
+                    "row": row_number,
+                    "errors": [f"{role.title()} '{row['username']}' already exists"],
+                }
+            )
+        else:
+            accepted.append(row)
+    if not accepted:
+        return 0
+
+    hashes = hash_passwords([row["password"] for row in accepted])
+    db.session.execute(
+        insert(User.__table__),
+        [
+            {"username": row["username"], "password": password_hash, "role": role}
+            for row, password_hash in zip(accepted, hashes)
+        ],
+    )
+
+    # Joined-table inheritance: look the new ids up by username in one query
+    usernames = [row["username"] for row in accepted]
+    ids = dict(
+        db.session.execute(
+            select(User.username, User.id).where(User.username.in_(usernames))
+        ).all()
+    )
+    subtype_table = Driver.__table__ if role == "driver" else Resident.__table__
+    db.session.execute(
+        insert(subtype_table),
+        [dict(subtype_values(row), id=ids[row["username"]]) for row in accepted],
+    )
+    return len(accepted)
+
+
+def _driver_values(row):
+    return {
+        "status": row.get("status") or "Off Duty",
+        "current_location": row.get("current_location") or "Unknown",
+    }
+
+
+def import_rows(kind, parsed_rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Validates and bulk inserts streets, drivers or residents, committing once per chunk."""
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Unsupported import kind '{kind}'")
+
+    report = {"kind": kind, "created": 0, "errors": []}
+    valid = _validated_rows(kind, parsed_rows, report)
+
+    if kind == "residents":
+        # Resolve every street name in the file with a single query
+        street_names = {row["street_name"] for _, row in valid}
+        street_ids = {}
+        if street_names:
+            street_ids = dict(
+                db.session.execute(
+                    select(Street.name, Street.id).where(Street.name.in_(street_names))
+                ).all()
+            )
+        resolved = []
+        for row_number, row in valid:
+            if row["street_name"] not in street_ids:
+                report["errors"].append(
+                    {
+                        "row": row_number,
+                        "errors": [f"Street '{row['street_name']}' not found"],
+                    }
+                )
+            else:
+                resolved.append((row_number, row))
+        valid = resolved
+
+    for chunk in _chunks(valid, chunk_size):
+        if kind == "streets":
+            created = _insert_streets(chunk, report)
+        elif kind == "drivers":
+            created = _insert_users(chunk, "driver", report, _driver_values)
+        else:
+            created = _insert_users(
+                chunk,
+                "resident",
+                report,
+                lambda row: {"street_id": street_ids[row["street_name"]]},
+            )
+        db.session.commit()
+        invalidate_reference_data(kind)
+        report["created"] += created
+
+    report["errors"].sort(key=lambda error: error["row"])
+    return report
+
+
+def import_file(kind, lines, fmt="csv", chunk_size=IMPORT_CHUNK_SIZE):
+    return import_rows(kind, parse_import_rows(lines, fmt), chunk_size)
@@ -5,31 +5,45 @@ from .Street import add_street
 from .Driver import schedule_drive
 from .Resident import request_stop
 from App.database import db
+from App.utils.cache import invalidate_reference_data
 from datetime import datetime, timedelta
 
 
 def initialize():
     db.drop_all()
     db.create_all()
+    invalidate_reference_data("streets", "drivers", "residents")
 
     # Add Streets
-    main_street = add_street("Main Street")
-    park_avenue = add_street("Park Avenue")
-    elm_street = add_street("Elm Street")
-    oak_road = add_street("Oak Road")
+    main_street = add_street("Main Street", latitude=10.6402, longitude=-61.3998)
+    park_avenue = add_street("Park Avenue", latitude=10.6465, longitude=-61.4032)
+    elm_street = add_street("Elm Street", latitude=10.6358, longitude=-61.4101)
+    oak_road = add_street("Oak Road", latitude=10.6519, longitude=-61.3917)
 
     # Add Drivers
     driver_bob = add_driver(
-        "Bob the Baker", "bobpass", status="On Duty", current_location="Main Street"
+        "Bob the Baker",
+        "bobpass",
+        status="On Duty",
+        current_location="Main Street",
+        latitude=10.6402,
+        longitude=-61.3998,
     )
     driver_alice = add_driver(
         "Alice the Patissier",
         "alicepass",
         status="Off Duty",
         current_location="Park Avenue",
+        latitude=10.6465,
+        longitude=-61.4032,
     )
     driver_john = add_driver(
-        "John the Breadman", "johnpass", status="On Duty", current_location="Elm Street"
+        "John the Breadman",
+        "johnpass",
+        status="On Duty",
+        current_location="Elm Street",
+        latitude=10.6358,
+        longitude=-61.4101,
     )
 
     # Add Residents
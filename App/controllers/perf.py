@@ -0,0 +1,74 @@
+import time
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.orm import joinedload
+from App.models import User, Driver, Resident, Street, Drive, StopRequest
+from App.database import db
+from App.utils.serialization import FastJSONProvider
+
+# Each list as an ORM query whose objects are turned into dicts with get_json
+ORM_LISTS = {
+    "users": lambda: db.select(User),
+    "drivers": lambda: db.select(Driver),
+    "residents": lambda: db.select(Resident).options(joinedload(Resident.street)),
+    "streets": lambda: db.select(Street),
+    "drives": lambda: db.select(Drive),
+    "stop_requests": lambda: db.select(StopRequest),
+}
+
+PROJECTED_LISTS = {
+    "users": User.json_select,
+    "drivers": Driver.json_select,
+    "residents": Resident.json_select,
+    "streets": Street.json_select,
+    "drives": Drive.json_select,
+    "stop_requests": StopRequest.json_select,
+}
+
+
+def _best_time(run, repeat):
+    best = None
+    for _ in range(repeat):
+        # Start each run with an empty identity map, as a new request would
+        db.session.expunge_all()
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare_list_serialization(repeat=5):
+    """
+    Times each list both ways, best of repeat runs, query to JSON text:
+    ORM objects through get_json and Flask's default encoder, against
+    projected rows through FastJSONProvider.
+    """
+    app = current_app._get_current_object()
+    default_json = DefaultJSONProvider(app)
+    fast_json = FastJSONProvider(app)
+    report = {}
+    for name, orm_select in ORM_LISTS.items():
+        projected_select = PROJECTED_LISTS[name]
+
+        def orm():
+            objects = db.session.scalars(orm_select()).all()
+            return default_json.dumps([o.get_json() for o in objects])
+
+        def projected():
+            rows = db.session.execute(projected_select())
+            return fast_json.dumps([row._asdict() for row in rows])
+
+        orm_seconds = _best_time(orm, repeat)
+        projected_seconds = _best_time(projected, repeat)
+        report[name] = {
+            "rows": db.session.scalar(
+                db.select(db.func.count()).select_from(projected_select().subquery())
+            ),
+            "orm_ms": round(orm_seconds * 1000, 3),
+            "projected_ms": round(projected_seconds * 1000, 3),
+            "speedup": (
+                round(orm_seconds / projected_seconds, 2) if projected_seconds else None
+            ),
+        }
+    return report
@@ -0,0 +1,157 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select
+
+from App.models import (
+    User,
+    Driver,
+    Resident,
+    Street,
+    Drive,
+    StopRequest,
+    DEFAULT_DURATION_MINUTES,
+)
+from App.database import db
+from App.utils.hashing import hash_password
+from App.utils.cache import invalidate_reference_data
+
+SEED_CHUNK_SIZE = 50000
+SEED_PASSWORD = "seedpass"
+# Drives per driver are spaced this far apart, so seeded drives never overlap
+SEED_DRIVE_SPACING = timedelta(hours=3)
+
+
+def _insert_chunked(table, rows, chunk_size):
+    # Core executemany, one statement per chunk, all in the caller's transaction
+    connection = db.session.connection()
+    for start in range(0, len(rows), chunk_size):
+        connection.execute(insert(table), rows[start : start + chunk_size])
+
+
+def _ids_after(column, key_column, after):
+    # Ids are read back in one query rather than one RETURNING per chunk
+    return dict(
+        db.session.execute(select(key_column, column).where(column > after)).all()
+    )
+
+
+def _max_id(column):
+    return db.session.scalar(select(func.coalesce(func.max(column), 0)))
+
+
+def seed_database(
+    scale,
+    password=SEED_PASSWORD,
+    seed=None,
+    now=None,
+    chunk_size=SEED_CHUNK_SIZE,
+):
+    """
+    Bulk inserts a synthetic data set alongside whatever is already there:
+    scale residents and scale drives, over scale // 100 streets and drivers,
+    and a stop request for every drive on a street with residents.
+
+    Every user gets the same password, hashed once, so a million users cost
+    one hash. Drives run from three days ago into the following weeks.
+    Returns the number of rows created per table.
+    """
+    if scale < 1:
+        raise ValueError("Scale must be at least 1")
+    rng = random.Random(seed)
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    password_hash = hash_password(password)
+    n_streets = n_drivers = max(1, scale // 100)
+
+    street_base = _max_id(Street.id)
+    _insert_chunked(
+        Street.__table__,
+        [
+            {
+                "name": f"Seed Street {street_base + i + 1}",
+                "latitude": round(10.60 + rng.random() * 0.1, 6),
+                "longitude": round(-61.45 + rng.random() * 0.1, 6),
+            }
+            for i in range(n_streets)
+        ],
+        chunk_size,
+    )
+    street_ids = list(_ids_after(Street.id, Street.name, street_base).values())
+
+    # Joined-table inheritance: user rows first, then the subtype rows by id
+    user_base = _max_id(User.id)
+    users = [
+        {"username": f"driver{user_base + i + 1}", "role": "driver"}
+        for i in range(n_drivers)
+    ] + [
+        {"username": f"resident{user_base + n_drivers + i + 1}", "role": "resident"}
+        for i in range(scale)
+    ]
+    for user in users:
+        user["password"] = password_hash
+    _insert_chunked(User.__table__, users, chunk_size)
+    user_ids = _ids_after(User.id, User.username, user_base)
+    driver_ids = [user_ids[user["username"]] for user in users[:n_drivers]]
+    resident_ids = [user_ids[user["username"]] for user in users[n_drivers:]]
+    del users, user_ids
+
+    _insert_chunked(
+        Driver.__table__,
+        [
+            {
+                "id": driver_id,
+                "status": rng.choice(("On Duty", "Off Duty")),
+                "current_location": "Unknown",
+            }
+            for driver_id in driver_ids
+        ],
+        chunk_size,
+    )
+    resident_streets = {}
+    resident_rows = []
+    for i, resident_id in enumerate(resident_ids):
+        street_id = street_ids[i % n_streets]
+        resident_streets.setdefault(street_id, []).append(resident_id)
+        resident_rows.append({"id": resident_id, "street_id": street_id})
+    _insert_chunked(Resident.__table__, resident_rows, chunk_size)
+    del resident_rows
+
+    # Driver i % n_drivers takes drive i, in its own time slot
+    first_slot = now - timedelta(days=3)
+    drive_base = _max_id(Drive.id)
+    _insert_chunked(
+        Drive.__table__,
+        [
+            {
+                "driver_id": driver_ids[i % n_drivers],
+                "street_id": rng.choice(street_ids),
+                "scheduled_time": first_slot + (i // n_drivers) * SEED_DRIVE_SPACING,
+                "duration_minutes": DEFAULT_DURATION_MINUTES,
+            }
+            for i in range(scale)
+        ],
+        chunk_size,
+    )
+    drives = db.session.execute(
+        select(Drive.id, Drive.street_id).where(Drive.id > drive_base)
+    ).all()
+
+    stop_requests = [
+        {
+            "resident_id": rng.choice(resident_streets[drive.street_id]),
+            "drive_id": drive.id,
+            "message": "Seeded stop",
+        }
+        for drive in drives
+        if drive.street_id in resident_streets
+    ]
+    _insert_chunked(StopRequest.__table__, stop_requests, chunk_size)
+
+    db.session.commit()
+    invalidate_reference_data("streets", "drivers", "residents", "drives")
+    return {
+        "streets": n_streets,
+        "drivers": n_drivers,
+        "residents": scale,
+        "drives": len(drives),
+        "stop_requests": len(stop_requests),
+    }
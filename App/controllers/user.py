@@ -1,5 +1,9 @@
-from App.models import User
+from functools import lru_cache
+from App.models import User, Driver, Resident, Street
 from App.database import db
+from App.utils.pagination import keyset_page_by_id, STREAM_BATCH_SIZE
+from App.utils.status_buffer import get_status_buffer
+from App.utils.cache import invalidate_reference_data
 from App.utils.validation import (
     validate_username,
     validate_password,
@@ -37,12 +41,61 @@ def get_all_users():
     return db.session.scalars(db.select(User)).all()
 
 
+def _users_json_select():
+    """
+    Every user's get_json fields as one row each, with each subclass's
+    columns outer joined in; columns of other roles come back as None.
+    """
+    driver, resident, street = Driver.__table__, Resident.__table__, Street.__table__
+    return (
+        db.select(
+            User.id,
+            User.username,
+            User.role,
+            driver.c.status,
+            driver.c.current_location,
+            driver.c.latitude,
+            driver.c.longitude,
+            resident.c.street_id,
+            street.c.name.label("street_name"),
+        )
+        .outerjoin(driver, driver.c.id == User.id)
+        .outerjoin(resident, resident.c.id == User.id)
+        .outerjoin(street, street.c.id == resident.c.street_id)
+    )
+
+
+@lru_cache(maxsize=8)
+def _json_keys(role):
+    # The get_json keys of the role's own class; a role with no class of its
+    # own gets the base user fields
+    mapper = User.__mapper__.polymorphic_map.get(role, User.__mapper__)
+    return tuple(mapper.class_.json_select().selected_columns.keys())
+
+
+def _user_json(row):
+    return {key: getattr(row, key) for key in _json_keys(row.role)}
+
+
 def get_all_users_json():
-    users = get_all_users()
-    if not users:
-        return []
-    users = [user.get_json() for user in users]
-    return users
+    rows = db.session.execute(_users_json_select().order_by(User.id))
+    return [_user_json(row) for row in rows]
+
+
+def get_users_json_page(limit=None, cursor=None):
+    users, next_cursor = keyset_page_by_id(
+        db.session, _users_json_select(), User.id, limit, cursor
+    )
+    return {"items": [_user_json(user) for user in users], "next_cursor": next_cursor}
+
+
+def iter_users_json(batch_size=STREAM_BATCH_SIZE):
+    # Server-side iteration, only batch_size users are held in memory at a time
+    stmt = (
+        _users_json_select().order_by(User.id).execution_options(yield_per=batch_size)
+    )
+    for user in db.session.execute(stmt):
+        yield _user_json(user)
 
 
 def update_user(id, username):
@@ -51,6 +104,8 @@ def update_user(id, username):
         user.username = username
         # user is already in the session; no need to re-add
         db.session.commit()
+        get_status_buffer().forget_username(id)
+        invalidate_reference_data("drivers", "residents")
         return True
     return None
 
@@ -61,5 +116,6 @@ def delete_user(id):
     if user:
         db.session.delete(user)
         db.session.commit()
+        invalidate_reference_data("drivers", "residents")
         return True
     return None
@@ -1,14 +1,153 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from App.utils.replicas import RoutingSession, setup_replica_routing
+from App.utils.querystats import setup_query_stats
+from App.utils.metrics import setup_metrics
+from App.utils.slowqueries import setup_slow_query_log
 
+try:
+    from gevent.monkey import is_module_patched
+except ImportError:  # gevent is only installed for the production worker
+    is_module_patched = None
 
-db = SQLAlchemy()
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 def get_migrate(app):
     return Migrate(app, db)
 
 def create_db():
     db.create_all()
-    
+
+
+"""
+Production engine profile
+"""
+
+
+def is_sqlite(uri):
+    return uri.startswith("sqlite")
+
+
+def is_sqlite_memory(uri):
+    return uri in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in uri
+
+
+def gunicorn_concurrency():
+    """(workers, concurrent requests per worker) as configured in gunicorn_config.py."""
+    try:
+        import gunicorn_config
+    except ImportError:
+        return 1, 1
+    workers = getattr(gunicorn_config, "workers", 1)
+    if getattr(gunicorn_config, "worker_class", "sync") in ("gevent", "eventlet"):
+        per_worker = getattr(gunicorn_config, "worker_connections", 1000)
+    else:
+        per_worker = getattr(gunicorn_config, "threads", 1)
+    return workers, per_worker
+
+
+def production_engine_options(uri, config, workers, per_worker):
+    """
+    Pool settings for one worker process. Every worker gets an equal share of
+    DB_MAX_CONNECTIONS, capped at the number of requests it can run at once;
+    half of the share is kept open and the rest is overflow for bursts.
+    """
+    if is_sqlite_memory(uri):
+        return {}
+    share = config.get("DB_MAX_CONNECTIONS", 100) // max(1, workers)
+    connections = max(2, min(per_worker, share))
+    options = {
+        "pool_size": max(1, connections // 2),
+        "max_overflow": connections - max(1, connections // 2),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", 10),
+    }
+    if is_sqlite(uri):
+        # Let pysqlite's own busy handler wait as long as the pragma does
+        options["connect_args"] = {
+            "timeout": config.get("SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000
+        }
+    else:
+        options["pool_recycle"] = config.get("DB_POOL_RECYCLE", 1800)
+        options["pool_pre_ping"] = True
+    return options
+
+
+def sqlite_pragmas(config):
+    return {
+        # Readers no longer block the writer, and commits only wait on the WAL
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        # Writers queue for the lock instead of failing with "database is locked"
+        "busy_timeout": config.get("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "mmap_size": config.get("SQLITE_MMAP_SIZE", 268435456),
+        "cache_size": config.get("SQLITE_CACHE_SIZE", -20000),
+    }
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def patch_psycopg_for_gevent():
+    # psycopg2 blocks the whole gevent worker on every query unless it is told
+    # to wait through gevent; psycogreen does that when it is installed
+    if is_module_patched is None or not is_module_patched("socket"):
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+    patch_psycopg()
+
+
 def init_db(app):
-    db.init_app(app)
\ No newline at end of file
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    production = app.config.get("DB_PROFILE") == "production"
+    if production:
+        options = production_engine_options(uri, app.config, *gunicorn_concurrency())
+        # Explicit SQLALCHEMY_ENGINE_OPTIONS win over the profile
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            **options,
+            **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+        }
+        if uri.startswith("postgres"):
+            patch_psycopg_for_gevent()
+    replicas = app.config.get("DB_READ_REPLICAS") or ()
+    unknown = set(replicas) - set(app.config.get("SQLALCHEMY_BINDS") or {})
+    if unknown:
+        raise ValueError(f"DB_READ_REPLICAS not in SQLALCHEMY_BINDS: {sorted(unknown)}")
+    db.init_app(app)
+    setup_replica_routing(app, db)
+    setup_query_stats(app, db)
+    setup_metrics(app, db)
+    setup_slow_query_log(app, db)
+    if production:
+        # The primary and any replica binds that are SQLite files get the pragmas
+        with app.app_context():
+            for engine in db.engines.values():
+                url = str(engine.url)
+                if is_sqlite(url) and not is_sqlite_memory(url):
+                    apply_sqlite_pragmas(engine, sqlite_pragmas(app.config))
+
+
+def get_pool_stats():
+    """Connection pool counters for this worker process."""
+    pool = db.engine.pool
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            timeout=pool.timeout(),
+        )
+    return stats
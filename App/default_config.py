@@ -1,2 +1,43 @@
 SQLALCHEMY_DATABASE_URI="sqlite:///temp-database.db"
-SECRET_KEY="secret key"
\ No newline at end of file
+SECRET_KEY="secret key"
+INBOX_PAGE_SIZE=20
+PASSWORD_HASH_METHOD="scrypt:32768:8:1"
+SSE_HEARTBEAT_SECONDS=15
+PUBSUB_DIR=None
+DRIVER_STATUS_FLUSH_INTERVAL=2
+LOCATION_HISTORY_RETENTION_HOURS=24
+LOCATION_HISTORY_COMPACT_INTERVAL=3600
+BACKGROUND_TASKS=True
+LOCATION_HISTORY_BUFFER_LIMIT=100000
+SPATIAL_GRID_CELL_DEGREES=0.01
+SPATIAL_INDEX_REFRESH_SECONDS=30
+ROUTE_SPEED_KMH=25
+ROUTE_STOP_MINUTES=2
+ROUTE_TIME_BUDGET_MS=50
+DB_PROFILE="development"
+DB_MAX_CONNECTIONS=100
+DB_POOL_TIMEOUT=10
+DB_POOL_RECYCLE=1800
+SQLITE_BUSY_TIMEOUT_MS=5000
+SQLITE_MMAP_SIZE=268435456
+SQLITE_CACHE_SIZE=-20000
+DB_READ_REPLICAS=[]
+DB_REPLICA_STICKY_SECONDS=5
+CACHE_MAXSIZE=1024
+CACHE_TTL_SECONDS=60
+CACHE_VERSION_DIR=None
+DRIVE_SCHEDULE_HORIZON_DAYS=28
+DRIVE_SCHEDULE_MATERIALIZE_INTERVAL=3600
+JSON_FAST_ENCODER=True
+DRIVE_MAX_DURATION_MINUTES=240
+SQL_QUERY_STATS=True
+SQL_QUERY_DEBUG=None
+SQL_N_PLUS_ONE_THRESHOLD=5
+METRICS_ENABLED=True
+METRICS_DIR=None
+METRICS_WRITE_INTERVAL=5
+SLOW_QUERY_THRESHOLD_MS=250
+SLOW_QUERY_LOG="slow_queries.jsonl"
+SLOW_QUERY_LOG_INTERVAL=60
+SLOW_QUERY_EXPLAIN=True
+ADMIN_USERNAMES=[]
@@ -7,11 +7,15 @@ from werkzeug.datastructures import  FileStorage
 
 from App.database import init_db
 from App.config import load_config
+from App.utils.serialization import setup_json
+from App.utils.slowqueries import start_slow_query_flusher
 
 
 from App.controllers import (
     setup_jwt,
-    add_auth_context
+    add_auth_context,
+    start_location_history_compactor,
+    start_drive_schedule_materializer,
 )
 
 from App.views import views, setup_admin
@@ -22,9 +26,18 @@ def add_views(app):
     for view in views:
         app.register_blueprint(view)
 
+def start_background_tasks(app):
+    # Each worker runs its own; tests start the ones they exercise themselves
+    if app.testing or not app.config.get("BACKGROUND_TASKS", True):
+        return
+    start_location_history_compactor(app)
+    start_drive_schedule_materializer(app)
+    start_slow_query_flusher(app)
+
 def create_app(overrides={}):
     app = Flask(__name__, static_url_path='/static')
     load_config(app, overrides)
+    setup_json(app)
     CORS(app)
     add_auth_context(app)
     photos = UploadSet('photos', TEXT + DOCUMENTS + IMAGES)
@@ -33,6 +46,7 @@ def create_app(overrides={}):
     init_db(app)
     jwt = setup_jwt(app)
     setup_admin(app)
+    start_background_tasks(app)
     @jwt.invalid_token_loader
     @jwt.unauthorized_loader
     def custom_unauthorized_response(error):
@@ -1,22 +1,59 @@
 from App.database import db
-from datetime import datetime
+from datetime import datetime, timedelta
+
+DEFAULT_DURATION_MINUTES = 30
 
 
 class Drive(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     scheduled_time = db.Column(db.DateTime, nullable=False)
+    # How long the van is on the street; drives of one driver may not overlap
+    duration_minutes = db.Column(
+        db.Integer,
+        nullable=False,
+        default=DEFAULT_DURATION_MINUTES,
+        server_default="30",
+    )
 
     # Foreign keys
     driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=False)
     street_id = db.Column(db.Integer, db.ForeignKey("street.id"), nullable=False)
+    # Set when the drive was materialized from a recurring schedule
+    schedule_id = db.Column(
+        db.Integer, db.ForeignKey("drive_schedule.id"), nullable=True
+    )
 
     # Relationship, a drive can have many stop requests
     stop_requests = db.relationship("StopRequest", backref="drive", lazy=True)
 
-    def __init__(self, driver_id, street_id, scheduled_time):
+    # Composite indexes for the resident inbox (by street) and driver schedule (by driver),
+    # both of which filter on the foreign key and order by scheduled_time
+    __table_args__ = (
+        db.Index("ix_drive_street_id_scheduled_time", "street_id", "scheduled_time"),
+        db.Index("ix_drive_driver_id_scheduled_time", "driver_id", "scheduled_time"),
+        # A series has at most one drive per time, even if two workers materialize it
+        db.UniqueConstraint(
+            "schedule_id", "scheduled_time", name="uq_drive_schedule_id_scheduled_time"
+        ),
+    )
+
+    def __init__(
+        self,
+        driver_id,
+        street_id,
+        scheduled_time,
+        schedule_id=None,
+        duration_minutes=DEFAULT_DURATION_MINUTES,
+    ):
         self.driver_id = driver_id
         self.street_id = street_id
         self.scheduled_time = scheduled_time
+        self.schedule_id = schedule_id
+        self.duration_minutes = duration_minutes
+
+    @property
+    def end_time(self):
+        return self.scheduled_time + timedelta(minutes=self.duration_minutes)
 
     def __repr__(self):
         return f"Drive ID: {self.id} | Street: {self.street.name} | Driver: {self.driver.username} | Time: {self.scheduled_time.strftime('%Y-%m-%d %I:%M %p')}"
@@ -27,4 +64,15 @@ class Drive(db.Model):
             "driver_id": self.driver_id,
             "street_id": self.street_id,
             "scheduled_time": self.scheduled_time,
+            "duration_minutes": self.duration_minutes,
         }
+
+    @classmethod
+    def json_select(cls):
+        return db.select(
+            cls.id,
+            cls.driver_id,
+            cls.street_id,
+            cls.scheduled_time,
+            cls.duration_minutes,
+        )
@@ -0,0 +1,70 @@
+from App.database import db
+from App.models.Drive import DEFAULT_DURATION_MINUTES
+from App.utils.recurrence import format_weekdays
+
+
+class DriveSchedule(db.Model):
+    """
+    A weekly recurring drive: the driver visits the street at time_of_day on
+    every weekday in weekday_mask (bit 0 is Monday) from starts_on until
+    ends_on. Drive rows are materialized from it up to materialized_until.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    weekday_mask = db.Column(db.Integer, nullable=False)
+    time_of_day = db.Column(db.Time, nullable=False)
+    duration_minutes = db.Column(
+        db.Integer,
+        nullable=False,
+        default=DEFAULT_DURATION_MINUTES,
+        server_default="30",
+    )
+    starts_on = db.Column(db.Date, nullable=False)
+    ends_on = db.Column(db.Date, nullable=True)
+    materialized_until = db.Column(db.Date, nullable=True)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+
+    # Foreign keys
+    driver_id = db.Column(
+        db.Integer, db.ForeignKey("driver.id"), nullable=False, index=True
+    )
+    street_id = db.Column(db.Integer, db.ForeignKey("street.id"), nullable=False)
+
+    # Relationship, a schedule materializes into many drives
+    drives = db.relationship("Drive", backref="schedule", lazy=True)
+
+    def __init__(
+        self,
+        driver_id,
+        street_id,
+        weekday_mask,
+        time_of_day,
+        starts_on,
+        ends_on=None,
+        duration_minutes=DEFAULT_DURATION_MINUTES,
+    ):
+        self.driver_id = driver_id
+        self.street_id = street_id
+        self.weekday_mask = weekday_mask
+        self.time_of_day = time_of_day
+        self.starts_on = starts_on
+        self.ends_on = ends_on
+        self.duration_minutes = duration_minutes
+        self.active = True
+
+    def __repr__(self):
+        return f"Schedule ID: {self.id} | Driver ID: {self.driver_id} | Street ID: {self.street_id} | Days: {format_weekdays(self.weekday_mask)} | Time: {self.time_of_day.strftime('%H:%M')}"
+
+    def get_json(self):
+        return {
+            "id": self.id,
+            "driver_id": self.driver_id,
+            "street_id": self.street_id,
+            "weekdays": format_weekdays(self.weekday_mask),
+            "time": self.time_of_day.strftime("%H:%M"),
+            "duration_minutes": self.duration_minutes,
+            "starts_on": self.starts_on,
+            "ends_on": self.ends_on,
+            "materialized_until": self.materialized_until,
+            "active": self.active,
+        }
@@ -6,6 +6,8 @@ class Driver(User):
     id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
     status = db.Column(db.String(20), default="Off Duty", nullable=False)
     current_location = db.Column(db.String(120), default="Unknown")
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
 
     # Relationship, the driver can have many drives
     drives = db.relationship("Drive", backref="driver", lazy=True)
@@ -14,10 +16,21 @@ class Driver(User):
         "polymorphic_identity": "driver",
     }
 
-    def __init__(self, username, password, status, current_location, **kwargs):
+    def __init__(
+        self,
+        username,
+        password,
+        status,
+        current_location,
+        latitude=None,
+        longitude=None,
+        **kwargs,
+    ):
         super().__init__(username=username, password=password, **kwargs)
         self.status = status
         self.current_location = current_location
+        self.latitude = latitude
+        self.longitude = longitude
 
     def __repr__(self):
         return f"ID: {self.id} | Driver: {self.username} | Status: {self.status} | Location: {self.current_location}"
@@ -28,4 +41,17 @@ class Driver(User):
             "username": self.username,
             "status": self.status,
             "current_location": self.current_location,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
         }
+
+    @classmethod
+    def json_select(cls):
+        return db.select(
+            cls.id,
+            cls.username,
+            cls.status,
+            cls.current_location,
+            cls.latitude,
+            cls.longitude,
+        )
@@ -0,0 +1,38 @@
+from App.database import db
+from datetime import datetime
+
+
+class DriverLocation(db.Model):
+    """Append-only raw status/location point, kept for the recent retention window."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False)
+    location = db.Column(db.String(120), nullable=True)
+    recorded_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.now, index=True
+    )
+
+    # Foreign key
+    driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=False)
+
+    # Time range queries per driver
+    __table_args__ = (
+        db.Index("ix_driver_location_driver_id_recorded_at", "driver_id", "recorded_at"),
+    )
+
+    def __init__(self, driver_id, status, location, recorded_at=None):
+        self.driver_id = driver_id
+        self.status = status
+        self.location = location
+        self.recorded_at = recorded_at or datetime.now()
+
+    def __repr__(self):
+        return f"Driver ID: {self.driver_id} | Status: {self.status} | Location: {self.location} | Time: {self.recorded_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    def get_json(self):
+        return {
+            "driver_id": self.driver_id,
+            "status": self.status,
+            "location": self.location,
+            "recorded_at": self.recorded_at,
+        }
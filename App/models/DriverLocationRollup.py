@@ -0,0 +1,43 @@
+from App.database import db
+
+
+class DriverLocationRollup(db.Model):
+    """Per-minute, per-location summary of raw points older than the retention window."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_start = db.Column(db.DateTime, nullable=False, index=True)
+    location = db.Column(db.String(120), nullable=True)
+    status = db.Column(db.String(20), nullable=False)
+    sample_count = db.Column(db.Integer, nullable=False, default=1)
+
+    # Foreign key
+    driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=False)
+
+    # One bucket per driver, minute and location; also serves time range queries
+    __table_args__ = (
+        db.UniqueConstraint(
+            "driver_id",
+            "bucket_start",
+            "location",
+            name="uq_driver_location_rollup_bucket",
+        ),
+    )
+
+    def __init__(self, driver_id, bucket_start, location, status, sample_count=1):
+        self.driver_id = driver_id
+        self.bucket_start = bucket_start
+        self.location = location
+        self.status = status
+        self.sample_count = sample_count
+
+    def __repr__(self):
+        return f"Driver ID: {self.driver_id} | Minute: {self.bucket_start.strftime('%Y-%m-%d %H:%M')} | Status: {self.status} | Location: {self.location} | Samples: {self.sample_count}"
+
+    def get_json(self):
+        return {
+            "driver_id": self.driver_id,
+            "bucket_start": self.bucket_start,
+            "location": self.location,
+            "status": self.status,
+            "sample_count": self.sample_count,
+        }
@@ -32,3 +32,15 @@ class Resident(User):
             "street_id": self.street_id,
             "street_name": self.street.name,
         }
+
+    @classmethod
+    def json_select(cls):
+        """Joins the street for the name get_json shows alongside its id."""
+        from App.models.Street import Street
+
+        return db.select(
+            cls.id,
+            cls.username,
+            cls.street_id,
+            Street.name.label("street_name"),
+        ).join(Street, cls.street_id == Street.id)
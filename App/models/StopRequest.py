@@ -4,15 +4,24 @@ from App.database import db
 class StopRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     message = db.Column(db.String(200), nullable=True)
+    # Where the resident wants the van to stop; the street's point when unset
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
 
     # Foreign keys
     resident_id = db.Column(db.Integer, db.ForeignKey("resident.id"), nullable=False)
-    drive_id = db.Column(db.Integer, db.ForeignKey("drive.id"), nullable=False)
+    drive_id = db.Column(
+        db.Integer, db.ForeignKey("drive.id"), nullable=False, index=True
+    )
 
-    def __init__(self, resident_id, drive_id, message=None):
+    def __init__(
+        self, resident_id, drive_id, message=None, latitude=None, longitude=None
+    ):
         self.resident_id = resident_id
         self.drive_id = drive_id
         self.message = message
+        self.latitude = latitude
+        self.longitude = longitude
 
     def __repr__(self):
         return f"StopRequest ID: {self.id} | Resident ID: {self.resident_id} | Drive ID: {self.drive_id} | Message: {self.message}"
@@ -23,4 +32,17 @@ class StopRequest(db.Model):
             "resident_id": self.resident_id,
             "drive_id": self.drive_id,
             "message": self.message,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
         }
+
+    @classmethod
+    def json_select(cls):
+        return db.select(
+            cls.id,
+            cls.resident_id,
+            cls.drive_id,
+            cls.message,
+            cls.latitude,
+            cls.longitude,
+        )
@@ -4,12 +4,17 @@ from App.database import db
 class Street(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
+    # A representative point on the street, for distance queries
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
 
     # Relationship, a street can have many residents
     residents = db.relationship("Resident", backref="street", lazy=True)
 
-    def __init__(self, name):
+    def __init__(self, name, latitude=None, longitude=None):
         self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
 
     def __repr__(self):
         return f"ID: {self.id} | Street {self.name}"
@@ -18,4 +23,10 @@ class Street(db.Model):
         return {
             "id": self.id,
             "name": self.name,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
         }
+
+    @classmethod
+    def json_select(cls):
+        return db.select(cls.id, cls.name, cls.latitude, cls.longitude)
@@ -3,4 +3,7 @@ from .Driver import *
 from .Resident import *
 from .Street import *
 from .Drive import *
-from .StopRequest import *
\ No newline at end of file
+from .DriveSchedule import *
+from .StopRequest import *
+from .DriverLocation import *
+from .DriverLocationRollup import *
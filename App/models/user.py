@@ -1,5 +1,5 @@
-from werkzeug.security import check_password_hash, generate_password_hash
 from App.database import db
+from App.utils.hashing import hash_password, verify_password, password_needs_rehash
 
 
 class User(db.Model):
@@ -15,12 +15,26 @@ class User(db.Model):
     def get_json(self):
         return {"id": self.id, "username": self.username}
 
+    @classmethod
+    def json_select(cls):
+        """
+        Selects get_json's fields as plain rows, without loading whole objects.
+        Every model with a get_json has a json_select for its list endpoints.
+        This one has only the base fields; drivers' and residents' extra
+        fields are not joined.
+        """
+        return db.select(cls.id, cls.username)
+
     def set_password(self, password):
         """Create hashed password."""
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
 
     def check_password(self, password):
         """Check hashed password."""
-        return check_password_hash(self.password, password)
+        return verify_password(self.password, password)
+
+    def password_needs_rehash(self):
+        """Check whether the hash predates the configured hash cost."""
+        return password_needs_rehash(self.password)
 
     __mapper_args__ = {"polymorphic_identity": "user", "polymorphic_on": role}
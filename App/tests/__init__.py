@@ -1,2 +1,3 @@
 from .test_integration import *
 from .test_unit import *
+from .test_query_plans import *
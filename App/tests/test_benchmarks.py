@@ -0,0 +1,187 @@
+import itertools
+import json
+import os
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import func, select
+
+pytest.importorskip("pytest_benchmark")
+
+from App.main import create_app
+from App.database import db, create_db
+from App.models import Driver, Resident, Street, Drive, StopRequest
+from App.utils.cache import invalidate_reference_data
+from App.controllers import (
+    seed_database,
+    SEED_PASSWORD,
+    get_resident_inbox,
+    get_stop_requests_for_driver,
+    request_stop,
+    schedule_drive,
+    login,
+    get_all_drivers_summary,
+    get_all_residents_summary,
+)
+
+# Timing tests only run when asked for, e.g. BENCHMARK_SCALES=1000,100000,1000000;
+# CI runs the 1000 scale in its own job
+SCALES = [
+    int(scale) for scale in os.environ.get("BENCHMARK_SCALES", "").split(",") if scale
+]
+if not SCALES:
+    pytest.skip(
+        "Set BENCHMARK_SCALES (or run flask test benchmarks) to run the benchmarks",
+        allow_module_level=True,
+    )
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baselines.json")
+# How much slower than its baseline median a case may get before it fails:
+# by default twice as slow, and by at least a millisecond, so that timing
+# noise passes and a lost index or an N+1 does not
+TOLERANCE = float(os.environ.get("BENCHMARK_TOLERANCE", "1.0"))
+MIN_DELTA_MS = float(os.environ.get("BENCHMARK_MIN_DELTA_MS", "1.0"))
+UPDATE_BASELINES = os.environ.get("BENCHMARK_UPDATE_BASELINES") == "1"
+
+with open(BASELINES_PATH, encoding="utf-8") as f:
+    BASELINES = json.load(f)
+measured = {}
+
+
+# =============================================================================
+#                               Fixtures
+# =============================================================================
+
+
+@pytest.fixture(scope="module", autouse=True)
+def save_baselines():
+    """With BENCHMARK_UPDATE_BASELINES=1, stores this run's medians as the baselines."""
+    yield
+    if UPDATE_BASELINES and measured:
+        BASELINES.update(measured)
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(BASELINES.items())), f, indent=2)
+            f.write("\n")
+
+
+@pytest.fixture(scope="module", params=SCALES, ids=lambda scale: f"{scale}")
+def seeded(request, tmp_path_factory):
+    """
+    A database file seeded at each scale, shared by the module's tests.
+    Provides a driver with stop requests and a resident with upcoming drives.
+    """
+    path = tmp_path_factory.mktemp("benchmarks") / "bench.db"
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}"})
+    with app.app_context():
+        create_db()
+        seed_database(request.param, seed=1)
+        drive = db.session.execute(
+            select(Drive.driver_id, Drive.id, Street.id.label("street_id"), Street.name)
+            .join(Street, Drive.street_id == Street.id)
+            .join(StopRequest, StopRequest.drive_id == Drive.id)
+            .where(Drive.scheduled_time >= datetime.now())
+            .limit(1)
+        ).one()
+        resident = db.session.execute(
+            select(Resident.id, Resident.username)
+            .where(Resident.street_id == drive.street_id)
+            .limit(1)
+        ).one()
+        yield SimpleNamespace(
+            scale=request.param,
+            driver_id=drive.driver_id,
+            drive_id=drive.id,
+            street_name=drive.name,
+            resident_id=resident.id,
+            resident_username=resident.username,
+        )
+        db.session.remove()
+
+
+def check_baseline(benchmark, name, scale):
+    if benchmark.disabled:
+        return
+    key = f"{name}[{scale}]"
+    median_ms = benchmark.stats.stats.median * 1000
+    if UPDATE_BASELINES:
+        measured[key] = round(median_ms, 4)
+        return
+    if key not in BASELINES:
+        pytest.skip(
+            f"No baseline for {key}; record one with BENCHMARK_UPDATE_BASELINES=1"
+        )
+    limit = max(BASELINES[key] * (1 + TOLERANCE), BASELINES[key] + MIN_DELTA_MS)
+    assert (
+        median_ms <= limit
+    ), f"{key} regressed: median {median_ms:.3f} ms, baseline {BASELINES[key]:.3f} ms"
+
+
+# =============================================================================
+#                               Benchmarks
+# =============================================================================
+
+
+def test_get_resident_inbox(benchmark, seeded):
+    result = benchmark(get_resident_inbox, seeded.resident_id)
+    assert result and "Drive ID" in result[0]
+    check_baseline(benchmark, "get_resident_inbox", seeded.scale)
+
+
+def test_get_stop_requests_for_driver(benchmark, seeded):
+    result = benchmark(get_stop_requests_for_driver, seeded.driver_id)
+    assert result and "Resident" in result[0]
+    check_baseline(benchmark, "get_stop_requests_for_driver", seeded.scale)
+
+
+def test_request_stop(benchmark, seeded):
+    result = benchmark(
+        request_stop, seeded.resident_id, seeded.drive_id, "Benchmark stop"
+    )
+    assert result.startswith("Success")
+    check_baseline(benchmark, "request_stop", seeded.scale)
+
+
+def test_schedule_drive(benchmark, seeded):
+    # Each round books the next free hour, far past the seeded drives
+    slots = (datetime(2100, 1, 1) + timedelta(hours=n) for n in itertools.count())
+
+    def next_slot():
+        return (
+            seeded.driver_id,
+            seeded.street_name,
+            next(slots).strftime("%Y-%m-%d %H:%M"),
+        ), {}
+
+    result = benchmark.pedantic(schedule_drive, setup=next_slot, rounds=50)
+    assert result.startswith("Success: Drive scheduled")
+    check_baseline(benchmark, "schedule_drive", seeded.scale)
+
+
+def test_login(benchmark, seeded):
+    # Dominated by the password hash; few rounds are enough
+    token = benchmark.pedantic(
+        login, args=(seeded.resident_username, SEED_PASSWORD), rounds=5
+    )
+    assert token
+    check_baseline(benchmark, "login", seeded.scale)
+
+
+def test_get_all_drivers_summary(benchmark, seeded):
+    # Measured cold: each round starts with the reference cache invalidated
+    result = benchmark.pedantic(
+        get_all_drivers_summary,
+        setup=lambda: invalidate_reference_data("drivers"),
+        rounds=10,
+    )
+    assert len(result) == db.session.scalar(select(func.count(Driver.id)))
+    check_baseline(benchmark, "get_all_drivers_summary", seeded.scale)
+
+
+def test_get_all_residents_summary(benchmark, seeded):
+    result = benchmark.pedantic(
+        get_all_residents_summary,
+        setup=lambda: invalidate_reference_data("residents"),
+        rounds=5,
+    )
+    assert len(result) == seeded.scale
+    check_baseline(benchmark, "get_all_residents_summary", seeded.scale)
@@ -1,7 +1,38 @@
+import io
+import json
+import threading
+import time
 import pytest
+from flask import Flask, current_app, jsonify, request
+from flask.globals import app_ctx
+from datetime import date, datetime, timedelta
 from App.main import create_app
-from App.database import db, create_db
-from App.models import User, Driver, Resident, Street, Drive
+from App.database import db, create_db, init_db, get_pool_stats
+from flask_jwt_extended import decode_token
+from sqlalchemy import delete, event, func, insert, select
+from App.utils.replicas import STICKY_COOKIE, replica_reads
+from App.utils.loadtest import AppTarget, load_collection, run_load_test
+from App.utils.metrics import get_metrics
+from App.utils.pubsub import HEARTBEAT_FRAME, Relay, get_relay
+from App.utils.querystats import track_queries
+from App.utils.slowqueries import (
+    explain,
+    read_slow_queries,
+    summarize_slow_queries,
+)
+from App.utils.scheduler import stop_periodic_tasks
+from App.utils.status_buffer import get_status_buffer
+from App.utils.cache import FileVersions, get_reference_cache
+from App.models import (
+    User,
+    Driver,
+    Resident,
+    Street,
+    Drive,
+    StopRequest,
+    DriverLocation,
+    DriverLocationRollup,
+)
 from App.controllers import (
     create_user,
     delete_user,
@@ -11,13 +42,50 @@ from App.controllers import (
     add_driver,
     add_resident,
     add_street,
+    delete_street,
+    get_street_id_by_name,
     login,
+    Identity,
     schedule_drive,
     get_resident_inbox,
+    get_upcoming_inbox_page,
+    get_all_drivers_summary,
+    get_all_streets,
+    get_all_residents_summary,
+    update_street_name,
+    get_drivers_summary_page,
+    iter_drivers_summary,
+    get_residents_summary_page,
+    iter_residents_summary,
+    get_users_json_page,
+    iter_users_json,
+    import_file,
+    stream_driver_status,
+    stream_street_driver_status,
+    record_driver_status_ping,
+    flush_driver_status_buffer,
+    get_driver_status_and_location,
     update_resident_street,
     request_stop,
     get_stop_requests_for_driver,
     update_driver_status,
+    compact_location_history,
+    start_location_history_compactor,
+    start_drive_schedule_materializer,
+    get_driver_location_history,
+    get_nearest_drivers,
+    plan_driver_route,
+    get_all_users_json,
+    get_all_drivers_json,
+    get_all_residents_json,
+    compare_list_serialization,
+    create_drive_schedule,
+    update_drive_schedule,
+    cancel_drive_schedule,
+    materialize_drive_schedules,
+    find_drive_conflicts,
+    seed_database,
+    SEED_PASSWORD,
 )
 
 
@@ -62,6 +130,88 @@ def test_user_creation_and_login():
     assert login("Charlie", "wrongpass") is None
 
 
+def test_login_rehashes_password_when_cost_changes(monkeypatch):
+    monkeypatch.setitem(
+        current_app.config, "PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000"
+    )
+    user = create_user("rehash_user", "password")
+    assert user.password.startswith("pbkdf2:sha256:1000$")
+
+    monkeypatch.setitem(
+        current_app.config, "PASSWORD_HASH_METHOD", "pbkdf2:sha256:2000"
+    )
+    assert login("rehash_user", "wrongpass") is None
+    assert user.password.startswith("pbkdf2:sha256:1000$")
+    assert login("rehash_user", "password") is not None
+    rehashed = get_user_by_username("rehash_user")
+    assert rehashed.password.startswith("pbkdf2:sha256:2000$")
+    assert login("rehash_user", "password") is not None
+
+
+def test_login_token_carries_role_and_identity_loads_lazily():
+    driver = add_driver("Claims", "claimspass")
+    claims = decode_token(login("Claims", "claimspass"))
+    assert claims["sub"] == str(driver.id)
+    assert claims["role"] == "driver"
+
+    db.session.expunge_all()
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    identity = Identity(driver.id, claims["role"])
+    assert identity.role == "driver"
+    assert statements == []
+    assert identity.username == "Claims"
+    assert identity.current_location == "Unknown"
+    assert len(statements) == 1
+    event.remove(db.engine, "before_cursor_execute", listener)
+    assert isinstance(identity.entity, Driver)
+    assert identity.status == "Off Duty"
+
+    # Tokens without a role claim fall back to the database
+    assert Identity(driver.id).role == "driver"
+    assert Identity(9999).role is None
+
+
+def test_template_auth_context_is_lazy():
+    add_driver("Templated", "templatedpass")
+    client = current_app.test_client()
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+
+    response = client.get("/")
+    assert response.status_code == 200
+    assert b"Welcome" not in response.data
+    assert statements == []
+
+    token = login("Templated", "templatedpass")
+    statements.clear()
+    response = client.get("/", headers={"Authorization": f"Bearer {token}"})
+    assert b"Welcome Templated" in response.data
+    assert len(statements) == 1
+
+    # A later anonymous request must not inherit the previous identity
+    response = client.get("/")
+    assert b"Welcome" not in response.data
+    event.remove(db.engine, "before_cursor_execute", listener)
+
+
+def test_token_of_a_deleted_user_is_refused():
+    user = create_user("short_lived", "shortpass")
+    token = login("short_lived", "shortpass")
+    delete_user(user.id)
+    client = current_app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/api/identify", headers=headers)
+    assert response.status_code == 401
+    assert response.get_json() == {"msg": f"Error loading the user {user.id}"}
+    # Pages render as anonymous rather than failing
+    response = client.get("/", headers=headers)
+    assert response.status_code == 200 and b"Welcome" not in response.data
+
+
 def test_create_user_controller_and_update():
     u = create_user("initial_user", "password")
     assert u is not None
@@ -178,3 +328,1238 @@ def test_add_duplicates_are_prevented():
         ValueError, match="Resident 'duplicate_resident' already exists"
     ):
         add_resident("duplicate_resident", "password", "Pine Street")
+
+
+def test_upcoming_inbox_pages_through_future_drives_only():
+    add_street("Cedar Lane")
+    driver = add_driver("Page Driver", "pagepass")
+    resident = add_resident("Pager", "pagerpass", "Cedar Lane")
+    schedule_drive(driver.id, "Cedar Lane", "2020-01-01 09:00")
+    for hour in range(10, 15):
+        schedule_drive(driver.id, "Cedar Lane", f"2030-01-01 {hour}:00")
+    # Two drives at the same minute must not be skipped or repeated across pages
+    # (by two drivers, since one driver cannot be booked twice at once)
+    second = add_driver("Second Page Driver", "pagepass")
+    schedule_drive(second.id, "Cedar Lane", "2030-01-01 12:00")
+
+    now = datetime(2025, 1, 1)
+    seen = []
+    cursor = None
+    while True:
+        page = get_upcoming_inbox_page(resident.id, limit=2, cursor=cursor, now=now)
+        assert len(page["items"]) <= 2
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 6
+    assert len(set(seen)) == 6
+    assert all("2020-01-01" not in item for item in seen)
+    assert "2030-01-01 10:00" in seen[0]
+    assert "2030-01-01 14:00" in seen[-1]
+
+
+def test_upcoming_inbox_rejects_invalid_cursor():
+    add_street("Birch Road")
+    resident = add_resident("Cursor", "cursorpass", "Birch Road")
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        get_upcoming_inbox_page(resident.id, cursor="not-a-cursor")
+
+    # A limit that is not a number is refused, not read as the default page size
+    auth = {"Authorization": f"Bearer {login('Cursor', 'cursorpass')}"}
+    for path in ("/api/residents/inbox", "/api/v2/residents/inbox"):
+        response = current_app.test_client().get(
+            f"{path}?upcoming=true&limit=abc", headers=auth
+        )
+        assert response.status_code == 400
+        assert response.get_json() == {"errors": ["Limit must be a positive integer."]}
+
+
+def test_list_pages_and_streams_match_full_lists():
+    add_street("Walnut Way")
+    for i in range(5):
+        add_driver(f"driver_{i}", "password")
+        add_resident(f"resident_{i}", "password", "Walnut Way")
+
+    for get_all, get_page, iterate, count in [
+        (get_all_drivers_summary, get_drivers_summary_page, iter_drivers_summary, 5),
+        (
+            get_all_residents_summary,
+            get_residents_summary_page,
+            iter_residents_summary,
+            5,
+        ),
+        # Every driver and resident is a user
+        (get_all_users_json, get_users_json_page, iter_users_json, 10),
+    ]:
+        paged = []
+        cursor = None
+        while True:
+            page = get_page(limit=2, cursor=cursor)
+            paged.extend(page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        streamed = list(iterate(batch_size=3))
+        assert len(streamed) == count
+        assert paged == streamed == get_all()
+
+    client = current_app.test_client()
+    for path in ("/api/drivers", "/api/v2/drivers", "/api/residents", "/api/users"):
+        assert (
+            client.get(f"{path}?stream=true").get_json() == client.get(path).get_json()
+        )
+        response = client.get(f"{path}?limit=abc")
+        assert response.status_code == 400
+        assert response.get_json() == {"errors": ["Limit must be a positive integer."]}
+
+
+def test_bulk_import_streets_and_residents():
+    add_street("Main Street")
+    streets = io.StringIO("name\nHill Road\nMain Street\n\nHill Road\n")
+    report = import_file("streets", streets, "csv")
+    assert report["created"] == 1
+    assert [error["row"] for error in report["errors"]] == [2, 3]
+
+    residents = io.StringIO(
+        '{"username": "imported_one", "password": "password1", "street_name": "Hill Road"}\n'
+        '{"username": "imported_two", "password": "short", "street_name": "Hill Road"}\n'
+        '{"username": "imported_three", "password": "password3", "street_name": "Nowhere"}\n'
+        "not json\n"
+    )
+    report = import_file("residents", residents, "jsonl")
+    assert report["created"] == 1
+    assert [error["row"] for error in report["errors"]] == [2, 3, 4]
+
+    resident = get_user_by_username("imported_one")
+    assert resident.role == "resident"
+    assert resident.street.name == "Hill Road"
+    assert login("imported_one", "password1") is not None
+
+
+
+def test_bulk_import_route_is_for_admins_and_refuses_unreadable_uploads():
+    app = current_app._get_current_object()
+    app.config["ADMIN_USERNAMES"] = ["importadmin"]
+    create_user("importadmin", "adminpass")
+    create_user("selfsignup", "signuppass")
+    client = app.test_client()
+
+    def upload(username, password, body):
+        return client.post(
+            "/api/admin/import/streets?format=csv",
+            data=body,
+            headers={"Authorization": f"Bearer {login(username, password)}"},
+        )
+
+    # A plain account anyone can register is not an admin
+    assert upload("selfsignup", "signuppass", b"name\nHill Road\n").status_code == 403
+    response = upload("importadmin", "adminpass", b"name\nHill Road\n")
+    assert response.status_code == 200 and response.get_json()["created"] == 1
+
+    response = upload("importadmin", "adminpass", b"name\n\xff\xfe Road\n")
+    assert response.status_code == 400
+    assert response.get_json() == {"errors": ["The upload must be UTF-8 text"]}
+    response = upload("importadmin", "adminpass", b"name\n" + b"x" * 200000 + b"\n")
+    assert response.status_code == 400
+    assert response.get_json()["errors"][0].startswith("Malformed CSV")
+    assert Street.query.count() == 1
+
+
+def test_driver_status_updates_are_pushed_to_driver_and_street_subscribers():
+    add_street("Stream Street")
+    driver = add_driver("Streamer", "streamerpass")
+    resident = add_resident("Watcher", "watcherpass", "Stream Street")
+    tonight = datetime.now().replace(hour=23, minute=59)
+    schedule_drive(driver.id, "Stream Street", tonight.strftime("%Y-%m-%d %H:%M"))
+
+    driver_stream = stream_driver_status(driver.id, heartbeat=0.01)
+    street_stream = stream_street_driver_status(resident.id, heartbeat=0.01)
+    assert '"status": "Off Duty"' in next(driver_stream)
+    assert next(street_stream).startswith(":")
+
+    update_driver_status(driver.id, "On Duty", "Stream Street")
+    for stream in (driver_stream, street_stream):
+        frame = next(stream)
+        assert frame.startswith("event: status")
+        assert '"current_location": "Stream Street"' in frame
+        stream.close()
+
+    with pytest.raises(ValueError, match="Driver not found"):
+        stream_driver_status(9999)
+
+
+def test_driver_status_published_by_another_worker_reaches_subscribers(tmp_path):
+    app = current_app._get_current_object()
+    app.config["PUBSUB_DIR"] = str(tmp_path / "ps")
+    add_street("Relay Street")
+    driver = add_driver("Relayed", "relayedpass")
+    resident = add_resident("Relay Watcher", "watcherpass", "Relay Street")
+    tonight = datetime.now().replace(hour=23, minute=59)
+    schedule_drive(driver.id, "Relay Street", tonight.strftime("%Y-%m-%d %H:%M"))
+
+    driver_stream = stream_driver_status(driver.id, heartbeat=0.01)
+    street_stream = stream_street_driver_status(resident.id, heartbeat=0.01)
+    next(driver_stream)
+    next(street_stream)
+    try:
+        # The worker that handled the update only has the relay to reach this one
+        payload = {"id": driver.id, "status": "On Duty", "current_location": "Depot"}
+        Relay(app.config["PUBSUB_DIR"]).send(payload)
+        for stream in (driver_stream, street_stream):
+            frame = next(
+                frame
+                for frame, _ in zip(stream, range(500))
+                if frame != HEARTBEAT_FRAME
+            )
+            assert frame.startswith("event: status")
+            assert '"current_location": "Depot"' in frame
+    finally:
+        driver_stream.close()
+        street_stream.close()
+        get_relay(app).close()
+
+
+def test_buffered_status_pings_coalesce_into_one_flush(monkeypatch):
+    monkeypatch.setitem(current_app.config, "DRIVER_STATUS_FLUSH_INTERVAL", 0)
+    first = add_driver("Pinger", "pingerpass")
+    second = add_driver("Other Pinger", "pingerpass")
+
+    record_driver_status_ping(first.id, "On Duty", "Depot")
+    record_driver_status_ping(first.id, "On Duty", "Main Street")
+    record_driver_status_ping(second.id, "On Break", "Cafe")
+
+    # Reads see the latest ping before it reaches the database
+    assert "Main Street" in get_driver_status_and_location(first.id)
+    db.session.expire_all()
+    assert Driver.query.get(first.id).current_location == "Unknown"
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    assert flush_driver_status_buffer() == 2
+    event.remove(db.engine, "before_cursor_execute", listener)
+    assert len([s for s in statements if s.startswith("UPDATE")]) == 1
+
+    db.session.expire_all()
+    assert Driver.query.get(first.id).current_location == "Main Street"
+    assert Driver.query.get(second.id).status == "On Break"
+    assert flush_driver_status_buffer() == 0
+
+    # A direct status update supersedes a ping that has not been flushed yet
+    record_driver_status_ping(first.id, "On Break", "Park")
+    update_driver_status(first.id, "Off Duty", "Home")
+    assert flush_driver_status_buffer() == 0
+    assert "Home" in get_driver_status_and_location(first.id)
+
+    with pytest.raises(ValueError, match="Driver not found"):
+        record_driver_status_ping(9999, "On Duty", "Nowhere")
+
+
+def test_location_history_records_every_ping_and_compacts_old_points(monkeypatch):
+    monkeypatch.setitem(current_app.config, "DRIVER_STATUS_FLUSH_INTERVAL", 0)
+    driver = add_driver("Tracker", "trackerpass")
+
+    update_driver_status(driver.id, "On Duty", "Depot")
+    record_driver_status_ping(driver.id, "On Duty", "Main Street")
+    record_driver_status_ping(driver.id, "On Duty", "Elm Street")
+    flush_driver_status_buffer()
+    assert DriverLocation.query.filter_by(driver_id=driver.id).count() == 3
+
+    # Long past the retention window: three points in one minute, one in the next
+    for recorded_at, status, location in [
+        (datetime(2020, 1, 1, 9, 0, 5), "On Duty", "Main Street"),
+        (datetime(2020, 1, 1, 9, 0, 25), "On Break", "Main Street"),
+        (datetime(2020, 1, 1, 9, 0, 45), "On Duty", "Elm Street"),
+        (datetime(2020, 1, 1, 9, 1, 5), "On Duty", "Elm Street"),
+    ]:
+        db.session.add(DriverLocation(driver.id, status, location, recorded_at))
+    db.session.commit()
+
+    assert compact_location_history() == 4
+    assert compact_location_history() == 0
+
+    history = get_driver_location_history(
+        driver.id, datetime(2020, 1, 1), datetime(2020, 1, 2)
+    )
+    assert [(p["location"], p["status"], p["samples"]) for p in history] == [
+        ("Main Street", "On Break", 2),
+        ("Elm Street", "On Duty", 1),
+        ("Elm Street", "On Duty", 1),
+    ]
+    assert history[0]["recorded_at"] == datetime(2020, 1, 1, 9, 0)
+
+    # Recent points stay raw
+    recent = get_driver_location_history(driver.id, datetime(2021, 1, 1), datetime.max)
+    assert [p["location"] for p in recent] == ["Depot", "Main Street", "Elm Street"]
+    assert all(p["samples"] == 1 for p in recent)
+
+
+
+def test_location_history_route_is_for_the_driver_and_admins():
+    app = current_app._get_current_object()
+    app.config["ADMIN_USERNAMES"] = ["historyadmin"]
+    driver = add_driver("Tracked Driver", "trackedpass")
+    add_driver("Other Driver", "otherpass")
+    create_user("historyadmin", "adminpass")
+    create_user("curious", "curiouspass")
+    client = app.test_client()
+
+    def history(username, password):
+        return client.get(
+            f"/api/drivers/{driver.id}/history"
+            "?start=2020-01-01 00:00&end=2030-01-01 00:00",
+            headers={"Authorization": f"Bearer {login(username, password)}"},
+        ).status_code
+
+    # A plain account anyone can register may not follow a driver around
+    assert history("curious", "curiouspass") == 403
+    assert history("Other Driver", "otherpass") == 403
+    assert history("Tracked Driver", "trackedpass") == 200
+    assert history("historyadmin", "adminpass") == 200
+
+
+def test_workers_compacting_at_once_count_each_point_once(tmp_path):
+    first, second = worker_app(tmp_path), worker_app(tmp_path)
+    with first.app_context():
+        create_db()
+        driver_id = add_driver("Busy Tracker", "trackerpass").id
+        start = datetime(2020, 1, 1, 9, 0)
+        db.session.execute(
+            insert(DriverLocation),
+            [
+                {
+                    "driver_id": driver_id,
+                    "status": "On Duty",
+                    "location": f"Street {i % 7}",
+                    "recorded_at": start + timedelta(seconds=i),
+                }
+                for i in range(5000)
+            ],
+        )
+        db.session.commit()
+
+    barrier = threading.Barrier(2)
+    compacted, failures = [], []
+
+    def compact(app):
+        with app.app_context():
+            barrier.wait()
+            try:
+                compacted.append(compact_location_history())
+            except Exception as e:
+                failures.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [
+        threading.Thread(target=compact, args=(app,)) for app in (first, second)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == [] and sum(compacted) == 5000
+    with first.app_context():
+        assert DriverLocation.query.count() == 0
+        samples = select(func.sum(DriverLocationRollup.sample_count))
+        assert db.session.scalar(samples) == 5000
+
+        # A point that arrives late for a compacted minute is merged into its bucket
+        db.session.add(DriverLocation(driver_id, "On Break", "Street 0", start))
+        db.session.commit()
+        assert compact_location_history() == 1
+        rollup = DriverLocationRollup.query.filter_by(
+            bucket_start=start, location="Street 0"
+        ).one()
+        assert (rollup.status, rollup.sample_count) == ("On Break", 10)
+
+
+def test_location_history_is_compacted_without_any_pings(monkeypatch):
+    # Drivers who only ever use PUT /api/drivers/status still get compacted
+    monkeypatch.setitem(current_app.config, "DRIVER_STATUS_FLUSH_INTERVAL", 0)
+    monkeypatch.setitem(current_app.config, "LOCATION_HISTORY_COMPACT_INTERVAL", 0.05)
+    driver = add_driver("Compacted", "compactpass")
+    update_driver_status(driver.id, "On Duty", "Depot")
+    db.session.add(
+        DriverLocation(driver.id, "On Duty", "Depot", datetime(2020, 1, 1, 9, 0))
+    )
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    compactor = start_location_history_compactor(app)
+    try:
+        assert start_location_history_compactor(app) is compactor
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            old = DriverLocation.query.filter(
+                DriverLocation.recorded_at < datetime(2021, 1, 1)
+            ).count()
+            db.session.commit()
+            if not old:
+                break
+            time.sleep(0.02)
+        assert old == 0
+    finally:
+        stop_periodic_tasks(app)
+    assert get_status_buffer(app).flusher is None
+
+
+def test_nearest_drivers_follow_status_updates_and_pings(monkeypatch):
+    monkeypatch.setitem(current_app.config, "DRIVER_STATUS_FLUSH_INTERVAL", 0)
+    near = add_driver(
+        "Near Van",
+        "nearpass",
+        "On Duty",
+        "Main Street",
+        latitude=10.640,
+        longitude=-61.400,
+    )
+    far = add_driver(
+        "Far Van", "farpass", "On Duty", "Oak Road", latitude=10.700, longitude=-61.300
+    )
+    add_driver(
+        "Parked Van",
+        "parkedpass",
+        "Off Duty",
+        "Depot",
+        latitude=10.640,
+        longitude=-61.400,
+    )
+
+    nearest = get_nearest_drivers(10.641, -61.401, k=5)
+    assert [d["username"] for d in nearest] == ["Near Van", "Far Van"]
+    assert nearest[0]["distance_km"] < 0.2
+
+    # Going off duty drops a van; a ping with coordinates moves one
+    update_driver_status(near.id, "Off Duty", "Home")
+    record_driver_status_ping(far.id, "On Duty", "Main Street", 10.641, -61.401)
+    nearest = get_nearest_drivers(10.641, -61.401, k=5)
+    assert [d["username"] for d in nearest] == ["Far Van"]
+    assert nearest[0]["distance_km"] == 0
+
+    # A rebuild from the database keeps pings that have not been flushed yet
+    monkeypatch.setitem(current_app.config, "SPATIAL_INDEX_REFRESH_SECONDS", 0)
+    assert (
+        get_nearest_drivers(10.641, -61.401, k=1)[0]["current_location"]
+        == "Main Street"
+    )
+    flush_driver_status_buffer()
+    db.session.expire_all()
+    assert Driver.query.get(far.id).latitude == 10.641
+    assert get_nearest_drivers(10.641, -61.401, k=1, max_km=0.01)[0]["id"] == far.id
+
+
+def test_nearest_drivers_route_needs_a_resident_and_valid_arguments():
+    app = current_app._get_current_object()
+    add_street("Nearby Street", latitude=10.640, longitude=-61.400)
+    add_resident("Nearby Resident", "nearbypass", "Nearby Street")
+    add_driver("Nearby Van", "vanpass", "On Duty", latitude=10.640, longitude=-61.400)
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {login('Nearby Resident', 'nearbypass')}"}
+
+    def nearest(query, headers=headers):
+        return client.get(
+            f"/api/drivers/nearest?lat=10.64&lon=-61.4{query}", headers=headers
+        )
+
+    # Live van positions are not for anonymous callers or other drivers
+    assert nearest("", headers=None).status_code == 401
+    driver_headers = {"Authorization": f"Bearer {login('Nearby Van', 'vanpass')}"}
+    assert nearest("", driver_headers).status_code == 403
+
+    response = nearest("&k=1")
+    assert response.status_code == 200
+    assert [d["username"] for d in response.get_json()] == ["Nearby Van"]
+    # Unparseable or non-finite values are refused instead of meaning the default
+    for query in ("&k=abc", "&max_km=abc", "&max_km=nan", "&max_km=inf"):
+        assert nearest(query).status_code == 400, query
+
+
+def test_plan_driver_route_orders_stops_and_chains_drives():
+    add_street("Route Street", latitude=10.640, longitude=-61.400)
+    add_street("Far Street", latitude=10.700, longitude=-61.300)
+    driver = add_driver(
+        "Router", "routerpass", "On Duty", "Depot", latitude=10.640, longitude=-61.390
+    )
+    resident = add_resident("Stopper", "stopperpass", "Route Street")
+    schedule_drive(driver.id, "Route Street", "2030-02-01 09:00")
+    schedule_drive(driver.id, "Far Street", "2030-02-01 11:00")
+    first, second = sorted(d.id for d in Drive.query.filter_by(driver_id=driver.id))
+
+    # Requested far end first; the plan should sweep from the van's side instead
+    request_stop(resident.id, first, "Far end", 10.640, -61.420)
+    request_stop(resident.id, first, "Middle", 10.640, -61.405)
+    request_stop(resident.id, first, "Near end", 10.640, -61.395)
+    request_stop(resident.id, first, "At the house")
+
+    plan = plan_driver_route(driver.id, drive_id=first)
+    stops = plan["drives"][0]["stops"]
+    assert [stop["message"] for stop in stops] == [
+        "Near end",
+        "At the house",
+        "Middle",
+        "Far end",
+    ]
+    etas = [stop["eta"] for stop in stops]
+    assert etas == sorted(etas) and etas[0] > datetime(2030, 2, 1, 9, 0)
+
+    day = plan_driver_route(driver.id, day=datetime(2030, 2, 1).date())
+    assert [d["drive_id"] for d in day["drives"]] == [first, second]
+    assert day["drives"][1]["stops"] == []
+    assert day["distance_km"] == plan["distance_km"]
+
+    with pytest.raises(ValueError, match="Drive not found"):
+        plan_driver_route(driver.id, drive_id=9999)
+
+
+def test_production_profile_tunes_sqlite_and_reports_pool_stats(tmp_path):
+    # A bare app, since create_app would push a second app context
+    app = Flask(__name__)
+    app.config.update(
+        DB_PROFILE="production",
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'profile.db'}",
+    )
+    init_db(app)
+    with app.app_context():
+        connection = db.session.connection()
+        pragma = lambda name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1
+        assert pragma("busy_timeout") == 5000
+
+        stats = get_pool_stats()
+        assert stats["pool"] == "QueuePool"
+        assert stats["checked_out"] == 1
+        assert stats["size"] == app.config["SQLALCHEMY_ENGINE_OPTIONS"]["pool_size"]
+        db.session.remove()
+
+
+def test_reads_route_to_replica_until_the_client_writes(tmp_path, monkeypatch):
+    # Two SQLite files stand in for a primary and its replica
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        SQLALCHEMY_BINDS={"replica": f"sqlite:///{tmp_path / 'replica.db'}"},
+        DB_READ_REPLICAS=["replica"],
+        CACHE_VERSION_DIR="",
+    )
+    # init_db registers a metadata for the bind on the shared db object
+    monkeypatch.setattr(db, "metadatas", dict(db.metadatas))
+    init_db(app)
+
+    @app.route("/drivers", methods=["GET", "POST"])
+    def drivers():
+        if request.method == "POST":
+            add_driver("Primary Van", "primarypass")
+        return jsonify(get_all_drivers_json())
+
+    @app.route("/streets")
+    def streets():
+        return jsonify(get_all_streets())
+
+    with app.app_context():
+        db.metadata.create_all(db.engines[None])
+        db.metadata.create_all(db.engines["replica"])
+        # Only the replica has this row, so seeing it proves where a read went
+        db.session.execute(
+            insert(User.__table__).values(
+                id=1, username="Replica Van", password="x", role="driver"
+            ),
+            bind_arguments={"bind": db.engines["replica"]},
+        )
+        db.session.execute(
+            insert(Driver.__table__).values(
+                id=1, status="On Duty", current_location="Depot"
+            ),
+            bind_arguments={"bind": db.engines["replica"]},
+        )
+        db.session.commit()
+        db.session.remove()
+
+        client = app.test_client()
+        assert "Replica Van" in client.get("/drivers").get_data(as_text=True)
+        db.session.remove()
+
+        # The writing request reads its own write, and the cookie keeps the client on the primary
+        response = client.post("/drivers")
+        assert "Primary Van" in response.get_data(as_text=True)
+        assert response.headers["Set-Cookie"].startswith(STICKY_COOKIE)
+        db.session.remove()
+        assert "Primary Van" in client.get("/drivers").get_data(as_text=True)
+        db.session.remove()
+
+        # Outside a request, replica_reads() opts a block in
+        with replica_reads():
+            assert Driver.query.one().username == "Replica Van"
+        db.session.remove()
+        assert Driver.query.one().username == "Primary Van"
+        db.session.remove()
+
+        # Reference data is cached from the primary: a replica yet to see a
+        # write would otherwise be cached under that write's new version
+        db.session.execute(
+            insert(Street.__table__).values(id=1, name="Lagging Street"),
+            bind_arguments={"bind": db.engines["replica"]},
+        )
+        db.session.commit()
+        add_street("Primary Street")
+        db.session.remove()
+        response = app.test_client().get("/streets")
+        assert "Primary Street" in response.get_data(as_text=True)
+        db.session.remove()
+        with replica_reads():
+            assert get_all_streets() == ["ID: 1 | Street Primary Street"]
+        db.session.remove()
+
+
+def test_reference_data_is_cached_until_a_write_invalidates_it():
+    add_street("Cached Street")
+    add_resident("Cachey", "cacheypass", "Cached Street")
+    get_all_streets()
+    get_all_residents_summary()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        assert get_all_streets() == ["ID: 1 | Street Cached Street"]
+        assert get_all_residents_summary()[0].endswith("Street: Cached Street")
+        assert statements == []
+
+        # Renaming a street invalidates both streets and resident summaries
+        update_street_name(1, "Renamed Street")
+        assert get_all_streets() == ["ID: 1 | Street Renamed Street"]
+        assert get_all_residents_summary()[0].endswith("Street: Renamed Street")
+        with pytest.raises(ValueError, match="not found"):
+            add_resident("Stale", "stalepass", "Cached Street")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+
+
+def worker_app(tmp_path):
+    """An app standing in for one gunicorn worker, on a database file shared with others."""
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'shared.db'}",
+        }
+    )
+    # create_app leaves its context pushed for the CLI; go back to the test's
+    app_ctx.pop()
+    return app
+
+
+def test_workers_share_invalidations_and_writes_recheck_streets(tmp_path):
+    # Versions are shared between workers unless configured otherwise
+    assert isinstance(get_reference_cache().versions, FileVersions)
+    first, second = worker_app(tmp_path), worker_app(tmp_path)
+    with first.app_context():
+        create_db()
+        add_street("Shared Street")
+        assert get_street_id_by_name("Shared Street")
+    with second.app_context():
+        delete_street(get_street_id_by_name("Shared Street"))
+    with first.app_context():
+        assert get_street_id_by_name("Shared Street") is None
+
+        # Even with an invalidation missed, writes look the street up afresh
+        add_street("Gone Street")
+        assert get_street_id_by_name("Gone Street")
+        db.session.execute(delete(Street).where(Street.name == "Gone Street"))
+        db.session.commit()
+        assert get_street_id_by_name("Gone Street")
+        driver = add_driver("Gone Driver", "gonepass")
+        with pytest.raises(ValueError, match="not found"):
+            schedule_drive(driver.id, "Gone Street", "2030-01-01 10:00")
+        with pytest.raises(ValueError, match="not found"):
+            add_resident("Gone Resident", "gonepass", "Gone Street")
+        assert Drive.query.count() == 0 and Resident.query.count() == 0
+
+
+def test_conditional_gets_answer_304_until_the_data_changes():
+    add_street("Etag Street")
+    driver = add_driver("Etag Driver", "etagpass")
+    resident = add_resident("Etag Resident", "etagpass", "Etag Street")
+    schedule_drive(driver.id, "Etag Street", "2030-03-01 09:00")
+    client = current_app.test_client()
+    endpoints = {
+        "/api/residents/inbox": {
+            "Authorization": f"Bearer {login('Etag Resident', 'etagpass')}"
+        },
+        "/api/drivers/requests": {
+            "Authorization": f"Bearer {login('Etag Driver', 'etagpass')}"
+        },
+        "/api/drivers": {},
+    }
+
+    etags = {}
+    for url, auth in endpoints.items():
+        first = client.get(url, headers=auth)
+        assert first.status_code == 200
+        etags[url] = first.headers["ETag"]
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, "before_cursor_execute", listener)
+        repeat = client.get(url, headers={**auth, "If-None-Match": etags[url]})
+        event.remove(db.engine, "before_cursor_execute", listener)
+        assert repeat.status_code == 304 and repeat.data == b""
+        # Only the version queries ran, not the full list
+        assert len(statements) <= 2, statements
+
+    request_stop(resident.id, 1, "Please stop by the gate.")
+    schedule_drive(driver.id, "Etag Street", "2030-03-02 09:00")
+    add_driver("Second Driver", "etagpass")
+    for url, auth in endpoints.items():
+        changed = client.get(url, headers={**auth, "If-None-Match": etags[url]})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etags[url]
+
+
+
+def test_renames_in_one_worker_change_the_etags_of_another(tmp_path):
+    first, second = worker_app(tmp_path), worker_app(tmp_path)
+    with first.app_context():
+        create_db()
+        add_street("Rename Street")
+        driver = add_driver("Old Driver", "renamepass")
+        resident = add_resident("Old Resident", "renamepass", "Rename Street")
+        schedule_drive(driver.id, "Rename Street", "2030-03-01 09:00")
+        request_stop(resident.id, 1, "Gate please")
+        driver_id, resident_id = driver.id, resident.id
+
+    with second.app_context():
+        client = second.test_client()
+        as_resident = {"Authorization": f"Bearer {login('Old Resident', 'renamepass')}"}
+        as_driver = {"Authorization": f"Bearer {login('Old Driver', 'renamepass')}"}
+        endpoints = {
+            "/api/drivers": ({}, "New Driver"),
+            "/api/v2/drivers": ({}, "New Driver"),
+            "/api/residents/inbox": (as_resident, "New Driver"),
+            "/api/drivers/requests": (as_driver, "New Resident"),
+        }
+        etags = {
+            url: client.get(url, headers=auth).headers["ETag"]
+            for url, (auth, _) in endpoints.items()
+        }
+
+    # Neither rename changes a count or a newest id
+    with first.app_context():
+        update_user(driver_id, "New Driver")
+        update_user(resident_id, "New Resident")
+
+    with second.app_context():
+        for url, (auth, new_name) in endpoints.items():
+            response = client.get(url, headers={**auth, "If-None-Match": etags[url]})
+            assert response.status_code == 200, url
+            assert new_name in response.get_data(as_text=True), url
+
+
+def test_projected_rows_match_get_json_and_encode_datetimes_as_iso():
+    add_street("Projection Street", 10.6, -61.4)
+    driver = add_driver("Projection Driver", "projpass")
+    resident = add_resident("Projection Resident", "projpass", "Projection Street")
+    schedule_drive(driver.id, "Projection Street", "2030-04-01 09:30")
+    request_stop(resident.id, 1, "By the gate")
+
+    for model in (Driver, Resident, Street, Drive, StopRequest):
+        objects = db.session.scalars(db.select(model).order_by(model.id)).all()
+        rows = db.session.execute(model.json_select().order_by(model.id)).all()
+        assert [row._asdict() for row in rows] == [o.get_json() for o in objects]
+    assert get_all_users_json() == [u.get_json() for u in User.query.all()]
+    # A role with no class of its own lists with the base user fields
+    auditor = create_user("Projection Auditor", "projpass")
+    db.session.execute(
+        User.__table__.update()
+        .where(User.__table__.c.id == auditor.id)
+        .values(role="auditor")
+    )
+    assert get_all_users_json()[-1] == {
+        "id": auditor.id,
+        "username": "Projection Auditor",
+    }
+    db.session.rollback()
+    assert get_all_drivers_json() == [driver.get_json()]
+    assert get_all_residents_json() == [resident.get_json()]
+
+    # List reads build no ORM objects
+    db.session.expunge_all()
+    get_all_residents_json()
+    assert len(db.session.identity_map) == 0
+
+    drive_json = current_app.json.dumps(db.session.get(Drive, 1).get_json())
+    assert '"scheduled_time":"2030-04-01T09:30:00"' in drive_json.replace(" ", "")
+    report = compare_list_serialization(repeat=1)
+    assert report["residents"]["rows"] == 1 and report["drives"]["rows"] == 1
+
+
+
+def test_v2_routes_return_structured_data_and_v1_keeps_strings():
+    add_street("Struct Street")
+    driver = add_driver("Struct Driver", "structpass")
+    resident = add_resident("Struct Resident", "structpass", "Struct Street")
+    schedule_drive(driver.id, "Struct Street", "2030-05-01 08:15")
+    request_stop(resident.id, 1, "Ring twice")
+    client = current_app.test_client()
+    as_resident = {"Authorization": f"Bearer {login('Struct Resident', 'structpass')}"}
+    as_driver = {"Authorization": f"Bearer {login('Struct Driver', 'structpass')}"}
+
+    inbox = client.get("/api/v2/residents/inbox", headers=as_resident).json
+    assert inbox == {
+        "street_id": 1,
+        "street_name": "Struct Street",
+        "drives": [
+            {
+                "drive_id": 1,
+                "driver_id": driver.id,
+                "driver": "Struct Driver",
+                "scheduled_time": "2030-05-01T08:15:00",
+            }
+        ],
+    }
+    page = client.get(
+        "/api/v2/residents/inbox?upcoming=true&limit=1", headers=as_resident
+    ).json
+    assert page["items"] == inbox["drives"] and page["next_cursor"] is None
+
+    requests = client.get("/api/v2/drivers/requests", headers=as_driver).json
+    assert requests["driver"] == "Struct Driver"
+    assert requests["requests"] == [
+        {
+            "stop_request_id": 1,
+            "drive_id": 1,
+            "scheduled_time": "2030-05-01T08:15:00",
+            "resident_id": resident.id,
+            "resident": "Struct Resident",
+            "message": "Ring twice",
+        }
+    ]
+    assert client.get("/api/v2/drivers").json == [
+        {"id": driver.id, "username": "Struct Driver"}
+    ]
+    assert client.get("/api/v2/residents?limit=5").json["items"] == [
+        resident.get_json()
+    ]
+
+    # The v1 routes still answer the same strings
+    assert client.get("/api/residents/inbox", headers=as_resident).json == [
+        "Drive ID: 1 | Driver: Struct Driver | Scheduled Time: 2030-05-01 08:15"
+    ]
+    assert client.get("/api/drivers/requests", headers=as_driver).json == [
+        "Drive ID: 1 | Time: 2030-05-01 08:15 AM | Resident: Struct Resident | Message: Ring twice"
+    ]
+    assert client.get("/api/drivers").json == [
+        f"ID: {driver.id} | Driver: Struct Driver"
+    ]
+
+
+def test_recurring_schedule_materializes_and_edits_as_a_series():
+    add_street("Weekly Street")
+    add_street("Other Street")
+    driver = add_driver("Weekly Driver", "weeklypass")
+    resident = add_resident("Weekly Resident", "weeklypass", "Weekly Street")
+    schedule = create_drive_schedule(
+        driver.id, "Weekly Street", "MO,TH", "09:30", starts_on="2030-06-03"
+    )
+    # Monday 2030-06-03: four weeks ahead is eight Monday and Thursday drives
+    now = datetime(2030, 6, 3, 8, 0)
+    assert materialize_drive_schedules(now=now, horizon_days=27) == 8
+    assert materialize_drive_schedules(now=now, horizon_days=27) == 0
+    drives = Drive.query.filter_by(schedule_id=schedule.id).order_by(Drive.id).all()
+    assert [d.scheduled_time.strftime("%a %H:%M") for d in drives[:2]] == [
+        "Mon 09:30",
+        "Thu 09:30",
+    ]
+    request_stop(resident.id, drives[1].id, "Thursday please")
+
+    client = current_app.test_client()
+    auth = {"Authorization": f"Bearer {login('Weekly Resident', 'weeklypass')}"}
+    etag = client.get("/api/residents/inbox", headers=auth).headers["ETag"]
+
+    # Thursdays move to 10:00, Mondays are dropped and Fridays added
+    later = datetime(2030, 6, 4, 12, 0)
+    update_drive_schedule(
+        schedule.id, driver.id, weekdays="TH,FR", time_str="10:00", now=later
+    )
+    times = [
+        d.scheduled_time
+        for d in Drive.query.filter_by(schedule_id=schedule.id).order_by(
+            Drive.scheduled_time
+        )
+    ]
+    assert times[0] == datetime(2030, 6, 3, 9, 30)  # already past, left alone
+    assert times[1:3] == [datetime(2030, 6, 6, 10, 0), datetime(2030, 6, 7, 10, 0)]
+    assert all(t.strftime("%a") in ("Thu", "Fri") for t in times[1:])
+    # The stop request followed its drive to the new time
+    assert db.session.get(Drive, drives[1].id).stop_requests[0].message == (
+        "Thursday please"
+    )
+    changed = client.get(
+        "/api/residents/inbox", headers={**auth, "If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+
+    with pytest.raises(ValueError, match="Schedule not found"):
+        cancel_drive_schedule(schedule.id, driver_id=driver.id + 100)
+    removed = cancel_drive_schedule(schedule.id, driver.id, now=later)
+    assert removed == len(times) - 1
+    assert Drive.query.filter_by(schedule_id=schedule.id).count() == 1
+    assert StopRequest.query.count() == 0
+    assert materialize_drive_schedules(now=later) == 0
+
+
+
+def test_series_edits_never_move_drives_into_the_past_or_keep_foreign_stops():
+    add_street("Old Street")
+    add_street("New Street")
+    driver = add_driver("Moving Driver", "movingpass")
+    resident = add_resident("Old Resident", "oldpass", "Old Street")
+    schedule = create_drive_schedule(
+        driver.id, "Old Street", "MO,TH", "09:30", starts_on="2030-06-03"
+    )
+    now = datetime(2030, 6, 3, 9, 0)
+    materialize_drive_schedules(now=now, horizon_days=6)
+    thursday = Drive.query.filter_by(
+        schedule_id=schedule.id, scheduled_time=datetime(2030, 6, 6, 9, 30)
+    ).one()
+    request_stop(resident.id, thursday.id, "Old Street stop")
+
+    # Today's 09:30 drive would move to 08:30, already gone by at 09:00
+    update_drive_schedule(schedule.id, driver.id, time_str="08:30", now=now)
+    times = [d.scheduled_time for d in Drive.query.filter_by(schedule_id=schedule.id)]
+    assert all(t >= now for t in times)
+    assert datetime(2030, 6, 6, 8, 30) in times
+    assert StopRequest.query.filter_by(drive_id=thursday.id).count() == 1
+
+    # The drives no longer visit the old street, so its residents' stops go
+    update_drive_schedule(schedule.id, driver.id, street_name="New Street", now=now)
+    assert {d.street_id for d in Drive.query.filter_by(schedule_id=schedule.id)} == {
+        get_street_id_by_name("New Street")
+    }
+    assert StopRequest.query.filter_by(drive_id=thursday.id).count() == 0
+
+
+def test_drive_schedules_are_materialized_without_any_pings(monkeypatch):
+    monkeypatch.setitem(current_app.config, "DRIVER_STATUS_FLUSH_INTERVAL", 0)
+    monkeypatch.setitem(current_app.config, "DRIVE_SCHEDULE_MATERIALIZE_INTERVAL", 0.05)
+    add_street("Rolling Street")
+    driver = add_driver("Rolling Driver", "rollingpass")
+    schedule = create_drive_schedule(driver.id, "Rolling Street", "MO,WE,FR", "07:00")
+    created = Drive.query.filter_by(schedule_id=schedule.id).count()
+    assert created
+    # As if the horizon had rolled on since the series was last materialized
+    Drive.query.filter_by(schedule_id=schedule.id).delete()
+    schedule.materialized_until = None
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    start_drive_schedule_materializer(app)
+    try:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            count = Drive.query.filter_by(schedule_id=schedule.id).count()
+            db.session.commit()
+            if count == created:
+                break
+            time.sleep(0.02)
+        assert count == created
+    finally:
+        stop_periodic_tasks(app)
+    assert get_status_buffer(app).flusher is None
+
+
+def test_drive_schedule_routes_create_edit_and_cancel():
+    add_street("Route Street")
+    add_driver("Series Driver", "seriespass")
+    client = current_app.test_client()
+    auth = {"Authorization": f"Bearer {login('Series Driver', 'seriespass')}"}
+
+    bad = client.post(
+        "/api/drivers/schedules",
+        json={"street_name": "Route Street", "weekdays": "XX", "time": "9am"},
+        headers=auth,
+    )
+    assert bad.status_code == 400 and len(bad.json["errors"]) == 2
+
+    created = client.post(
+        "/api/drivers/schedules",
+        json={"street_name": "Route Street", "weekdays": ["SA"], "time": "07:45"},
+        headers=auth,
+    )
+    assert created.status_code == 201
+    schedule = created.json
+    assert schedule["weekdays"] == "SA" and schedule["time"] == "07:45"
+    assert Drive.query.filter_by(schedule_id=schedule["id"]).count() >= 4
+
+    updated = client.put(
+        f"/api/drivers/schedules/{schedule['id']}",
+        json={"time": "08:15", "ends_on": date.today().isoformat()},
+        headers=auth,
+    )
+    assert updated.status_code == 200 and updated.json["time"] == "08:15"
+    assert client.get("/api/drivers/schedules", headers=auth).json == [updated.json]
+
+    cancelled = client.delete(f"/api/drivers/schedules/{schedule['id']}", headers=auth)
+    assert cancelled.status_code == 200
+    missing = client.delete("/api/drivers/schedules/999", headers=auth)
+    assert missing.status_code == 404
+
+
+def test_overlapping_drives_are_refused_and_skipped_when_materialized():
+    add_street("Busy Street")
+    driver = add_driver("Busy Driver", "busypass")
+    schedule_drive(driver.id, "Busy Street", "2030-06-03 09:00", 60)
+    with pytest.raises(ValueError, match="overlaps drive"):
+        schedule_drive(driver.id, "Busy Street", "2030-06-03 09:30")
+    with pytest.raises(ValueError, match="Duration"):
+        schedule_drive(driver.id, "Busy Street", "2030-06-04 09:30", 0)
+    # Back to back is fine, both before and after
+    schedule_drive(driver.id, "Busy Street", "2030-06-03 08:30")
+    schedule_drive(driver.id, "Busy Street", "2030-06-03 10:00")
+    assert Drive.query.count() == 3
+
+    slots = [(datetime(2030, 6, 5, 9, 0), 30), (datetime(2030, 6, 5, 9, 15), 30)]
+    [conflict] = find_drive_conflicts(driver.id, slots)
+    assert conflict["slot"] == 1 and conflict["conflicting_drive_id"] is None
+
+    client = current_app.test_client()
+    auth = {"Authorization": f"Bearer {login('Busy Driver', 'busypass')}"}
+    check = client.post(
+        "/api/drivers/schedule/validate",
+        json={"time_str": "2030-06-03 09:15", "duration_minutes": 30},
+        headers=auth,
+    )
+    assert check.status_code == 200 and check.json["valid"] is False
+    assert check.json["conflicts"][0]["conflicting_start"] == "2030-06-03T09:00:00"
+    series = client.post(
+        "/api/drivers/schedule/validate",
+        json={"weekdays": "MO", "time": "11:00"},
+        headers=auth,
+    )
+    assert series.status_code == 200 and series.json["valid"] is True
+    assert series.json["drives"]
+
+    # A series booked straight over an existing drive is refused
+    tomorrow = date.today() + timedelta(days=1)
+    schedule_drive(driver.id, "Busy Street", f"{tomorrow} 09:00", 60)
+    with pytest.raises(ValueError, match="overlaps"):
+        create_drive_schedule(
+            driver.id, "Busy Street", tomorrow.strftime("%a")[:2], "09:15"
+        )
+    # A one-off drive booked after the series exists is skipped by materialization
+    schedule = create_drive_schedule(
+        driver.id, "Busy Street", "TU", "12:00", starts_on="2030-06-04"
+    )
+    schedule_drive(driver.id, "Busy Street", "2030-06-11 12:10")
+    schedule.materialized_until = None
+    db.session.commit()
+    now = datetime(2030, 6, 3, 8, 0)
+    assert materialize_drive_schedules(now=now, horizon_days=13) == 1
+    series_times = [
+        d.scheduled_time for d in Drive.query.filter_by(schedule_id=schedule.id)
+    ]
+    assert series_times == [datetime(2030, 6, 4, 12, 0)]
+
+
+def test_load_test_replays_the_postman_collection_and_reports_percentiles():
+    requests = load_collection()
+    assert requests["Driver Login"]["saves"] == {"driverToken": "access_token"}
+    assert requests["Resident Inbox"]["path"] == "/api/residents/inbox"
+
+    # The collection's stop request is for drive 1 on Main Street
+    add_street("Main Street")
+    driver = add_driver("Load Driver", "loadpass")
+    schedule_drive(driver.id, "Main Street", "2030-06-03 09:00")
+
+    report = run_load_test(
+        AppTarget(current_app._get_current_object()), total=30, concurrency=1, seed=7
+    )
+    endpoints = report["endpoints"]
+    assert set(endpoints) <= {
+        "Resident Inbox",
+        "Update Driver Status",
+        "Stop Request",
+        "Driver Login",
+        "Resident Login",
+    }
+    assert sum(e["count"] for e in endpoints.values()) == report["overall"]["count"]
+    assert report["overall"]["count"] >= 30 and report["overall"]["errors"] == 0
+    # Setup created the collection's users and logged them in, so nothing was refused
+    assert set(report["overall"]["statuses"]) <= {"200", "201"}
+    inbox = endpoints["Resident Inbox"]
+    assert inbox["p50_ms"] <= inbox["p95_ms"] <= inbox["p99_ms"] <= inbox["max_ms"]
+    assert inbox["rps"] > 0
+
+
+def test_seed_database_bulk_inserts_a_consistent_data_set():
+    add_street("Main Street")
+    created = seed_database(300, seed=3)
+    assert created == {
+        "streets": 3,
+        "drivers": 3,
+        "residents": 300,
+        "drives": 300,
+        "stop_requests": 300,
+    }
+    assert Resident.query.count() == 300 and Street.query.count() == 4
+    # Every stop request is from a resident on its drive's street
+    mismatched = (
+        db.session.query(StopRequest)
+        .join(Drive)
+        .join(Resident)
+        .filter(Resident.street_id != Drive.street_id)
+        .count()
+    )
+    assert mismatched == 0
+    driver = Driver.query.first()
+    drives = sorted(d.scheduled_time for d in driver.drives)
+    # A driver's seeded drives never overlap
+    assert all(
+        later - earlier >= timedelta(minutes=30)
+        for earlier, later in zip(drives, drives[1:])
+    )
+    # One hash, shared by every seeded user
+    resident = Resident.query.first()
+    assert login(resident.username, SEED_PASSWORD)
+    assert len({user.password for user in User.query.filter(User.id > 1)}) == 1
+
+
+def test_metrics_endpoint_reports_requests_and_adds_up_worker_snapshots(tmp_path):
+    app = current_app._get_current_object()
+    app.config["METRICS_DIR"] = str(tmp_path)
+    client = app.test_client()
+    add_driver("Metric Driver", "metricpass")
+    client.get("/health")
+    client.get("/health")
+    client.get("/no-such-page")
+    assert login("Metric Driver", "metricpass")
+
+    # Another worker's snapshot, as its writer would have left it
+    other = get_metrics(app).snapshot()
+    other["pid"] = -1
+    get_metrics(app).write_snapshot(str(tmp_path))
+    (tmp_path / "metrics-1.json").write_text(json.dumps(other))
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    lines = response.get_data(as_text=True).splitlines()
+    health = 'blueprint="index_views",endpoint="health_check"'
+    # Two health checks here and two in the other worker's snapshot
+    assert f'http_requests_total{{{health},method="GET",status="200"}} 4' in lines
+    assert (
+        f'http_requests_total{{blueprint="",endpoint="",method="GET",status="404"}} 2'
+        in lines
+    )
+    assert f"http_request_duration_seconds_count{{{health}}} 4" in lines
+    # This scrape is in flight; the other worker's requests had finished
+    assert "http_requests_in_flight 1" in lines
+    assert 'password_hash_duration_seconds_count{operation="hash"} 2' in lines
+    assert 'password_hash_duration_seconds_count{operation="verify"} 2' in lines
+    assert any(line.startswith("db_query_duration_seconds_count ") for line in lines)
+    assert any(
+        line.startswith("db_pool_checkout_wait_seconds_count ") for line in lines
+    )
+
+
+def test_stats_metrics_and_slow_log_share_one_timing_per_statement(tmp_path):
+    app = current_app._get_current_object()
+    timers = app.extensions["query_timers"]
+    assert len(timers) == 3
+    slow_log = app.extensions["slow_query_log"]
+    slow_log.threshold = 0
+    slow_log.path = str(tmp_path / "slow.jsonl")
+    timings = []
+    timers.append(lambda conn, statement, *args: timings.append(args[-1]))
+    histogram = get_metrics(app).histograms[("db_query_duration_seconds", ())]
+    before = histogram[-1]
+    try:
+        with track_queries() as stats:
+            Street.query.all()
+    finally:
+        timers.pop()
+
+    # Every consumer got the same measurement of the one statement
+    assert stats.count == len(timings) == 1
+    assert stats.seconds == timings[0]
+    assert histogram[-1] - before == pytest.approx(timings[0])
+    assert read_slow_queries(slow_log.path)[0]["ms"] == round(timings[0] * 1000, 3)
+
+
+def test_slow_queries_are_logged_with_their_controller_and_plan(tmp_path):
+    app = current_app._get_current_object()
+    add_street("Main Street")
+    driver = add_driver("Slow Driver", "slowpass")
+    resident = add_resident("Slow Resident", "slowpass", "Main Street")
+    schedule_drive(driver.id, "Main Street", "2030-06-03 09:00")
+
+    # Every statement counts as slow, and each is written once per minute
+    slow_log = app.extensions["slow_query_log"]
+    slow_log.threshold = 0
+    slow_log.path = str(tmp_path / "slow.jsonl")
+    get_resident_inbox(resident.id)
+    get_resident_inbox(resident.id)
+    get_stop_requests_for_driver(driver.id)
+
+    entries = read_slow_queries(slow_log.path)
+    inbox = [e for e in entries if e["controller"] == "get_resident_inbox"]
+    assert inbox and all(e["count"] == 1 for e in inbox)
+    assert inbox[0]["source"].startswith("App/controllers/Resident.py:")
+    assert any("drive" in e["statement"] and e["plan"] for e in inbox)
+    assert all("?" not in json.dumps(e["parameters"]) for e in entries)
+    assert any(e["controller"] == "get_stop_requests_for_driver" for e in entries)
+
+    slow_log.interval = 0
+    get_resident_inbox(resident.id)
+    # The repeats held back in between are carried by the next entry written
+    carried = read_slow_queries(slow_log.path)[len(entries) :]
+    assert any(
+        e["controller"] == "get_resident_inbox" and e["count"] == 2 for e in carried
+    )
+
+    worst = summarize_slow_queries(read_slow_queries(slow_log.path), limit=3)
+    assert len(worst) == 3
+    assert worst[0]["total_ms"] >= worst[1]["total_ms"] >= worst[2]["total_ms"]
+
+
+def test_slow_query_repeats_are_flushed_when_not_slow_again(tmp_path):
+    app = current_app._get_current_object()
+    slow_log = app.extensions["slow_query_log"]
+    slow_log.threshold = 0
+    slow_log.path = str(tmp_path / "slow.jsonl")
+    add_street("Flush Street")
+    for _ in range(3):
+        get_street_id_by_name("Flush Street", cached=False)
+    statement = read_slow_queries(slow_log.path)[-1]["statement"]
+
+    # Nothing is due until the interval is over
+    assert slow_log.flush() == []
+    slow_log.interval = 0
+    repeats = [e for e in slow_log.flush() if e["statement"] == statement]
+    assert [(e["count"], e["repeats"], e["plan"]) for e in repeats] == [
+        (2, True, None)
+    ]
+    entries = [
+        e for e in read_slow_queries(slow_log.path) if e["statement"] == statement
+    ]
+    assert sum(e["count"] for e in entries) == 3
+    assert summarize_slow_queries(entries)[0]["count"] == 3
+    # Written once; a statement with nothing held back is forgotten
+    assert slow_log.flush() == []
+    assert statement not in slow_log.pending
+
+
+def test_failing_explain_leaves_the_callers_transaction_alone():
+    db.session.add(Street(name="Uncommitted Street"))
+    db.session.flush()
+    conn = db.session.connection()
+    plan = explain(conn, "SELECT * FROM no_such_table", ())
+    assert plan[0].startswith("EXPLAIN failed:")
+    assert explain(conn, "SELECT * FROM street WHERE name = ?", ("Main Street",))
+    # The savepoint is gone, and the work before it survives and commits
+    db.session.commit()
+    assert Street.query.filter_by(name="Uncommitted Street").count() == 1
@@ -0,0 +1,192 @@
+import pytest
+from flask import current_app
+from App.main import create_app
+from App.database import db, create_db
+from App.models import Driver, Resident, Drive, StopRequest
+from App.utils.querystats import (
+    QUERY_COUNT_HEADER,
+    N_PLUS_ONE_HEADER,
+    track_queries,
+)
+from App.controllers import (
+    add_street,
+    seed_database,
+    login,
+    SEED_PASSWORD,
+)
+from sqlalchemy import select
+
+# Most statements (reads and writes) each endpoint may run, whatever the size
+# of the data. A list that starts running a query per row blows through
+# these at once.
+QUERY_BUDGETS = {
+    "user_views.get_users_action": 1,
+    "driver_views.get_drivers_summary_route": 2,
+    "driver_views.get_drivers_summary_v2_route": 2,
+    "resident_views.get_residents_summary_route": 2,
+    "resident_views.get_residents_summary_v2_route": 2,
+    "driver_views.get_driver_requests_route": 3,
+    "resident_views.get_resident_inbox_route": 4,
+    "resident_views.get_resident_inbox_v2_route": 4,
+    "driver_views.update_driver_status_route": 4,
+    "resident_views.request_stop_route": 4,
+    "driver_views.schedule_drive_route": 5,
+    "driver_views.get_drive_schedules_route": 1,
+}
+
+
+# =============================================================================
+#                               Fixtures
+# =============================================================================
+
+
+@pytest.fixture(autouse=True)
+def empty_db():
+    """
+    Provides a clean in-memory database for each test.
+    Automatically applies to all tests.
+    """
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQL_QUERY_DEBUG": True,
+        }
+    )
+    with app.app_context():
+        create_db()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def seeded():
+    """Enough rows that a query per row would show: 200 residents and drives."""
+    add_street("Main Street")
+    seed_database(200, seed=5)
+    drive = db.session.execute(
+        select(Drive.id, Drive.driver_id, Drive.street_id)
+        .join(StopRequest, StopRequest.drive_id == Drive.id)
+        .limit(1)
+    ).one()
+    driver = db.session.get(Driver, drive.driver_id)
+    resident = db.session.scalars(
+        select(Resident).where(Resident.street_id == drive.street_id).limit(1)
+    ).one()
+    return {
+        "drive_id": drive.id,
+        "driver_auth": {
+            "Authorization": f"Bearer {login(driver.username, SEED_PASSWORD)}"
+        },
+        "resident_auth": {
+            "Authorization": f"Bearer {login(resident.username, SEED_PASSWORD)}"
+        },
+    }
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Sends a request through the test client and fails if its endpoint ran
+    more queries than QUERY_BUDGETS allows, or repeated a statement enough
+    to look like an N+1. Returns the response.
+    """
+    client = current_app.test_client()
+    adapter = current_app.url_map.bind("localhost")
+
+    def request(method, path, **kwargs):
+        endpoint, _ = adapter.match(path, method=method)
+        response = client.open(path, method=method, **kwargs)
+        assert response.status_code < 400, response.get_data(as_text=True)
+        count = int(response.headers[QUERY_COUNT_HEADER])
+        assert count <= QUERY_BUDGETS[endpoint], (
+            f"{method} {path} ({endpoint}) ran {count} queries, "
+            f"budget {QUERY_BUDGETS[endpoint]}"
+        )
+        assert response.headers[N_PLUS_ONE_HEADER] == "0"
+        return response
+
+    return request
+
+
+# =============================================================================
+#                           Query Budget Tests
+# =============================================================================
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/users",
+        "/api/drivers",
+        "/api/v2/drivers",
+        "/api/residents",
+        "/api/v2/residents",
+    ],
+)
+def test_lists_stay_within_budget(seeded, query_budget, path):
+    query_budget("GET", path)
+
+
+def test_driver_endpoints_stay_within_budget(seeded, query_budget):
+    auth = seeded["driver_auth"]
+    query_budget("GET", "/api/drivers/requests", headers=auth)
+    query_budget(
+        "PUT",
+        "/api/drivers/status",
+        json={"status": "On Duty", "location": "Main Street"},
+        headers=auth,
+    )
+    query_budget(
+        "POST",
+        "/api/drivers/schedule",
+        json={"street_name": "Main Street", "time_str": "2100-01-01 10:00"},
+        headers=auth,
+    )
+    query_budget("GET", "/api/drivers/schedules", headers=auth)
+
+
+def test_resident_endpoints_stay_within_budget(seeded, query_budget):
+    auth = seeded["resident_auth"]
+    query_budget("GET", "/api/residents/inbox", headers=auth)
+    query_budget("GET", "/api/v2/residents/inbox", headers=auth)
+    query_budget(
+        "POST",
+        "/api/residents/request-stop",
+        json={"drive_id": seeded["drive_id"], "message": "Corner please"},
+        headers=auth,
+    )
+
+
+def test_lazy_loads_per_row_are_flagged_as_n_plus_one(seeded):
+    with track_queries() as stats:
+        # Each drive's stop requests are a lazy load of their own
+        [len(drive.stop_requests) for drive in Drive.query.limit(20)]
+    [(statement, count)] = stats.repeated(5)
+    assert statement.startswith("SELECT stop_request.") and count == 20
+    assert stats.count == 21
+
+    app = current_app._get_current_object()
+    app.config["SQL_N_PLUS_ONE_THRESHOLD"] = 5
+
+    @app.route("/n-plus-one")
+    def n_plus_one_route():
+        return {"stops": [len(d.stop_requests) for d in Drive.query.limit(20)]}
+
+    response = current_app.test_client().get("/n-plus-one")
+    assert response.headers[N_PLUS_ONE_HEADER] == "1"
+    assert response.headers[QUERY_COUNT_HEADER] == "21"
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+
+def test_cli_commands_report_their_queries():
+    app = current_app._get_current_object()
+
+    @app.cli.command("count-drivers")
+    def count_drivers():
+        Driver.query.count()
+        Resident.query.count()
+
+    result = app.test_cli_runner().invoke(args=["count-drivers"])
+    assert "count-drivers: 2 queries in" in result.output
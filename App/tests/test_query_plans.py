@@ -0,0 +1,191 @@
+import re
+import pytest
+from sqlalchemy import event
+from App.main import create_app
+from App.database import db, create_db
+from App.controllers import (
+    add_driver,
+    add_resident,
+    add_street,
+    schedule_drive,
+    request_stop,
+    get_resident_inbox,
+    get_upcoming_inbox_page,
+    get_stop_requests_for_driver,
+    get_driver_status_and_location,
+    get_driver_location_history,
+    update_driver_status,
+    plan_driver_route,
+    get_resident_inbox_version,
+    get_driver_requests_version,
+    create_drive_schedule,
+    update_drive_schedule,
+    cancel_drive_schedule,
+)
+from datetime import datetime
+
+
+# Tables that grow without bound; a full scan of any of them is a regression
+LARGE_TABLES = {
+    "drive",
+    "stop_request",
+    "driver_location",
+    "driver_location_rollup",
+    "user",
+    "resident",
+}
+
+# Aliased tables (user_1 in a joined load) count as the table itself
+FULL_SCAN_PATTERN = re.compile(r"^SCAN (\w+?)(?:_\d+)?(?: |$)")
+SORT_PATTERN = re.compile(r"USE TEMP B-TREE FOR ORDER BY")
+
+
+# =============================================================================
+#                               Fixtures
+# =============================================================================
+
+
+@pytest.fixture(autouse=True)
+def empty_db():
+    """
+    Provides a clean in-memory database for each test.
+    Automatically applies to all tests.
+    """
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    with app.app_context():
+        create_db()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def seeded():
+    """Two streets with a handful of drives and stop requests on each."""
+    add_street("Main Street")
+    add_street("Elm Street")
+    driver = add_driver("Bob", "bobpass")
+    resident = add_resident("Charlie", "charliepass", "Main Street")
+    add_resident("Emily", "emilypass", "Elm Street")
+    for day in range(1, 6):
+        schedule_drive(driver.id, "Main Street", f"2030-01-0{day} 09:00")
+        schedule_drive(driver.id, "Elm Street", f"2030-01-0{day} 10:00")
+    request_stop(resident.id, 1, "Please stop at the corner.")
+    request_stop(resident.id, 3, "Outside the bakery please.")
+    db.session.expire_all()
+    return {"driver_id": driver.id, "resident_id": resident.id}
+
+
+def capture_statements(func, *args):
+    """Runs a controller and returns every SELECT it sent to the database."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        func(*args)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def explain(statement, parameters):
+    rows = db.session.connection().exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {statement}", parameters
+    )
+    return [row[-1] for row in rows]
+
+
+def assert_index_bound(statements):
+    assert statements, "Controller issued no SELECT statements"
+    for statement, parameters in statements:
+        plan = explain(statement, parameters)
+        for step in plan:
+            match = FULL_SCAN_PATTERN.match(step)
+            assert not (match and match.group(1) in LARGE_TABLES), (
+                f"Full table scan in plan {plan} for:\n{statement}"
+            )
+            assert not SORT_PATTERN.search(step), (
+                f"Unindexed sort in plan {plan} for:\n{statement}"
+            )
+
+
+# =============================================================================
+#                           Query Plan Tests
+# =============================================================================
+
+
+def test_resident_inbox_is_index_bound(seeded):
+    statements = capture_statements(get_resident_inbox, seeded["resident_id"])
+    assert_index_bound(statements)
+
+
+def test_upcoming_inbox_page_is_index_bound(seeded):
+    first = get_upcoming_inbox_page(seeded["resident_id"], limit=2)
+    statements = capture_statements(
+        get_upcoming_inbox_page, seeded["resident_id"], 2, first["next_cursor"]
+    )
+    assert_index_bound(statements)
+
+
+def test_stop_requests_for_driver_is_index_bound(seeded):
+    statements = capture_statements(get_stop_requests_for_driver, seeded["driver_id"])
+    assert_index_bound(statements)
+
+
+def test_driver_status_and_location_is_index_bound(seeded):
+    statements = capture_statements(
+        get_driver_status_and_location, seeded["driver_id"]
+    )
+    assert_index_bound(statements)
+
+
+def test_request_stop_is_index_bound(seeded):
+    statements = capture_statements(
+        request_stop, seeded["resident_id"], 5, "Second stop please."
+    )
+    assert_index_bound(statements)
+
+
+def test_driver_location_history_is_index_bound(seeded):
+    update_driver_status(seeded["driver_id"], "On Duty", "Main Street")
+    statements = capture_statements(
+        get_driver_location_history,
+        seeded["driver_id"],
+        datetime(2020, 1, 1),
+        datetime(2040, 1, 1),
+    )
+    assert_index_bound(statements)
+
+
+def test_plan_driver_route_is_index_bound(seeded):
+    statements = capture_statements(
+        plan_driver_route, seeded["driver_id"], None, datetime(2030, 1, 1).date()
+    )
+    assert_index_bound(statements)
+
+
+def test_conditional_get_versions_are_index_bound(seeded):
+    statements = capture_statements(get_resident_inbox_version, seeded["resident_id"])
+    statements += capture_statements(get_driver_requests_version, seeded["driver_id"])
+    assert_index_bound(statements)
+
+
+def test_drive_schedule_series_edits_are_index_bound(seeded):
+    schedule = create_drive_schedule(
+        seeded["driver_id"], "Main Street", "MO,FR", "08:00"
+    )
+    statements = capture_statements(
+        lambda: update_drive_schedule(schedule.id, weekdays="MO", time_str="08:30")
+    )
+    statements += capture_statements(cancel_drive_schedule, schedule.id)
+    assert_index_bound(statements)
+
+
+def test_plan_check_detects_full_scan(seeded):
+    statements = [("SELECT * FROM drive WHERE scheduled_time > ?", ("2030-01-01",))]
+    with pytest.raises(AssertionError, match="Full table scan"):
+        assert_index_bound(statements)
@@ -1,8 +1,29 @@
+import json
+import os
 import pytest
+import socket
+import time
+from types import SimpleNamespace
+from flask import current_app
 from unittest.mock import patch, MagicMock
 from App.main import create_app
 from App.database import db, create_db
 from App.models import Drive, User, Driver, Resident, Street, StopRequest
+from App.utils.pagination import encode_cursor, decode_cursor, iter_json_array
+from App.utils.hashing import hash_passwords, run_off_loop
+from App.utils.pubsub import PubSubHub, Relay, HEARTBEAT_FRAME
+from App.utils.status_buffer import DriverStatusBuffer
+from App.utils.scheduler import start_periodic_task, stop_periodic_tasks
+from App.utils.spatial import SpatialGrid, haversine_km
+from App.database import production_engine_options
+from App.utils.cache import TTLCache, ReferenceCache, FileVersions
+from App.utils.routing import distance_matrix, path_length, plan_visiting_order
+from App.utils.validation import validate_optional_coordinates
+from App.utils.recurrence import parse_weekdays, format_weekdays, occurrences
+from App.utils.intervals import IntervalIndex
+from App.utils.querystats import QueryStats, normalize_statement
+from App.utils.metrics import MetricsRegistry, merge_snapshots, render_metrics
+from App.utils.slowqueries import explain, parameter_shapes, summarize_slow_queries
 from App.controllers import (
     schedule_drive,
     get_resident_inbox,
@@ -63,6 +84,28 @@ def test_check_password():
     assert not user.check_password("notmypassword")  # Wrong password should fail
 
 
+def test_password_needs_rehash_when_cost_changes(monkeypatch):
+    user = User(username="test", password="mypassword")
+    assert not user.password_needs_rehash()
+    monkeypatch.setitem(
+        current_app.config, "PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000"
+    )
+    assert user.password_needs_rehash()
+    assert user.check_password("mypassword")
+
+
+def test_hash_passwords_preserves_order():
+    hashes = hash_passwords(["first_pass", "second_pass"])
+    user = User(username="test", password="placeholder")
+    user.password = hashes[1]
+    assert user.check_password("second_pass")
+    assert not user.check_password("first_pass")
+
+
+def test_run_off_loop_returns_result():
+    assert run_off_loop(sum, [1, 2, 3]) == 6
+
+
 def test_new_driver():
     driver = User(username="driver1", password="driverpass")
     assert driver.username == "driver1"
@@ -93,7 +136,12 @@ def test_new_street():
 def test_street_json():
     street = Street(name="Main Street")
     street_json = street.get_json()
-    assert street_json == {"id": None, "name": "Main Street"}
+    assert street_json == {
+        "id": None,
+        "name": "Main Street",
+        "latitude": None,
+        "longitude": None,
+    }
 
 
 def test_new_drive():
@@ -111,6 +159,7 @@ def test_drive_json():
         "driver_id": 1,
         "street_id": 2,
         "scheduled_time": "2025-10-10 10:00",
+        "duration_minutes": 30,
     }
 
 
@@ -133,6 +182,8 @@ def test_stop_request_json():
         "resident_id": 1,
         "drive_id": 2,
         "message": "Stop by the red house.",
+        "latitude": None,
+        "longitude": None,
     }
 
 
@@ -216,3 +267,373 @@ def test_get_driver_status_invalid_driver(mock_db_get):
     mock_db_get.return_value = None
     with pytest.raises(ValueError, match="Driver not found"):
         get_driver_status_and_location(999)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2030-01-01T10:00:00", 42)
+    assert decode_cursor(cursor, 2) == ["2030-01-01T10:00:00", 42]
+
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor("%%%", 2)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(encode_cursor(1, 2, 3), 2)
+
+
+def test_iter_json_array_chunks():
+    chunks = list(iter_json_array(iter([1, "two", {"three": 3}]), chunk_size=2))
+    assert len(chunks) == 2
+    assert json.loads("".join(chunks)) == [1, "two", {"three": 3}]
+    assert "".join(iter_json_array(iter([]))) == "[]"
+
+
+def test_pubsub_delivers_latest_frame_to_every_subscriber():
+    hub = PubSubHub()
+    first = hub.subscribe(("driver", 1), "initial", heartbeat=0.01)
+    second = hub.subscribe(("driver", 1), None, heartbeat=0.01)
+    assert next(first) == "initial"
+    assert next(second) == HEARTBEAT_FRAME
+    assert hub.has_subscribers(("driver", 1))
+
+    hub.publish([("driver", 1)], "status", {"status": "On Duty"})
+    hub.publish([("driver", 1)], "status", {"status": "On Break"})
+    expected = 'event: status\ndata: {"status": "On Break"}\n\n'
+    assert next(first) == expected
+    assert next(second) == expected
+    assert next(first) == HEARTBEAT_FRAME
+
+    first.close()
+    second.close()
+    assert not hub.has_subscribers(("driver", 1))
+
+
+def test_relay_carries_messages_to_other_workers_sockets(tmp_path):
+    app = current_app._get_current_object()
+    directory = str(tmp_path / "ps")
+    sender, listener = Relay(directory), Relay(directory)
+    received = []
+    listener.listen(app, received.append)
+    # A socket left by a worker that has exited is dropped on the first send
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    stale.bind(os.path.join(directory, "worker-1-stale.sock"))
+    stale.close()
+    try:
+        sender.send({"id": 1, "status": "On Duty"})
+        # A worker does not relay to itself; it delivers its own messages directly
+        listener.send({"id": 2, "status": "On Break"})
+        deadline = time.monotonic() + 5
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert received == [{"id": 1, "status": "On Duty"}]
+        assert not os.path.exists(os.path.join(directory, "worker-1-stale.sock"))
+    finally:
+        listener.close()
+    assert os.listdir(directory) == []
+
+
+def test_spatial_grid_nearest_matches_brute_force():
+    import random
+
+    rng = random.Random(7)
+    grid = SpatialGrid(cell_degrees=0.01)
+    points = {
+        key: (10.6 + rng.random() * 0.1, -61.45 + rng.random() * 0.1)
+        for key in range(300)
+    }
+    grid.replace_all((key, lat, lon, key) for key, (lat, lon) in points.items())
+
+    for lat, lon in [(10.65, -61.40), (10.6, -61.45), (11.5, -60.0)]:
+        expected = sorted(
+            (haversine_km(lat, lon, *point), key) for key, point in points.items()
+        )[:5]
+        found = grid.nearest(lat, lon, k=5)
+        assert [key for _, key, _ in found] == [key for _, key in expected]
+
+    # Moving and removing points is reflected straight away
+    grid.update("van", 10.65, -61.40, {"id": "van"})
+    assert grid.nearest(10.65, -61.40, k=1)[0][1] == "van"
+    grid.remove("van")
+    assert grid.nearest(10.65, -61.40, k=1)[0][1] != "van"
+    assert grid.nearest(10.65, -61.40, k=3, max_km=0.0001) == []
+
+
+def test_validate_optional_coordinates():
+    assert validate_optional_coordinates(None, None) == []
+    assert validate_optional_coordinates(10.6, -61.4) == []
+    assert validate_optional_coordinates(10.6, None) == ["Longitude must be a number."]
+    assert validate_optional_coordinates(91, 0) == [
+        "Latitude must be between -90 and 90."
+    ]
+
+
+def test_plan_visiting_order_matches_exhaustive_search_on_small_routes():
+    import itertools
+    import random
+
+    rng = random.Random(3)
+    start = (10.64, -61.40)
+    for _ in range(5):
+        points = [
+            (10.6 + rng.random() * 0.1, -61.45 + rng.random() * 0.1) for _ in range(7)
+        ]
+        matrix = distance_matrix([start] + points)
+        best = min(
+            path_length([0] + list(order), matrix)
+            for order in itertools.permutations(range(1, 8))
+        )
+        order = plan_visiting_order(start, points, time_budget=1)
+        assert sorted(order) == list(range(7))
+        planned = path_length([0] + [index + 1 for index in order], matrix)
+        # 2-opt is a heuristic, but on seven points it should be at or near optimal
+        assert planned <= best * 1.05
+    assert plan_visiting_order(start, []) == []
+
+
+def test_production_engine_options_split_connections_between_workers():
+    config = {"DB_MAX_CONNECTIONS": 100}
+    options = production_engine_options("postgresql://db/app", config, 4, 1000)
+    assert options["pool_size"] + options["max_overflow"] == 25
+    assert options["pool_pre_ping"] is True
+
+    # Never more connections than a worker can use at once
+    options = production_engine_options("postgresql://db/app", config, 4, 6)
+    assert options["pool_size"] + options["max_overflow"] == 6
+
+    assert production_engine_options("sqlite:///:memory:", config, 4, 1000) == {}
+    options = production_engine_options("sqlite:///app.db", config, 4, 1000)
+    assert options["connect_args"] == {"timeout": 5}
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired_entries(monkeypatch):
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("a") == (False, None)
+
+
+def test_file_versions_invalidate_every_worker_sharing_the_directory(tmp_path):
+    # Two caches stand in for two gunicorn workers
+    first = ReferenceCache(versions=FileVersions(str(tmp_path)))
+    second = ReferenceCache(versions=FileVersions(str(tmp_path)))
+    first.get_or_load("streets", "all", lambda: ("Main Street",))
+    assert second.get_or_load("streets", "all", lambda: ("Main Street",)) == (
+        "Main Street",
+    )
+
+    second.invalidate("streets")
+    loaded = first.get_or_load("streets", "all", lambda: ("Main Street", "Elm"))
+    assert loaded == ("Main Street", "Elm")
+    # Misses are never cached
+    assert first.get_or_load("streets", ("id", "Nowhere"), lambda: None) is None
+    assert first.get_or_load("streets", ("id", "Nowhere"), lambda: 7) == 7
+
+
+def test_weekday_masks_and_occurrences():
+    from datetime import date, time as clock
+
+    assert parse_weekdays("mo, we,FR") == 0b10101
+    assert parse_weekdays(["SU"]) == 1 << 6
+    assert format_weekdays(parse_weekdays("FR,MO")) == "MO,FR"
+    for bad in ("", "MO,XX", 5):
+        with pytest.raises(ValueError):
+            parse_weekdays(bad)
+    # 2030-06-03 is a Monday
+    days = list(occurrences(0b10101, clock(9, 30), date(2030, 6, 3), date(2030, 6, 10)))
+    assert [d.strftime("%a %d %H:%M") for d in days] == [
+        "Mon 03 09:30",
+        "Wed 05 09:30",
+        "Fri 07 09:30",
+        "Mon 10 09:30",
+    ]
+
+
+def test_interval_index_finds_overlaps_with_half_open_intervals():
+    index = IntervalIndex([(10, 20, "a"), (0, 100, "long"), (30, 40, "b")])
+    assert index.find_overlap(50, 60) == (0, 100, "long")
+    index = IntervalIndex([(10, 20, "a"), (30, 40, "b")])
+    assert index.find_overlap(20, 30) is None  # touching ends do not overlap
+    assert index.find_overlap(0, 10) is None
+    assert index.find_overlap(15, 16) == (10, 20, "a")
+    assert index.find_overlap(35, 50) == (30, 40, "b")
+    index.add(22, 28, "c")
+    assert index.find_overlap(20, 30) == (22, 28, "c")
+    assert len(index) == 3
+    assert IntervalIndex().find_overlap(0, 1) is None
+
+
+def test_query_stats_group_statements_that_differ_only_in_parameters():
+    assert (
+        normalize_statement(
+            "SELECT *\n  FROM drive WHERE id IN (?, ?, ?) AND street_id = 4 AND name = 'x'"
+        )
+        == "SELECT * FROM drive WHERE id IN (?...) AND street_id = ? AND name = ?"
+    )
+    stats = QueryStats()
+    for ids in ("(?, ?)", "(?, ?, ?)", "(?, ?, ?, ?)"):
+        stats.record(f"SELECT * FROM street WHERE id IN {ids}", 0.001)
+    stats.record("SELECT * FROM user_1 WHERE id = ?", 0.002)
+    assert stats.count == 4 and round(stats.milliseconds) == 5
+    assert stats.repeated(3) == [("SELECT * FROM street WHERE id IN (?...)", 3)]
+    assert stats.repeated(4) == []
+
+
+def test_metrics_render_cumulative_buckets_and_sum_workers_snapshots():
+    first, second = MetricsRegistry(), MetricsRegistry()
+    labels = (("blueprint", "driver_views"), ("endpoint", "get_drivers"))
+    series = 'blueprint="driver_views",endpoint="get_drivers"'
+    for registry in (first, second):
+        registry.inc("http_requests_total", labels + (("method", "GET"),))
+        registry.inc("http_requests_in_flight")
+    first.observe("http_request_duration_seconds", 0.003, labels)
+    second.observe("http_request_duration_seconds", 0.2, labels)
+    second.observe("db_query_duration_seconds", 0.001)
+
+    stale = second.snapshot()
+    stale["written_at"] -= 60
+    values, histograms = merge_snapshots([first.snapshot(), stale], time.time() - 15)
+    lines = render_metrics(values, histograms).splitlines()
+    assert f'http_requests_total{{{series},method="GET"}} 2' in lines
+    # Gauges only count workers that wrote recently
+    assert "http_requests_in_flight 1" in lines
+    assert f'http_request_duration_seconds_bucket{{{series},le="0.005"}} 1' in lines
+    assert f'http_request_duration_seconds_bucket{{{series},le="0.25"}} 2' in lines
+    assert f'http_request_duration_seconds_bucket{{{series},le="+Inf"}} 2' in lines
+    assert f"http_request_duration_seconds_count{{{series}}} 2" in lines
+    assert 'db_query_duration_seconds_bucket{le="0.001"} 1' in lines
+    assert "# TYPE password_hash_duration_seconds histogram" in lines
+
+    escaped = render_metrics(
+        {("http_requests_total", (("endpoint", 'a "b"\n'),)): 1}, {}
+    )
+    assert 'http_requests_total{endpoint="a \\"b\\"\\n"} 1' in escaped.splitlines()
+
+
+def test_metrics_snapshot_is_a_copy_of_the_registry():
+    registry = MetricsRegistry()
+    registry.observe("db_query_duration_seconds", 0.001)
+    snapshot = registry.snapshot()
+    registry.inc("http_requests_in_flight")
+    registry.observe("db_query_duration_seconds", 0.001)
+    assert snapshot["values"] == []
+    assert snapshot["histograms"][0][2][1] == 1
+
+
+def test_postgresql_plans_never_show_bound_values():
+    executed = []
+
+    class Cursor:
+        def execute(self, sql, parameters=None):
+            executed.append((sql, parameters))
+
+        def fetchall(self):
+            return [("Index Scan using user_username_key on user_1",)]
+
+        def close(self):
+            pass
+
+    def connection(version):
+        return SimpleNamespace(
+            dialect=SimpleNamespace(name="postgresql", server_version_info=version),
+            connection=SimpleNamespace(
+                dbapi_connection=SimpleNamespace(cursor=Cursor)
+            ),
+        )
+
+    statement = "SELECT * FROM user_1 WHERE username = %(username_1)s"
+    # Before PostgreSQL 16 there is no generic plan, so no plan at all
+    assert explain(connection((15, 4)), statement, {"username_1": "bob"}) is None
+    assert executed == []
+
+    plan = explain(connection((16, 1)), statement, {"username_1": "bob"})
+    assert plan == ["Index Scan using user_username_key on user_1"]
+    assert (
+        "EXPLAIN (GENERIC_PLAN) SELECT * FROM user_1 WHERE username = $1",
+        None,
+    ) in executed
+    assert "bob" not in repr(executed)
+
+
+def test_slow_query_summary_ranks_statements_by_total_time():
+    assert parameter_shapes((3, "Main Street", None)) == ["int", "str", "NoneType"]
+    assert parameter_shapes({"id_1": 3}) == {"id_1": "int"}
+    assert parameter_shapes([(1, "a"), (2, "b")], executemany=True) == {
+        "rows": 2,
+        "shape": ["int", "str"],
+    }
+
+    def entry(statement, ms, count=1, controller="get_resident_inbox"):
+        return {
+            "statement": statement,
+            "ms": ms,
+            "count": count,
+            "total_ms": ms * count,
+            "controller": controller,
+            "plan": ["SCAN drive"],
+        }
+
+    worst = summarize_slow_queries(
+        [
+            entry("SELECT drive", 300),
+            entry("SELECT user", 900, controller="login"),
+            # Written after four more were held back by the rate limit
+            entry("SELECT drive", 400, count=5, controller="request_stop"),
+        ]
+    )
+    assert [(s["statement"], s["count"], s["total_ms"]) for s in worst] == [
+        ("SELECT drive", 6, 2300),
+        ("SELECT user", 1, 900),
+    ]
+    assert worst[0]["controllers"] == ["get_resident_inbox", "request_stop"]
+    assert worst[0]["max_ms"] == 400 and worst[0]["mean_ms"] == round(2300 / 6, 3)
+
+
+def test_status_buffer_caps_location_history_while_flushes_fail():
+    buffer = DriverStatusBuffer(history_limit=3)
+    for n in range(5):
+        buffer.record(1, "van", "On Duty", f"Stop {n}")
+    assert buffer.take_dropped_history() == 2
+    failed = buffer.drain_history()
+    assert [point[2] for point in failed] == ["Stop 2", "Stop 3", "Stop 4"]
+
+    # A failed flush puts its points back ahead of newer pings, oldest dropped first
+    buffer.record(1, "van", "On Duty", "Stop 5")
+    buffer.restore_history(failed)
+    assert [point[2] for point in buffer.drain_history()] == [
+        "Stop 3",
+        "Stop 4",
+        "Stop 5",
+    ]
+    assert buffer.take_dropped_history() == 1
+    assert buffer.take_dropped_history() == 0
+
+
+def test_periodic_task_keeps_running_after_a_failure():
+    app = current_app._get_current_object()
+    runs = []
+
+    def task():
+        runs.append(time.monotonic())
+        if len(runs) == 1:
+            raise RuntimeError("database unavailable")
+
+    task_thread = start_periodic_task(app, "flaky", 0.01, task)
+    try:
+        assert start_periodic_task(app, "flaky", 0.01, task) is task_thread
+        assert start_periodic_task(app, "disabled", 0, task) is None
+        deadline = time.monotonic() + 5
+        while len(runs) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(runs) >= 3
+    finally:
+        stop_periodic_tasks(app)
+    task_thread.join(1)
+    assert not task_thread.is_alive()
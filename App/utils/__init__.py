@@ -1 +1,2 @@
 from App.utils.validation import *
+from App.utils.pagination import *
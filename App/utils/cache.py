@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import current_app
+
+from App.utils.replicas import primary_reads
+
+
+class TTLCache:
+    """Thread-safe least-recently-used cache whose entries also expire after ttl seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (True, value) on a hit and (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalVersions:
+    """Version stamps held in this process; enough for a single worker."""
+
+    def __init__(self):
+        self._versions = {}
+
+    def get(self, namespace):
+        return self._versions.get(namespace, "0")
+
+    def bump(self, namespace):
+        self._versions[namespace] = uuid.uuid4().hex
+
+
+class FileVersions:
+    """
+    Version stamps kept as small files in a directory every worker can see,
+    so a write in one worker invalidates the caches of all the others.
+    Each bump writes a fresh random token, so two racing bumps can never
+    leave the old version in place.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, namespace):
+        return os.path.join(self.directory, f"{namespace}.version")
+
+    def get(self, namespace):
+        try:
+            with open(self._path(namespace)) as stamp:
+                return stamp.read()
+        except FileNotFoundError:
+            return "0"
+
+    def bump(self, namespace):
+        path = self._path(namespace)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(temporary, "w") as stamp:
+            stamp.write(uuid.uuid4().hex)
+        os.replace(temporary, path)
+
+
+class ReferenceCache:
+    """
+    Read-through cache for reference data, grouped into namespaces.
+
+    Every entry remembers the namespace version it was loaded under; a write
+    bumps the version after it commits, which makes every older entry miss.
+    The version is read before loading, so a write that lands mid-load
+    leaves the new entry already stale rather than caching old data as new.
+    Loaders read from the primary: a replica lagging behind a write whose
+    version bump is already visible would cache its old rows under the new
+    version until they expire.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, versions=None):
+        self._entries = TTLCache(maxsize, ttl)
+        self.versions = versions or LocalVersions()
+
+    def get_or_load(self, namespace, key, loader):
+        version = self.versions.get(namespace)
+        hit, entry = self._entries.get((namespace, key))
+        if hit and entry[0] == version:
+            return entry[1]
+        with primary_reads():
+            value = loader()
+        # Misses are not cached, so something created elsewhere shows up at once
+        if value is not None:
+            self._entries.set((namespace, key), (version, value))
+        return value
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            self.versions.bump(namespace)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def get_reference_cache(app=None):
+    """Returns the app's reference data cache; each worker process has its own."""
+    app = app or current_app
+    cache = app.extensions.get("reference_cache")
+    if cache is None:
+        directory = app.config.get("CACHE_VERSION_DIR")
+        if directory is None:
+            # Shared by every worker by default; "" keeps the versions per process
+            directory = os.path.join(app.instance_path, "cache-versions")
+        cache = app.extensions.setdefault(
+            "reference_cache",
+            ReferenceCache(
+                maxsize=app.config.get("CACHE_MAXSIZE", 1024),
+                ttl=app.config.get("CACHE_TTL_SECONDS", 60),
+                versions=FileVersions(directory) if directory else None,
+            ),
+        )
+    return cache
+
+
+def invalidate_reference_data(*namespaces):
+    get_reference_cache().invalidate(*namespaces)
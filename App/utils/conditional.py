@@ -0,0 +1,28 @@
+import hashlib
+from flask import Response, make_response, request
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+
+
+def conditional_response(version, build):
+    """
+    Answers 304 Not Modified when the client's If-None-Match matches the
+    version, before build() runs any of the full query or serialization.
+    A version of None skips the check, e.g. so build() can report a 404.
+    """
+    if version is None:
+        return build()
+
+    etag = make_etag(*version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    # Clients may keep the body, but must check it is current before using it
+    response.cache_control.no_cache = True
+    return response
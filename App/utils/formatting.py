@@ -0,0 +1,45 @@
+"""
+Text lines for the v1 API and the CLI, built from the structured data the
+controllers return. Nothing else should need to format or parse these.
+"""
+
+
+def format_driver_summary(driver):
+    return f"ID: {driver['id']} | Driver: {driver['username']}"
+
+
+def format_resident_summary(resident):
+    return f"ID: {resident['id']} | Resident: {resident['username']} | Street: {resident['street_name']}"
+
+
+def format_inbox_drive(drive):
+    return f"Drive ID: {drive['drive_id']} | Driver: {drive['driver']} | Scheduled Time: {drive['scheduled_time'].strftime('%Y-%m-%d %H:%M')}"
+
+
+def format_stop_request(stop):
+    return f"Drive ID: {stop['drive_id']} | Time: {stop['scheduled_time'].strftime('%Y-%m-%d %I:%M %p')} | Resident: {stop['resident']} | Message: {stop['message']}"
+
+
+def format_schedule(schedule):
+    ends = schedule["ends_on"] or "open-ended"
+    state = "" if schedule["active"] else " | Cancelled"
+    return f"Schedule ID: {schedule['id']} | Street ID: {schedule['street_id']} | Days: {schedule['weekdays']} | Time: {schedule['time']} | Until: {ends}{state}"
+
+
+def format_inbox(inbox):
+    return [format_inbox_drive(d) for d in inbox["drives"]] or [
+        f"No upcoming drives scheduled for street '{inbox['street_name']}'"
+    ]
+
+
+def format_stop_requests(requests):
+    return [format_stop_request(r) for r in requests["requests"]] or [
+        f"No stop requests found for driver '{requests['driver']}'"
+    ]
+
+
+def format_page(page, format_item):
+    return {
+        "items": [format_item(item) for item in page["items"]],
+        "next_cursor": page["next_cursor"],
+    }
@@ -0,0 +1,96 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+from App.utils.metrics import record_password_hash
+
+try:
+    from gevent import get_hub
+    from gevent.monkey import is_module_patched
+except ImportError:  # gevent is only installed for the production worker
+    get_hub = None
+
+
+DEFAULT_PASSWORD_HASH_METHOD = "scrypt:32768:8:1"
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = None
+        if has_app_context():
+            workers = current_app.config.get("PASSWORD_HASH_WORKERS")
+        _executor = ThreadPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1,
+            thread_name_prefix="password-hash",
+        )
+    return _executor
+
+
+def _gevent_threadpool():
+    # Under the gunicorn gevent worker threading is monkey patched, so a
+    # ThreadPoolExecutor would only spawn greenlets; use the hub's native threads
+    if get_hub is not None and is_module_patched("threading"):
+        return get_hub().threadpool
+    return None
+
+
+def run_off_loop(func, *args):
+    """
+    Runs a CPU-bound call on a native thread and waits for it.
+    pbkdf2 and scrypt release the GIL, so other greenlets keep running meanwhile.
+    """
+    threadpool = _gevent_threadpool()
+    if threadpool is not None:
+        return threadpool.apply(func, args)
+    return _get_executor().submit(func, *args).result()
+
+
+def password_hash_method():
+    if has_app_context():
+        return current_app.config.get(
+            "PASSWORD_HASH_METHOD", DEFAULT_PASSWORD_HASH_METHOD
+        )
+    return DEFAULT_PASSWORD_HASH_METHOD
+
+
+@lru_cache(maxsize=8)
+def _normalized_method(method):
+    # werkzeug fills in default parameters ("scrypt" -> "scrypt:32768:8:1"),
+    # so read the canonical form back from a throwaway hash once per method
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+def _timed(operation, func, *args):
+    started = time.perf_counter()
+    try:
+        return run_off_loop(func, *args)
+    finally:
+        record_password_hash(operation, time.perf_counter() - started)
+
+
+def hash_password(password):
+    return _timed("hash", generate_password_hash, password, password_hash_method())
+
+
+def hash_passwords(passwords):
+    """Hashes many passwords in parallel, preserving order."""
+    hash_one = partial(generate_password_hash, method=password_hash_method())
+    threadpool = _gevent_threadpool()
+    if threadpool is not None:
+        return list(threadpool.imap(hash_one, passwords))
+    return list(_get_executor().map(hash_one, passwords))
+
+
+def verify_password(pwhash, password):
+    return _timed("verify", check_password_hash, pwhash, password)
+
+
+def password_needs_rehash(pwhash):
+    """True when pwhash was made with a different method or cost than is configured."""
+    stored_method = pwhash.split("$", 1)[0]
+    return stored_method != run_off_loop(_normalized_method, password_hash_method())
@@ -0,0 +1,48 @@
+from bisect import bisect_left, bisect_right
+
+
+class IntervalIndex:
+    """
+    Half-open [start, end) intervals kept sorted by start, with a running
+    maximum of their ends, so asking whether anything overlaps a new
+    interval is a binary search: of the intervals starting before its end,
+    the one that ends last overlaps it if any of them does.
+
+    Lookups are O(log n); add() is O(n) for the list insert, so build the
+    index in one go from all known intervals and add() only new ones.
+    """
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals, key=lambda interval: interval[0])
+        self._starts = [start for start, end, key in intervals]
+        self._ends = [end for start, end, key in intervals]
+        self._keys = [key for start, end, key in intervals]
+        # _latest[i] is the position of the latest-ending interval in [0, i]
+        self._latest = []
+        self._rebuild_from(0)
+
+    def _rebuild_from(self, position):
+        del self._latest[position:]
+        for i in range(position, len(self._ends)):
+            latest = self._latest[i - 1] if i else i
+            self._latest.append(i if self._ends[i] > self._ends[latest] else latest)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, start, end, key=None):
+        position = bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._ends.insert(position, end)
+        self._keys.insert(position, key)
+        self._rebuild_from(position)
+
+    def find_overlap(self, start, end):
+        """Returns (start, end, key) of an interval overlapping [start, end), or None."""
+        before_end = bisect_left(self._starts, end)
+        if not before_end:
+            return None
+        latest = self._latest[before_end - 1]
+        if self._ends[latest] <= start:
+            return None
+        return self._starts[latest], self._ends[latest], self._keys[latest]
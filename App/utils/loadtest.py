@@ -0,0 +1,283 @@
+"""
+Load generator that replays the requests of the Postman collection as
+weighted scenarios, against the app's test client or a running server, and
+reports latency percentiles and throughput per endpoint.
+"""
+
+import http.client
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_COLLECTION = os.path.normpath(
+    os.path.join(
+        os.path.dirname(__file__), "..", "..", "Bread Van App.postman_collection.json"
+    )
+)
+
+# Requests run once, in order, before the load starts
+SETUP_REQUESTS = ["Create Driver", "Create Resident", "Driver Login", "Resident Login"]
+
+# Scenario name: (weight, collection requests it runs in order)
+DEFAULT_SCENARIOS = {
+    "inbox": (50, ["Resident Inbox"]),
+    "status_ping": (30, ["Update Driver Status"]),
+    "stop_request": (15, ["Stop Request"]),
+    "login": (5, ["Driver Login", "Resident Login"]),
+}
+
+PERCENTILES = (50, 95, 99)
+
+_VARIABLE = re.compile(r"{{(\w+)}}")
+# The collection's test scripts save tokens with pm.environment.set("name", json.field)
+_SAVED_VARIABLE = re.compile(
+    r"pm\.environment\.set\(\s*\"(\w+)\"\s*,\s*json\.(\w+)\s*\)"
+)
+
+
+def load_collection(path=DEFAULT_COLLECTION):
+    """
+    Reads a Postman collection into {request name: request}, where a request
+    is its method, path, headers, raw body and the variables its test script
+    saves from the JSON response.
+    """
+    with open(path, encoding="utf-8") as f:
+        collection = json.load(f)
+    requests = {}
+    for item in _walk(collection["item"]):
+        request = item["request"]
+        url = (
+            request["url"]["raw"]
+            if isinstance(request["url"], dict)
+            else request["url"]
+        )
+        parts = urlsplit(url)
+        script = "".join(
+            "".join(event["script"].get("exec", []))
+            for event in item.get("event", [])
+            if event.get("listen") == "test"
+        )
+        requests[item["name"]] = {
+            "method": request["method"],
+            "path": parts.path + (f"?{parts.query}" if parts.query else ""),
+            "headers": {h["key"]: h["value"] for h in request.get("header", [])},
+            "body": (request.get("body") or {}).get("raw") or None,
+            "saves": dict(_SAVED_VARIABLE.findall(script)),
+        }
+    return requests
+
+
+def _walk(items):
+    for item in items:
+        if "item" in item:
+            yield from _walk(item["item"])
+        else:
+            yield item
+
+
+def _substitute(text, variables):
+    return _VARIABLE.sub(lambda m: variables.get(m.group(1), m.group(0)), text)
+
+
+class AppTarget:
+    """
+    Sends requests through a Flask test client, one per thread. Cookies are
+    not kept, so a login's token cookie cannot shadow the Bearer header of
+    the next request, just as with HTTPTarget.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, method, path, headers, body):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client(use_cookies=False)
+        response = client.open(path, method=method, headers=headers, data=body)
+        return response.status_code, response.get_data()
+
+
+class HTTPTarget:
+    """Sends requests to a running server, over one kept-alive connection per thread."""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, method, path, headers, body):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.timeout
+            )
+        try:
+            connection.request(
+                method, path, body=body.encode() if body else None, headers=headers
+            )
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+class LoadRun:
+    """
+    Replays collection requests against a target, sharing the variables
+    (tokens) their responses save, and records each one's latency.
+    """
+
+    def __init__(self, target, requests):
+        self.target = target
+        self.requests = requests
+        self.variables = {}
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def replay(self, name, record=True):
+        request = self.requests[name]
+        headers = {
+            key: _substitute(value, self.variables)
+            for key, value in request["headers"].items()
+        }
+        body = request["body"]
+        if body:
+            body = _substitute(body, self.variables)
+            headers.setdefault("Content-Type", "application/json")
+        started = time.perf_counter()
+        try:
+            status, content = self.target.send(
+                request["method"], request["path"], headers, body
+            )
+        except Exception:
+            # Counted as a failed request rather than ending the worker, e.g.
+            # a lost connection, or a view raising under TESTING
+            status, content = None, b""
+        elapsed = time.perf_counter() - started
+
+        if request["saves"] and status and status < 400:
+            try:
+                payload = json.loads(content)
+            except ValueError:
+                payload = {}
+            for variable, field in request["saves"].items():
+                if field in payload:
+                    self.variables[variable] = payload[field]
+        if record:
+            with self._lock:
+                self.samples.setdefault(name, []).append((elapsed, status))
+        return status
+
+    def run(self, scenarios, concurrency=4, total=None, duration=None, seed=None):
+        """
+        Runs concurrency workers, each picking weighted scenarios until total
+        scenarios have run or duration seconds have passed. Returns the wall
+        time taken.
+        """
+        if total is None and duration is None:
+            raise ValueError("Give a number of scenarios or a duration.")
+        names = list(scenarios)
+        weights = [scenarios[name][0] for name in names]
+        remaining = [total]
+        deadline = time.perf_counter() + duration if duration else None
+
+        def take():
+            with self._lock:
+                if remaining[0] is None:
+                    return True
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def worker(worker_seed):
+            rng = random.Random(worker_seed)
+            while (deadline is None or time.perf_counter() < deadline) and take():
+                scenario = rng.choices(names, weights)[0]
+                for name in scenarios[scenario][1]:
+                    self.replay(name)
+
+        rng = random.Random(seed)
+        threads = [
+            threading.Thread(target=worker, args=(rng.random(),), daemon=True)
+            for _ in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """Latency in milliseconds, requests per second and statuses per endpoint."""
+
+    def stats(entries):
+        latencies = sorted(seconds * 1000 for seconds, status in entries)
+        statuses = {}
+        for seconds, status in entries:
+            key = str(status) if status else "failed"
+            statuses[key] = statuses.get(key, 0) + 1
+        summary = {
+            "count": len(entries),
+            "rps": round(len(entries) / elapsed, 2) if elapsed else None,
+            "errors": sum(
+                1 for seconds, status in entries if not status or status >= 500
+            ),
+            "statuses": statuses,
+        }
+        for p in PERCENTILES:
+            summary[f"p{p}_ms"] = round(percentile(latencies, p), 3)
+        summary["max_ms"] = round(latencies[-1], 3)
+        return summary
+
+    endpoints = {name: stats(entries) for name, entries in sorted(samples.items())}
+    everything = [entry for entries in samples.values() for entry in entries]
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "overall": stats(everything) if everything else None,
+        "endpoints": endpoints,
+    }
+
+
+def run_load_test(
+    target,
+    collection=DEFAULT_COLLECTION,
+    scenarios=None,
+    concurrency=4,
+    total=None,
+    duration=None,
+    seed=None,
+):
+    """
+    Replays the collection's setup requests once, then the weighted
+    scenarios under load, and returns the JSON-ready report.
+    """
+    scenarios = scenarios or DEFAULT_SCENARIOS
+    load = LoadRun(target, load_collection(collection))
+    for name in SETUP_REQUESTS:
+        load.replay(name, record=False)
+    elapsed = load.run(scenarios, concurrency, total, duration, seed)
+    report = summarize(load.samples, elapsed)
+    report["concurrency"] = concurrency
+    report["scenarios"] = {name: weight for name, (weight, _) in scenarios.items()}
+    return report
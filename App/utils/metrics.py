@@ -0,0 +1,303 @@
+"""
+Prometheus metrics, kept in plain per-process dicts so recording one costs a
+dict update, and shared between gunicorn workers through a directory.
+
+Nothing is locked. Under the gevent worker a greenlet only yields on I/O,
+so two updates cannot interleave; under real threads an increment may
+rarely be lost, which a metric can afford. A snapshot copies each dict in
+one step before walking it, so a series added meanwhile cannot break it.
+
+With METRICS_DIR set (gunicorn_config.py sets one on tmpfs by default),
+each worker writes a snapshot of its metrics there every
+METRICS_WRITE_INTERVAL seconds, and /metrics adds up every worker's file.
+Counters and histograms of workers that have exited are kept, as
+Prometheus expects counters never to go down; gauges only count workers
+that wrote recently.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, g, has_app_context, request
+
+from App.utils.querystats import time_queries
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Name: (type, help, histogram buckets)
+METRICS = {
+    "http_requests_total": (
+        "counter",
+        "Requests handled, by blueprint, endpoint, method and status.",
+        None,
+    ),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Time to handle a request, by blueprint and endpoint.",
+        LATENCY_BUCKETS,
+    ),
+    "http_requests_in_flight": (
+        "gauge",
+        "Requests being handled right now, one greenlet each under gevent.",
+        None,
+    ),
+    "db_query_duration_seconds": (
+        "histogram",
+        "Time each SQL statement took.",
+        QUERY_BUCKETS,
+    ),
+    "db_pool_checkout_wait_seconds": (
+        "histogram",
+        "Time spent waiting for a pooled database connection.",
+        POOL_WAIT_BUCKETS,
+    ),
+    "password_hash_duration_seconds": (
+        "histogram",
+        "Time spent hashing or verifying a password, by operation.",
+        HASH_BUCKETS,
+    ),
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsRegistry:
+    """
+    One process's metrics. Series are keyed by (name, labels), with labels
+    a tuple of (label, value) pairs. A histogram is its per-bucket counts
+    (the last one past every bucket) followed by the sum of its values.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.histograms = {}
+        self.writer = None
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def snapshot(self):
+        values = list(self.values.items())
+        histograms = list(self.histograms.items())
+        return {
+            "pid": os.getpid(),
+            "written_at": time.time(),
+            "values": [[name, labels, value] for (name, labels), value in values],
+            "histograms": [
+                [name, labels, list(histogram)]
+                for (name, labels), histogram in histograms
+            ],
+        }
+
+    def write_snapshot(self, directory):
+        # Written aside and renamed, so a reader never sees half a file
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def start_writer(self, app, directory, interval):
+        """Starts this process's snapshot writer once."""
+        if self.writer is not None:
+            return
+        os.makedirs(directory, exist_ok=True)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_snapshot(directory)
+                except Exception:
+                    # Logged and retried, so one bad write cannot stop the writer
+                    app.logger.exception("Failed to write metrics snapshot")
+
+        # A daemon thread, or a greenlet once gevent has patched threading
+        self.writer = threading.Thread(target=run, name="metrics-writer", daemon=True)
+        self.writer.start()
+
+
+def read_snapshots(directory, own_pid=None):
+    snapshots = []
+    if not directory or not os.path.isdir(directory):
+        return snapshots
+    for filename in os.listdir(directory):
+        if not (filename.startswith("metrics-") and filename.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if snapshot["pid"] != own_pid:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def merge_snapshots(snapshots, live_since):
+    """Adds up the workers' series; gauges only from snapshots newer than live_since."""
+    values, histograms = {}, {}
+    for snapshot in snapshots:
+        live = snapshot["written_at"] >= live_since
+        for name, labels, value in snapshot["values"]:
+            if METRICS[name][0] == "gauge" and not live:
+                continue
+            key = (name, tuple(map(tuple, labels)))
+            values[key] = values.get(key, 0) + value
+        for name, labels, histogram in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.get(key)
+            histograms[key] = (
+                list(histogram)
+                if total is None
+                else [a + b for a, b in zip(total, histogram)]
+            )
+    return values, histograms
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series(name, labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return name
+    return name + "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(values, histograms):
+    """The Prometheus text exposition format of merged series."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind != "histogram":
+            for (series_name, labels), value in sorted(values.items()):
+                if series_name == name:
+                    lines.append(f"{_series(name, labels)} {_number(value)}")
+            continue
+        for (series_name, labels), histogram in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ("+Inf",), histogram[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(float(bound))
+                lines.append(
+                    f"{_series(name + '_bucket', labels, [('le', le)])} {cumulative}"
+                )
+            lines.append(f"{_series(name + '_sum', labels)} {_number(histogram[-1])}")
+            lines.append(f"{_series(name + '_count', labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def get_metrics(app=None):
+    app = app or current_app
+    return app.extensions.get("metrics")
+
+
+def collect_metrics(app=None):
+    """This worker's live metrics plus every other worker's latest snapshot."""
+    app = app or current_app._get_current_object()
+    registry = get_metrics(app)
+    directory = app.config.get("METRICS_DIR")
+    interval = app.config.get("METRICS_WRITE_INTERVAL", 5)
+    snapshots = read_snapshots(directory, own_pid=os.getpid())
+    snapshots.append(registry.snapshot())
+    values, histograms = merge_snapshots(snapshots, time.time() - 3 * interval)
+    return render_metrics(values, histograms)
+
+
+def record_password_hash(operation, seconds):
+    """Called by App.utils.hashing for each hash or verification made in an app."""
+    if has_app_context():
+        registry = get_metrics()
+        if registry is not None:
+            registry.observe(
+                "password_hash_duration_seconds", seconds, (("operation", operation),)
+            )
+
+
+def _instrument_pool_wait(pool, registry):
+    # The pool has no event for a checkout starting, so time the call that waits
+    do_get = pool._do_get
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            registry.observe(
+                "db_pool_checkout_wait_seconds", time.perf_counter() - started
+            )
+
+    pool._do_get = timed_do_get
+
+
+def setup_metrics(app, db):
+    """
+    Records request counts and latency by blueprint and endpoint, requests
+    in flight, SQL statement time and pool checkout waits for /metrics.
+    """
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    registry = app.extensions["metrics"] = MetricsRegistry()
+    directory = app.config.get("METRICS_DIR")
+    interval = app.config.get("METRICS_WRITE_INTERVAL", 5)
+
+    def observe_query(conn, statement, parameters, executemany, seconds):
+        registry.observe("db_query_duration_seconds", seconds)
+
+    time_queries(app, db, observe_query)
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrument_pool_wait(engine.pool, registry)
+
+    @app.before_request
+    def start_request_metrics():
+        if directory:
+            registry.start_writer(app, directory, interval)
+        g.metrics_started = time.perf_counter()
+        registry.inc("http_requests_in_flight")
+
+    @app.after_request
+    def note_response_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return
+        status = 500 if exc is not None else g.pop("metrics_status", 500)
+        # Labelled by endpoint rather than path, so ids in URLs add no series
+        blueprint, _, endpoint = (request.endpoint or "").rpartition(".")
+        labels = (("blueprint", blueprint), ("endpoint", endpoint))
+        registry.inc("http_requests_in_flight", amount=-1)
+        registry.inc(
+            "http_requests_total",
+            labels + (("method", request.method), ("status", str(status))),
+        )
+        registry.observe(
+            "http_request_duration_seconds", time.perf_counter() - started, labels
+        )
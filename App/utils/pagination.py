@@ -0,0 +1,76 @@
+import base64
+import json
+from flask import current_app
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+STREAM_BATCH_SIZE = 500
+
+
+def clamp_page_size(limit, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Returns a page size between 1 and maximum, falling back to default."""
+    if limit is None:
+        return default
+    return max(1, min(int(limit), maximum))
+
+
+def encode_cursor(*values):
+    """Encodes the sort key of the last row on a page as an opaque cursor."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    """Decodes a cursor back into its sort key values, raising ValueError if invalid."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_page_by_id(session, stmt, id_column, limit=None, cursor=None):
+    """
+    Runs stmt as one page ordered by id_column, returning (rows, next_cursor).
+    stmt should select plain columns, one of them named id; rows are Row tuples.
+    """
+    limit = clamp_page_size(limit)
+    if cursor:
+        (after_id,) = decode_cursor(cursor, 1)
+        if not isinstance(after_id, int):
+            raise ValueError("Invalid cursor")
+        stmt = stmt.where(id_column > after_id)
+
+    # Fetch one extra row to know whether another page exists
+    rows = session.execute(stmt.order_by(id_column.asc()).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return rows, next_cursor
+
+
+def iter_json_array(items, chunk_size=STREAM_BATCH_SIZE):
+    """
+    Encodes an iterable as a JSON array, yielding one chunk per chunk_size items.
+    Items are encoded by the app's JSON provider, the same as jsonify.
+    """
+    dumps = current_app.json.dumps
+    buffer = ["["]
+    first = True
+    count = 0
+    for item in items:
+        if not first:
+            buffer.append(",")
+        buffer.append(dumps(item))
+        first = False
+        count += 1
+        if count % chunk_size == 0:
+            yield "".join(buffer)
+            buffer = []
+    buffer.append("]")
+    yield "".join(buffer)
@@ -0,0 +1,193 @@
+import json
+import os
+import socket
+import threading
+import uuid
+from flask import current_app
+
+
+HEARTBEAT_FRAME = ": heartbeat\n\n"
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Channel:
+    """Holds the latest frame for one key; subscribers wait for its sequence number to move."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.frame = None
+        self.subscribers = 0
+
+
+class PubSubHub:
+    """
+    In-process publish/subscribe hub for server-sent events.
+
+    A publish encodes the message once and stores it on each channel, then
+    wakes every waiting subscriber; each subscriber writes that same frame to
+    its own connection. Slow subscribers skip straight to the latest frame,
+    which is what a location feed wants. Built on threading primitives, so it
+    works with OS threads and, once monkey patched, with gevent greenlets.
+    It only reaches this process's subscribers; a Relay carries messages to
+    the other workers' hubs.
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def has_subscribers(self, key):
+        channel = self._channels.get(key)
+        return channel is not None and channel.subscribers > 0
+
+    def has_subscribers_for(self, kind):
+        return any(
+            key[0] == kind and channel.subscribers > 0
+            for key, channel in list(self._channels.items())
+        )
+
+    def publish(self, keys, event, data):
+        frame = None
+        for key in keys:
+            channel = self._channels.get(key)
+            if channel is None or channel.subscribers == 0:
+                continue
+            if frame is None:
+                frame = format_sse(event, data)
+            with channel.condition:
+                channel.sequence += 1
+                channel.frame = frame
+                channel.condition.notify_all()
+
+    def subscribe(self, key, initial_frame=None, heartbeat=15):
+        """Yields SSE frames for key until the client disconnects."""
+        with self._lock:
+            channel = self._channels.setdefault(key, Channel())
+            channel.subscribers += 1
+        seen = channel.sequence
+        try:
+            if initial_frame:
+                yield initial_frame
+            while True:
+                with channel.condition:
+                    if channel.sequence == seen:
+                        channel.condition.wait(heartbeat)
+                    if channel.sequence == seen:
+                        frame = HEARTBEAT_FRAME
+                    else:
+                        seen = channel.sequence
+                        frame = channel.frame
+                yield frame
+        finally:
+            with self._lock:
+                channel.subscribers -= 1
+                if channel.subscribers == 0 and self._channels.get(key) is channel:
+                    del self._channels[key]
+
+
+class Relay:
+    """
+    Carries published messages to the other worker processes through Unix
+    datagram sockets in a directory they share, one socket per worker.
+    A worker only binds its socket once it has a subscriber, so messages
+    go to the workers that may be listening. Delivery is best effort, as
+    a location feed can skip a message: a full queue drops it, and the
+    socket of a worker that has exited is removed on the first failed send.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._sender = None
+        self._receiver = None
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        if self._sender is None:
+            self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sender.setblocking(False)
+        data = json.dumps(message).encode()
+        receiver = self._receiver
+        own = receiver.getsockname() if receiver is not None else None
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".sock") or path == own:
+                continue
+            try:
+                self._sender.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            except OSError:
+                pass
+
+    def listen(self, app, handle, session=None):
+        """
+        Binds this worker's socket once and calls handle(message) inside an
+        app context for every message received, in a daemon thread (a
+        greenlet once gevent has patched socket and threading).
+        """
+        with self._lock:
+            if self._receiver is not None:
+                return
+            # Named when bound, after gunicorn has forked the worker
+            name = f"worker-{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+            self._receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._receiver.bind(os.path.join(self.directory, name))
+        threading.Thread(
+            target=self._receive,
+            args=(self._receiver, app, handle, session),
+            name="pubsub-relay",
+            daemon=True,
+        ).start()
+
+    def _receive(self, receiver, app, handle, session):
+        while True:
+            try:
+                data = receiver.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                return  # Closed
+            with app.app_context():
+                try:
+                    handle(json.loads(data))
+                except Exception:
+                    app.logger.exception("Failed to deliver a relayed message")
+                finally:
+                    if session is not None:
+                        session.remove()
+
+    def close(self):
+        with self._lock:
+            if self._receiver is not None:
+                path = self._receiver.getsockname()
+                # Shut down first, which wakes the receiving thread
+                self._receiver.shutdown(socket.SHUT_RDWR)
+                self._receiver.close()
+                self._receiver = None
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def get_relay(app=None):
+    """The app's relay to other workers, or None when PUBSUB_DIR is not set."""
+    app = app or current_app
+    relay = app.extensions.get("pubsub_relay")
+    if relay is None:
+        directory = app.config.get("PUBSUB_DIR")
+        if not directory:
+            return None
+        relay = app.extensions.setdefault("pubsub_relay", Relay(directory))
+    return relay
+
+
+hub = PubSubHub()
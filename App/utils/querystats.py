@@ -0,0 +1,211 @@
+import re
+import sys
+import time
+import click
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+QUERY_COUNT_HEADER = "X-SQL-Query-Count"
+QUERY_TIME_HEADER = "X-SQL-Query-Time-Ms"
+N_PLUS_ONE_HEADER = "X-SQL-N-Plus-One"
+N_PLUS_ONE_THRESHOLD = 5
+
+_tracked = ContextVar("tracked_query_stats", default=())
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+# IN lists grow with their parameters: (?, ?, ?) and (?, ?) are the same query
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+
+
+def normalize_statement(statement):
+    """The statement with its literals and parameter lists folded to '?'."""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return _PLACEHOLDER_LIST.sub("(?...)", statement)
+
+
+class QueryStats:
+    """
+    Queries run in one scope (a request, a CLI command or a track_queries()
+    block), their total time, and how often each normalized statement ran.
+    The same statement running again and again with only its parameters
+    changing is the signature of an N+1: one query per row of another.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        key = normalize_statement(statement)
+        count, total = self.statements.get(key, (0, 0.0))
+        self.statements[key] = (count + 1, total + seconds)
+
+    @property
+    def milliseconds(self):
+        return self.seconds * 1000
+
+    def repeated(self, threshold):
+        """(statement, times run) for statements run at least threshold times, most first."""
+        return sorted(
+            (
+                (statement, count)
+                for statement, (count, _) in self.statements.items()
+                if count >= threshold
+            ),
+            key=lambda item: -item[1],
+        )
+
+
+@contextmanager
+def track_queries():
+    """Collects the queries run inside the block, e.g. in tests or scripts."""
+    stats = QueryStats()
+    token = _tracked.set(_tracked.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _tracked.reset(token)
+
+
+def _cli_stats():
+    # A CLI command's stats start with its first query and report when it ends
+    ctx = click.get_current_context(silent=True)
+    if ctx is None or not has_app_context():
+        return None
+    root = ctx.find_root()
+    stats = root.meta.get("query_stats")
+    if stats is None:
+        stats = root.meta["query_stats"] = QueryStats()
+        root.call_on_close(
+            partial(
+                _report_cli_stats,
+                current_app._get_current_object(),
+                ctx.command_path,
+                stats,
+            )
+        )
+    return stats
+
+
+def _report_cli_stats(app, command, stats):
+    _warn_n_plus_one(app, command, stats)
+    if _reporting(app):
+        click.echo(
+            f"{command}: {stats.count} queries in {stats.milliseconds:.1f} ms",
+            file=sys.stderr,
+        )
+
+
+def _active_stats():
+    active = list(_tracked.get())
+    if has_request_context():
+        stats = g.get("query_stats")
+    else:
+        stats = _cli_stats()
+    if stats is not None:
+        active.append(stats)
+    return active
+
+
+def _reporting(app):
+    report = app.config.get("SQL_QUERY_DEBUG")
+    return app.debug if report is None else report
+
+
+def n_plus_one_threshold(app):
+    return app.config.get("SQL_N_PLUS_ONE_THRESHOLD", N_PLUS_ONE_THRESHOLD)
+
+
+def _warn_n_plus_one(app, scope, stats):
+    for statement, count in stats.repeated(n_plus_one_threshold(app)):
+        app.logger.warning(
+            "Possible N+1 in %s: ran %d times: %s", scope, count, statement[:300]
+        )
+
+
+def time_queries(app, db, consumer):
+    """
+    Calls consumer(conn, statement, parameters, executemany, seconds) after
+    each statement the app's engines run. Every consumer (query stats,
+    metrics, the slow query log) shares one pair of listeners, so a
+    statement is timed once however many of them there are.
+    """
+    consumers = app.extensions.get("query_timers")
+    if consumers is not None:
+        consumers.append(consumer)
+        return
+    consumers = app.extensions["query_timers"] = [consumer]
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        for consume in consumers:
+            consume(conn, statement, parameters, executemany, elapsed)
+
+    def handle_error(exception_context):
+        # A failed statement never reaches after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", after_cursor_execute)
+            event.listen(engine, "handle_error", handle_error)
+
+
+def setup_query_stats(app, db):
+    """
+    Counts and times every query per request and per CLI command, and logs
+    statements repeated SQL_N_PLUS_ONE_THRESHOLD times or more as possible
+    N+1s. In debug mode (or with SQL_QUERY_DEBUG) responses carry the counts
+    as X-SQL-* and Server-Timing headers and CLI commands print them.
+
+    Queries run while a streamed response body is sent come after its
+    headers, so they are not in them.
+    """
+    if not app.config.get("SQL_QUERY_STATS", True):
+        return
+
+    def record_query(conn, statement, parameters, executemany, seconds):
+        for stats in _active_stats():
+            stats.record(statement, seconds)
+
+    time_queries(app, db, record_query)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.pop("query_stats", None)
+        if stats is None:
+            return response
+        _warn_n_plus_one(app, f"{request.method} {request.path}", stats)
+        if _reporting(app):
+            repeated = stats.repeated(n_plus_one_threshold(app))
+            response.headers[QUERY_COUNT_HEADER] = str(stats.count)
+            response.headers[QUERY_TIME_HEADER] = f"{stats.milliseconds:.3f}"
+            response.headers[N_PLUS_ONE_HEADER] = str(len(repeated))
+            response.headers.add(
+                "Server-Timing",
+                f'db;dur={stats.milliseconds:.3f};desc="{stats.count} queries"',
+            )
+        return response
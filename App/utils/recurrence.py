@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+# RRULE BYDAY codes, in date.weekday() order; bit n of a mask is WEEKDAY_CODES[n]
+WEEKDAY_CODES = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+
+def parse_weekdays(value):
+    """
+    Turns weekdays as RRULE BYDAY codes into a bit mask. Takes a string like
+    "MO,WE,FR" or a list of codes; raises ValueError for anything else.
+    """
+    codes = value.split(",") if isinstance(value, str) else value
+    if not isinstance(codes, (list, tuple)):
+        raise ValueError("Weekdays must be a list of day codes such as MO,WE,FR.")
+    mask = 0
+    for code in codes:
+        code = code.strip().upper() if isinstance(code, str) else code
+        if code not in WEEKDAY_CODES:
+            raise ValueError(
+                f"Unknown weekday '{code}'. Use {','.join(WEEKDAY_CODES)}."
+            )
+        mask |= 1 << WEEKDAY_CODES.index(code)
+    if not mask:
+        raise ValueError("At least one weekday is required.")
+    return mask
+
+
+def format_weekdays(mask):
+    return ",".join(code for day, code in enumerate(WEEKDAY_CODES) if mask >> day & 1)
+
+
+def occurrences(mask, time_of_day, first, last):
+    """Yields the datetimes at time_of_day on each masked weekday from first to last, inclusive."""
+    day = first
+    while day <= last:
+        if mask >> day.weekday() & 1:
+            yield datetime.combine(day, time_of_day)
+        day += timedelta(days=1)
@@ -0,0 +1,118 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+
+STICKY_COOKIE = "db_primary_until"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+_primary_reads = ContextVar("primary_reads", default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Lets reads inside the block go to a replica, e.g. from CLI or background code."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Keeps reads inside the block on the primary, even where a replica is allowed."""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def use_primary(view):
+    """Keeps every query of a GET view on the primary, for GET routes that write."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_replica_reads = False
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def reads_from_replica():
+    if _primary_reads.get():
+        return False
+    if _replica_reads.get():
+        return True
+    return has_request_context() and g.get("db_replica_reads", False)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to a replica bind when allowed and everything
+    else to the primary.
+
+    Reads may use a replica inside replica_reads() or during a GET request.
+    Flushes and INSERT/UPDATE/DELETE statements always use the primary, and
+    once a session has written, its later reads use the primary too, so it
+    reads its own writes. Each session sticks to one randomly chosen replica.
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self.wrote = False
+        self._replica = None
+
+    def _replica_engine(self):
+        if self._replica is None:
+            replicas = current_app.config.get("DB_READ_REPLICAS") or ()
+            if not replicas:
+                return None
+            self._replica = self._db.engines[random.choice(replicas)]
+        return self._replica
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.wrote = True
+            # Raw SQL could be a write, so it is never sent to a replica
+            elif not self.wrote and not isinstance(clause, TextClause):
+                if reads_from_replica():
+                    replica = self._replica_engine()
+                    if replica is not None:
+                        return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def setup_replica_routing(app, db):
+    """
+    Routes GET requests' reads to replicas. A client that just wrote gets a
+    short-lived cookie that keeps its next requests on the primary until the
+    replicas have had time to catch up.
+    """
+
+    @app.before_request
+    def route_reads():
+        sticky_until = request.cookies.get(STICKY_COOKIE, "")
+        sticky = sticky_until.isdigit() and int(sticky_until) > time.time()
+        g.db_replica_reads = request.method in ("GET", "HEAD") and not sticky
+
+    @app.after_request
+    def stick_to_primary(response):
+        if db.session.registry.has() and db.session().wrote:
+            seconds = app.config.get("DB_REPLICA_STICKY_SECONDS", 5)
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(int(time.time() + seconds)),
+                max_age=seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
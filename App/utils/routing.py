@@ -0,0 +1,64 @@
+import time
+from App.utils.spatial import haversine_km
+
+
+def distance_matrix(points):
+    """Pairwise great-circle distances in km between (latitude, longitude) points."""
+    return [[haversine_km(*a, *b) for b in points] for a in points]
+
+
+def path_length(order, matrix):
+    return sum(matrix[a][b] for a, b in zip(order, order[1:]))
+
+
+def nearest_neighbour_order(matrix, start=0):
+    """Greedy open path from start, always visiting the closest unvisited point next."""
+    unvisited = set(range(len(matrix))) - {start}
+    order = [start]
+    while unvisited:
+        last = matrix[order[-1]]
+        closest = min(unvisited, key=lambda point: (last[point], point))
+        order.append(closest)
+        unvisited.remove(closest)
+    return order
+
+
+def two_opt(order, matrix, deadline):
+    """
+    Improves an open path by reversing segments while that shortens it.
+    The first point stays fixed; stops early once time.monotonic() passes deadline.
+    """
+    order = list(order)
+    n = len(order)
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for i in range(1, n - 1):
+            if time.monotonic() >= deadline:
+                break
+            before, first = order[i - 1], order[i]
+            for j in range(i + 1, n):
+                last = order[j]
+                delta = matrix[before][last] - matrix[before][first]
+                if j + 1 < n:
+                    after = order[j + 1]
+                    delta += matrix[first][after] - matrix[last][after]
+                if delta < -1e-9:
+                    order[i : j + 1] = reversed(order[i : j + 1])
+                    first = order[i]
+                    improved = True
+    return order
+
+
+def plan_visiting_order(start, points, time_budget=0.05):
+    """
+    Orders points to keep the path from start short: nearest neighbour for a
+    first tour, then 2-opt for as long as time_budget (seconds) allows.
+    Returns the visiting order as indices into points.
+    """
+    if not points:
+        return []
+    deadline = time.monotonic() + time_budget
+    matrix = distance_matrix([start] + list(points))
+    order = two_opt(nearest_neighbour_order(matrix), matrix, deadline)
+    return [index - 1 for index in order[1:]]
@@ -0,0 +1,50 @@
+import threading
+
+
+class PeriodicTask(threading.Thread):
+    """
+    Runs task() every interval seconds inside an app context, in a daemon
+    thread (a greenlet once gevent has patched threading). A failure is
+    logged under the task's name and the task runs again at the next
+    interval, until stop().
+    """
+
+    def __init__(self, app, name, interval, task, session=None):
+        super().__init__(name=name, daemon=True)
+        self.app = app
+        self.interval = interval
+        self.task = task
+        self.session = session
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    self.task()
+                except Exception:
+                    self.app.logger.exception("Periodic task %s failed", self.name)
+                finally:
+                    if self.session is not None:
+                        self.session.remove()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_periodic_task(app, name, interval, task, session=None):
+    """
+    Starts a PeriodicTask once per app and name; an interval of 0 or None
+    disables it. Returns the task, if running.
+    """
+    tasks = app.extensions.setdefault("periodic_tasks", {})
+    if name in tasks or not interval:
+        return tasks.get(name)
+    periodic = tasks[name] = PeriodicTask(app, name, interval, task, session)
+    periodic.start()
+    return periodic
+
+
+def stop_periodic_tasks(app):
+    for periodic in app.extensions.pop("periodic_tasks", {}).values():
+        periodic.stop()
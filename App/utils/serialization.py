@@ -0,0 +1,63 @@
+import json
+from datetime import date, datetime, time
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used without it
+    orjson = None
+
+
+def iso_default(value):
+    """Encodes what json cannot natively, with dates and times as ISO 8601 strings."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes with orjson when it is installed and writes
+    dates and times as ISO 8601 rather than Flask's HTTP date format.
+
+    Output is compact unless the app is in debug mode, when it is indented
+    as Flask's own provider does.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._orjson_dumps(obj).decode()
+        kwargs.setdefault("default", iso_default)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def _orjson_dumps(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        # orjson writes datetimes as ISO 8601 itself; default sees the rest
+        return orjson.dumps(obj, default=iso_default, option=option)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        if orjson is not None:
+            body = self._orjson_dumps(obj, indent=pretty) + b"\n"
+        elif pretty:
+            body = self.dumps(obj, indent=2) + "\n"
+        else:
+            body = self.dumps(obj, separators=(",", ":")) + "\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def setup_json(app):
+    if app.config.get("JSON_FAST_ENCODER", True):
+        app.json = FastJSONProvider(app)
@@ -0,0 +1,324 @@
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from App.utils.querystats import normalize_statement, time_queries
+from App.utils.scheduler import start_periodic_task
+
+CONTROLLERS_PACKAGE = "App.controllers"
+# Only plain reads are explained; EXPLAIN ANALYZE and writes are never run twice
+EXPLAINABLE = ("SELECT", "WITH")
+EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+}
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+_PYFORMAT_PLACEHOLDER = re.compile(r"%%|%\((\w+)\)s|%s")
+
+
+def parameter_shapes(parameters, executemany=False):
+    """
+    The types of a statement's bound parameters, never their values, e.g.
+    ["int", "str"] or {"id_1": "int"}. For executemany, the number of rows
+    and the shape of the first.
+    """
+    if executemany:
+        rows = list(parameters or ())
+        return {"rows": len(rows), "shape": parameter_shapes(rows[0]) if rows else []}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def find_caller(frame):
+    """
+    The outermost App.controllers function on the stack, the one a view or
+    command called, as (function, "path:line"). Statements run outside any
+    controller are put down to the innermost App frame that ran them.
+    """
+    controller = fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(f"{CONTROLLERS_PACKAGE}."):
+            controller = frame
+        elif (
+            fallback is None
+            and module.startswith("App.")
+            and not (module.startswith("App.utils.") or module == "App.database")
+        ):
+            fallback = frame
+        frame = frame.f_back
+    frame = controller or fallback
+    if frame is None:
+        return None, None
+    path = os.path.relpath(frame.f_code.co_filename)
+    return frame.f_code.co_name, f"{path}:{frame.f_lineno}"
+
+
+def numbered_placeholders(statement):
+    """
+    The statement with psycopg's %s and %(name)s placeholders as $1, $2...,
+    the same name always getting the same number, for a statement to be
+    run without parameters.
+    """
+    numbers = {}
+
+    def number(match):
+        if match.group(0) == "%%":
+            return "%"
+        name = match.group(1) or len(numbers)
+        return f"${numbers.setdefault(name, len(numbers) + 1)}"
+
+    return _PYFORMAT_PLACEHOLDER.sub(number, statement)
+
+
+def explain(conn, statement, parameters):
+    """
+    The plan of a read as lines of text, run on the statement's own
+    connection inside a savepoint, so that a failing EXPLAIN cannot abort
+    the caller's transaction (as any error does on PostgreSQL).
+    """
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    if conn.dialect.name == "postgresql" and parameters:
+        # A plan for the bound values prints them (e.g. username = 'bob'), and
+        # the log keeps only their types: ask for the generic plan instead,
+        # which PostgreSQL 16 added, or for no plan on older servers
+        if (conn.dialect.server_version_info or (0,)) < (16,):
+            return None
+        prefix = "EXPLAIN (GENERIC_PLAN) "
+        statement, parameters = numbered_placeholders(statement), None
+    # A raw DBAPI cursor, so the EXPLAIN itself is not timed or logged
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = [str(row[-1]) for row in cursor.fetchall()]
+        except Exception as e:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            plan = [f"EXPLAIN failed: {e}"]
+        cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        return plan
+    except Exception as e:
+        # No savepoint outside a transaction, e.g. on an autocommit connection
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    """
+    Records statements slower than threshold_ms. Each statement is written
+    at most once per interval seconds, with an EXPLAIN plan; repeats in
+    between are only counted. Their count and time are carried by the next
+    entry written, or by a count-only entry flush() writes once the
+    interval is over, so summaries still add up.
+    """
+
+    def __init__(self, threshold_ms, path=None, interval=60, logger=None, plans=True):
+        self.threshold = threshold_ms / 1000
+        self.path = path
+        self.interval = interval
+        self.logger = logger
+        self.plans = plans
+        # Statement: (last written, repeats held back, their seconds, slowest,
+        # controller, source)
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    def record(self, conn, statement, parameters, executemany, seconds, frame):
+        key = normalize_statement(statement)
+        now = time.monotonic()
+        with self._lock:
+            last, count, total, slowest, controller, source = self.pending.get(
+                key, (None, 0, 0.0, 0.0, None, None)
+            )
+            if last is not None and now - last < self.interval:
+                self.pending[key] = (
+                    last,
+                    count + 1,
+                    total + seconds,
+                    max(slowest, seconds),
+                    controller,
+                    source,
+                )
+                return None
+            controller, source = find_caller(frame)
+            self.pending[key] = (now, 0, 0.0, 0.0, controller, source)
+
+        entry = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "ms": round(seconds * 1000, 3),
+            "count": count + 1,
+            "total_ms": round((total + seconds) * 1000, 3),
+            "controller": controller,
+            "source": source,
+            "statement": key,
+            "parameters": parameter_shapes(parameters, executemany),
+            "plan": (
+                explain(conn, statement, parameters)
+                if self.plans and not executemany
+                else None
+            ),
+        }
+        self.write(entry)
+        return entry
+
+    def flush(self, force=False):
+        """
+        Writes the repeats held back for each statement whose interval is
+        over (for every statement, with force) as a count-only entry, so
+        they are not lost when the statement is never slow again. Returns
+        the entries written.
+        """
+        now = time.monotonic()
+        entries = []
+        with self._lock:
+            for key, pending in list(self.pending.items()):
+                last, count, total, slowest, controller, source = pending
+                if not force and now - last < self.interval:
+                    continue
+                if count == 0:
+                    # Quiet for a whole interval; its next slow run is written in full
+                    del self.pending[key]
+                    continue
+                self.pending[key] = (now, 0, 0.0, 0.0, controller, source)
+                entries.append(
+                    {
+                        "at": datetime.now().isoformat(timespec="seconds"),
+                        "ms": round(slowest * 1000, 3),
+                        "count": count,
+                        "total_ms": round(total * 1000, 3),
+                        "controller": controller,
+                        "source": source,
+                        "statement": key,
+                        "parameters": None,
+                        "plan": None,
+                        "repeats": True,
+                    }
+                )
+        for entry in entries:
+            self.write(entry)
+        return entries
+
+    def write(self, entry):
+        if self.logger is not None and entry.get("repeats"):
+            self.logger.warning(
+                "Slow query ran %d more times (%.1f ms in all, slowest %.1f ms)"
+                " in %s: %s",
+                entry["count"],
+                entry["total_ms"],
+                entry["ms"],
+                entry["controller"],
+                entry["statement"][:300],
+            )
+        elif self.logger is not None:
+            self.logger.warning(
+                "Slow query (%.1f ms) in %s at %s: %s | plan: %s",
+                entry["ms"],
+                entry["controller"],
+                entry["source"],
+                entry["statement"][:300],
+                "; ".join(entry["plan"] or ()),
+            )
+        if self.path:
+            # One write per line, appended, so workers sharing the file do not interleave
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def read_slow_queries(path):
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # A line cut short by a crash
+    return entries
+
+
+def summarize_slow_queries(entries, limit=10):
+    """Statements by total time spent over the threshold, worst first."""
+    by_statement = {}
+    for entry in entries:
+        summary = by_statement.setdefault(
+            entry["statement"],
+            {
+                "statement": entry["statement"],
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "controllers": [],
+                "plan": None,
+            },
+        )
+        summary["count"] += entry["count"]
+        summary["total_ms"] += entry["total_ms"]
+        summary["max_ms"] = max(summary["max_ms"], entry["ms"])
+        if entry["controller"] and entry["controller"] not in summary["controllers"]:
+            summary["controllers"].append(entry["controller"])
+        summary["plan"] = entry["plan"] or summary["plan"]
+    worst = sorted(by_statement.values(), key=lambda s: -s["total_ms"])[:limit]
+    for summary in worst:
+        summary["total_ms"] = round(summary["total_ms"], 3)
+        summary["mean_ms"] = round(summary["total_ms"] / summary["count"], 3)
+    return worst
+
+
+def slow_query_log_path(app):
+    path = app.config.get("SLOW_QUERY_LOG")
+    if not path:
+        return None
+    return os.path.join(app.instance_path, path)
+
+
+def setup_slow_query_log(app, db):
+    """
+    Logs statements slower than SLOW_QUERY_THRESHOLD_MS with the controller
+    that ran them, their parameter types and an EXPLAIN plan, to the app
+    log and as JSON lines to SLOW_QUERY_LOG (relative to the instance
+    folder). flask perf slow-queries summarizes that file.
+    """
+    threshold = app.config.get("SLOW_QUERY_THRESHOLD_MS")
+    if threshold is None:
+        return
+    path = slow_query_log_path(app)
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    log = app.extensions["slow_query_log"] = SlowQueryLog(
+        threshold,
+        path=path,
+        interval=app.config.get("SLOW_QUERY_LOG_INTERVAL", 60),
+        logger=app.logger,
+        plans=app.config.get("SLOW_QUERY_EXPLAIN", True),
+    )
+
+    def record_slow_query(conn, statement, parameters, executemany, seconds):
+        if seconds >= log.threshold:
+            log.record(
+                conn, statement, parameters, executemany, seconds, sys._getframe(1)
+            )
+
+    time_queries(app, db, record_slow_query)
+
+
+def start_slow_query_flusher(app):
+    """
+    Writes held-back repeats of slow statements every SLOW_QUERY_LOG_INTERVAL
+    seconds in this process, and whatever is left when it exits.
+    """
+    log = app.extensions.get("slow_query_log")
+    if log is None:
+        return None
+    if "slow-query-flusher" not in app.extensions.get("periodic_tasks", {}):
+        atexit.register(log.flush, force=True)
+    return start_periodic_task(app, "slow-query-flusher", log.interval, log.flush)
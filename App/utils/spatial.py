@@ -0,0 +1,161 @@
+import heapq
+import math
+import threading
+from flask import current_app
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_CELL_DEGREES = 0.01  # roughly 1.1 km at the equator
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialGrid:
+    """
+    In-memory uniform latitude/longitude grid of points.
+
+    Points are bucketed into square cells; a k-nearest query searches rings
+    of cells outwards from the query's cell and stops once no unsearched
+    cell can hold anything closer than the k-th best so far. A query only
+    touches the cells around it instead of every point.
+    """
+
+    def __init__(self, cell_degrees=DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.loaded_at = None
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, latitude, longitude):
+        return (
+            math.floor(latitude / self.cell_degrees),
+            math.floor(longitude / self.cell_degrees),
+        )
+
+    def _remove(self, key):
+        point = self._points.pop(key, None)
+        if point is not None:
+            cell = self._cells[point[3]]
+            cell.discard(key)
+            if not cell:
+                del self._cells[point[3]]
+
+    def _add(self, key, latitude, longitude, payload):
+        cell = self._cell(latitude, longitude)
+        self._points[key] = (latitude, longitude, payload, cell)
+        self._cells.setdefault(cell, set()).add(key)
+
+    def get(self, key):
+        """Returns (latitude, longitude, payload) for key, or None."""
+        point = self._points.get(key)
+        return point[:3] if point else None
+
+    def update(self, key, latitude, longitude, payload=None):
+        with self._lock:
+            self._remove(key)
+            self._add(key, latitude, longitude, payload)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def replace_all(self, points):
+        """Rebuilds the grid from (key, latitude, longitude, payload) tuples."""
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            for key, latitude, longitude, payload in points:
+                self._add(key, latitude, longitude, payload)
+
+    def _ring(self, center, radius):
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for dcol in range(-radius, radius + 1):
+            yield (row - radius, col + dcol)
+            yield (row + radius, col + dcol)
+        for drow in range(-radius + 1, radius):
+            yield (row + drow, col - radius)
+            yield (row + drow, col + radius)
+
+    def _ring_min_km(self, latitude, radius):
+        # Anything in ring radius+1 or beyond is at least radius whole cells away;
+        # longitude degrees shrink towards the poles, so use the narrowest one in reach
+        if radius == 0:
+            return 0.0
+        reach = min(90.0, abs(latitude) + (radius + 1) * self.cell_degrees)
+        return (
+            radius * self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(reach))
+        )
+
+    def nearest(self, latitude, longitude, k=5, max_km=None):
+        """Returns up to k (distance_km, key, payload) tuples, closest first."""
+        best = []  # max-heap of (-distance, key) holding the k closest so far
+
+        def consider(key):
+            point_lat, point_lon, _, _ = self._points[key]
+            distance = haversine_km(latitude, longitude, point_lat, point_lon)
+            if max_km is not None and distance > max_km:
+                return
+            if len(best) < k:
+                heapq.heappush(best, (-distance, key))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, key))
+
+        with self._lock:
+            if k <= 0 or not self._points:
+                return []
+            center = self._cell(latitude, longitude)
+            radius = 0
+            while True:
+                if 8 * radius >= len(self._cells):
+                    # The ring is now wider than the occupied grid; finish with the
+                    # occupied cells left rather than walking empty ones
+                    for cell, keys in self._cells.items():
+                        if (
+                            max(abs(cell[0] - center[0]), abs(cell[1] - center[1]))
+                            >= radius
+                        ):
+                            for key in keys:
+                                consider(key)
+                    break
+                for cell in self._ring(center, radius):
+                    for key in self._cells.get(cell, ()):
+                        consider(key)
+                bound = self._ring_min_km(latitude, radius)
+                if max_km is not None and bound > max_km:
+                    break
+                if len(best) == k and bound >= -best[0][0]:
+                    break
+                radius += 1
+
+            found = sorted((-negated, key) for negated, key in best)
+            return [(distance, key, self._points[key][2]) for distance, key in found]
+
+    def __len__(self):
+        return len(self._points)
+
+
+def get_driver_index(app=None):
+    """Returns the app's driver location index; each worker process has its own."""
+    app = app or current_app
+    index = app.extensions.get("driver_spatial_index")
+    if index is None:
+        index = app.extensions.setdefault(
+            "driver_spatial_index",
+            SpatialGrid(
+                app.config.get("SPATIAL_GRID_CELL_DEGREES", DEFAULT_CELL_DEGREES)
+            ),
+        )
+    return index
@@ -0,0 +1,133 @@
+import threading
+from collections import deque
+from datetime import datetime
+from flask import current_app
+
+# Location history points a worker holds while flushes are off or failing
+DEFAULT_HISTORY_LIMIT = 100000
+
+
+class DriverStatusBuffer:
+    """
+    Write-behind buffer for driver status pings.
+
+    Keeps only the latest (username, status, location, latitude, longitude)
+    per driver until the next flush. Entries being flushed stay readable
+    until their UPDATE has committed, so a read never sees anything older
+    than the database.
+    Every ping is also queued, uncoalesced, for the location history, up to
+    history_limit points; past that the oldest are dropped and counted, so a
+    database outage cannot exhaust the worker's memory.
+    """
+
+    def __init__(self, history_limit=DEFAULT_HISTORY_LIMIT):
+        self._pending = {}
+        self._flushing = {}
+        self._usernames = {}
+        self._history = deque()
+        self.history_limit = history_limit
+        self._dropped_history = 0
+        self._lock = threading.Lock()
+        self.flusher = None
+
+    def record(
+        self, driver_id, username, status, location, latitude=None, longitude=None
+    ):
+        with self._lock:
+            self._usernames[driver_id] = username
+            self._pending[driver_id] = (
+                username,
+                status,
+                location,
+                latitude,
+                longitude,
+            )
+            self._history.append((driver_id, status, location, datetime.now()))
+            self._trim_history()
+
+    def get(self, driver_id):
+        with self._lock:
+            return self._pending.get(driver_id) or self._flushing.get(driver_id)
+
+    def snapshot(self):
+        """Every buffered entry by driver id, pending pings winning over in-flight ones."""
+        with self._lock:
+            return {**self._flushing, **self._pending}
+
+    def username(self, driver_id):
+        return self._usernames.get(driver_id)
+
+    def discard(self, driver_id):
+        """Drops buffered pings for a driver whose status was just written directly."""
+        with self._lock:
+            self._pending.pop(driver_id, None)
+            self._flushing.pop(driver_id, None)
+
+    def forget_username(self, driver_id):
+        with self._lock:
+            self._usernames.pop(driver_id, None)
+
+    def drain(self):
+        """Moves pending entries to the in-flight set and returns them."""
+        with self._lock:
+            batch = self._pending
+            self._pending = {}
+            self._flushing.update(batch)
+            return batch
+
+    def _trim_history(self):
+        overflow = len(self._history) - self.history_limit
+        for _ in range(overflow):
+            self._history.popleft()
+        if overflow > 0:
+            self._dropped_history += overflow
+
+    def drain_history(self):
+        with self._lock:
+            points = list(self._history)
+            self._history.clear()
+            return points
+
+    def restore_history(self, points):
+        """Puts points back ahead of newer ones, dropping the oldest past the limit."""
+        with self._lock:
+            self._history.extendleft(reversed(points))
+            self._trim_history()
+
+    def take_dropped_history(self):
+        """The number of points dropped since the last call."""
+        with self._lock:
+            dropped = self._dropped_history
+            self._dropped_history = 0
+            return dropped
+
+    def flushed(self, batch):
+        with self._lock:
+            for driver_id, entry in batch.items():
+                if self._flushing.get(driver_id) is entry:
+                    del self._flushing[driver_id]
+
+    def restore(self, batch):
+        """Puts a batch back after a failed flush, unless newer pings arrived."""
+        with self._lock:
+            for driver_id, entry in batch.items():
+                self._pending.setdefault(driver_id, entry)
+                if self._flushing.get(driver_id) is entry:
+                    del self._flushing[driver_id]
+
+    def __len__(self):
+        return len(self._pending)
+
+
+def get_status_buffer(app=None):
+    """Returns the app's buffer; each worker process has its own."""
+    app = app or current_app
+    buffer = app.extensions.get("driver_status_buffer")
+    if buffer is None:
+        buffer = app.extensions.setdefault(
+            "driver_status_buffer",
+            DriverStatusBuffer(
+                app.config.get("LOCATION_HISTORY_BUFFER_LIMIT", DEFAULT_HISTORY_LIMIT)
+            ),
+        )
+    return buffer
@@ -1,6 +1,9 @@
 import re
 from datetime import datetime
 
+from App.utils.pagination import MAX_PAGE_SIZE
+from App.utils.recurrence import parse_weekdays
+
 
 USERNAME_PATTERN = r"^[a-zA-Z0-9_ ]{3,30}$"
 USERNAME_ERROR = "Username can only contain letters, numbers, spaces and underscores. (3-30 characters)."
@@ -59,6 +62,34 @@ def check_time_format(value, field_name="Time"):
     return None
 
 
+def check_date_format(value, field_name="Date"):
+    if not isinstance(value, str):
+        return f"{field_name} must be a string."
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return f"{field_name}: Invalid date format. Use 'YYYY-MM-DD'."
+    return None
+
+
+def check_clock_time(value, field_name="Time"):
+    if not isinstance(value, str):
+        return f"{field_name} must be a string."
+    try:
+        datetime.strptime(value, "%H:%M")
+    except ValueError:
+        return f"{field_name}: Invalid time format. Use 'HH:MM'."
+    return None
+
+
+def check_weekdays(value, field_name="Weekdays"):
+    try:
+        parse_weekdays(value)
+    except (AttributeError, ValueError) as e:
+        return f"{field_name}: {e}"
+    return None
+
+
 def check_driver_status(value, field_name="Status"):
     allowed_values = {"On Duty", "Off Duty", "On Break"}
     if value not in allowed_values:
@@ -67,6 +98,32 @@ def check_driver_status(value, field_name="Status"):
     return None
 
 
+def check_coordinate(value, field_name, limit):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return f"{field_name} must be a number."
+    if not -limit <= value <= limit:
+        return f"{field_name} must be between {-limit} and {limit}."
+    return None
+
+
+def check_latitude(value, field_name="Latitude"):
+    return check_coordinate(value, field_name, 90)
+
+
+def check_longitude(value, field_name="Longitude"):
+    return check_coordinate(value, field_name, 180)
+
+
+def check_page_size(value, field_name="Limit"):
+    if value is None:
+        return None
+    if not isinstance(value, int) or value <= 0:
+        return f"{field_name} must be a positive integer."
+    if value > MAX_PAGE_SIZE:
+        return f"{field_name} must be no more than {MAX_PAGE_SIZE}."
+    return None
+
+
 # ============================================================
 # FIELD-SPECIFIC VALIDATION USING validate_field()
 # ============================================================
@@ -90,6 +147,13 @@ def validate_password(password):
     )
 
 
+def validate_optional_coordinates(latitude, longitude):
+    """Coordinates may be left out, but only as a pair."""
+    if latitude is None and longitude is None:
+        return []
+    return run_validations(check_latitude(latitude), check_longitude(longitude))
+
+
 def combine_validation_errors(*validation_results):
     """
     Combines multiple validation results into a single list of errors.
@@ -1,27 +1,113 @@
+import math
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from App.controllers import (
     schedule_drive,
     get_all_drivers_summary,
+    get_drivers_summary_page,
+    iter_drivers_summary,
+    get_all_drivers_summary_data,
+    get_drivers_summary_page_data,
+    iter_drivers_summary_data,
     update_driver_status,
+    record_driver_status_ping,
     get_stop_requests_for_driver,
+    get_stop_requests_for_driver_data,
+    get_driver_requests_version,
+    get_drivers_list_version,
     get_driver_status_and_location,
+    get_driver_location_history,
+    get_nearest_drivers,
+    plan_driver_route,
+    get_street_by_name,
+    create_drive_schedule,
+    preview_drive,
+    preview_drive_schedule,
+    get_drive_schedules_for_driver,
+    update_drive_schedule,
+    cancel_drive_schedule,
+    get_current_identity,
 )
-from App.models import Driver
 from App.utils.validation import *
+from App.models import DEFAULT_DURATION_MINUTES
+from datetime import datetime
+from App.utils.conditional import conditional_response
+from .listing import float_arg, int_arg, list_response
+from .admin import is_admin
 
 # Create a Blueprint for driver views
 driver_views = Blueprint("driver_views", __name__, template_folder="../templates")
 
 MAX_STREET_NAME_LENGTH = 100
+DEFAULT_NEAREST_COUNT = 5
+MAX_NEAREST_COUNT = 50
 
 
 # Route to get a summary of all drivers
 @driver_views.route("/api/drivers", methods=["GET"])
 def get_drivers_summary_route():
-    """Provides a summary list of all drivers."""
-    drivers = get_all_drivers_summary()
-    return jsonify(drivers), 200
+    """Provides a summary list of all drivers, optionally paginated or streamed."""
+    return conditional_response(
+        get_drivers_list_version(),
+        lambda: list_response(
+            get_all_drivers_summary, get_drivers_summary_page, iter_drivers_summary
+        ),
+    )
+
+
+@driver_views.route("/api/v2/drivers", methods=["GET"])
+def get_drivers_summary_v2_route():
+    """Like /api/drivers, with each driver as an {id, username} object."""
+    return conditional_response(
+        get_drivers_list_version(),
+        lambda: list_response(
+            get_all_drivers_summary_data,
+            get_drivers_summary_page_data,
+            iter_drivers_summary_data,
+        ),
+    )
+
+
+# Route to find the vans closest to a point, or to a street
+@driver_views.route("/api/drivers/nearest", methods=["GET"])
+@jwt_required()
+def get_nearest_drivers_route():
+    """Returns the k nearest vans that are not off duty, closest first."""
+    resident = get_current_identity()
+
+    if resident.role != "resident":
+        return jsonify({"errors": ["Access forbidden: Residents only"]}), 403
+
+    latitude = request.args.get("lat", type=float)
+    longitude = request.args.get("lon", type=float)
+    street_name = request.args.get("street")
+    k = int_arg("k", DEFAULT_NEAREST_COUNT)
+    max_km = float_arg("max_km")
+
+    if street_name and latitude is None and longitude is None:
+        street = get_street_by_name(street_name)
+        if not street:
+            return jsonify({"errors": [f"Street '{street_name}' not found"]}), 404
+        if street.latitude is None or street.longitude is None:
+            return jsonify({"errors": [f"Street '{street_name}' has no location"]}), 400
+        latitude, longitude = street.latitude, street.longitude
+
+    # Validate all fields
+    validation_errors = combine_validation_errors(
+        check_latitude(latitude),
+        check_longitude(longitude),
+    )
+    if not isinstance(k, int) or not 1 <= k <= MAX_NEAREST_COUNT:
+        validation_errors.append(f"K must be between 1 and {MAX_NEAREST_COUNT}.")
+    if max_km is not None and not (
+        isinstance(max_km, float) and math.isfinite(max_km) and max_km > 0
+    ):
+        validation_errors.append("Max km must be a positive number.")
+
+    if validation_errors:
+        return jsonify({"errors": validation_errors}), 400
+
+    return jsonify(get_nearest_drivers(latitude, longitude, k, max_km)), 200
 
 
 # Route for a driver to schedule a drive
@@ -29,10 +115,9 @@ def get_drivers_summary_route():
 @jwt_required()
 def schedule_drive_route():
     """Allows an authenticated driver to schedule a drive with validation."""
-    current_user_id = get_jwt_identity()
-    driver = Driver.query.get(current_user_id)
+    driver = get_current_identity()
 
-    if not driver or driver.role != "driver":
+    if driver.role != "driver":
         return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
 
     data = request.get_json()
@@ -52,56 +137,355 @@ def schedule_drive_route():
         return jsonify({"errors": validation_errors}), 400
 
     try:
-        result = schedule_drive(driver.id, street_name, time_str)
+        result = schedule_drive(
+            driver.id,
+            street_name,
+            time_str,
+            data.get("duration_minutes", DEFAULT_DURATION_MINUTES),
+        )
         return jsonify({"message": result}), 201
     except ValueError as e:
         return jsonify({"errors": [str(e)]}), 400
 
 
+# Route for a driver to check a drive or series for overlaps without booking it
+@driver_views.route("/api/drivers/schedule/validate", methods=["POST"])
+@jwt_required()
+def validate_drive_schedule_route():
+    """
+    Dry run of /api/drivers/schedule (with time_str) or of
+    /api/drivers/schedules (with weekdays and time). Answers the drive times
+    that would be booked and any overlaps with the driver's other drives.
+    """
+    driver = get_current_identity()
+
+    if driver.role != "driver":
+        return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
+
+    data = request.get_json()
+    duration = data.get("duration_minutes", DEFAULT_DURATION_MINUTES)
+    series = "weekdays" in data
+    if series:
+        validation_errors = combine_validation_errors(
+            check_weekdays(data["weekdays"]), check_clock_time(data.get("time"))
+        )
+    else:
+        validation_errors = combine_validation_errors(
+            check_time_format(data.get("time_str"))
+        )
+
+    if validation_errors:
+        return jsonify({"errors": validation_errors}), 400
+
+    try:
+        if series:
+            preview = preview_drive_schedule(
+                driver.id,
+                data["weekdays"],
+                data["time"],
+                starts_on=data.get("starts_on"),
+                ends_on=data.get("ends_on"),
+                duration_minutes=duration,
+            )
+        else:
+            preview = preview_drive(driver.id, data["time_str"], duration)
+    except ValueError as e:
+        return jsonify({"errors": [str(e)]}), 400
+    return jsonify({"valid": not preview["conflicts"], **preview}), 200
+
+
+# Routes for a driver's recurring drive schedules
+@driver_views.route("/api/drivers/schedules", methods=["GET"])
+@jwt_required()
+def get_drive_schedules_route():
+    """Lists the authenticated driver's recurring schedules."""
+    driver = get_current_identity()
+
+    if driver.role != "driver":
+        return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
+
+    return jsonify(get_drive_schedules_for_driver(driver.id)), 200
+
+
+@driver_views.route("/api/drivers/schedules", methods=["POST"])
+@jwt_required()
+def create_drive_schedule_route():
+    """
+    Creates a weekly series of drives from street_name, weekdays (e.g.
+    "MO,WE,FR" or a list of codes), time ("HH:MM") and optional starts_on
+    and ends_on ("YYYY-MM-DD"). Its drives are created up front.
+    """
+    driver = get_current_identity()
+
+    if driver.role != "driver":
+        return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
+
+    data = request.get_json()
+    street_name = data.get("street_name")
+    starts_on, ends_on = data.get("starts_on"), data.get("ends_on")
+
+    # Validate all fields
+    validation_errors = combine_validation_errors(
+        check_required(street_name, "Street name"),
+        check_string_length(
+            street_name, "Street name", max_length=MAX_STREET_NAME_LENGTH
+        ),
+        check_weekdays(data.get("weekdays")),
+        check_clock_time(data.get("time")),
+        check_date_format(starts_on, "Starts on") if starts_on is not None else None,
+        check_date_format(ends_on, "Ends on") if ends_on is not None else None,
+    )
+
+    if validation_errors:
+        return jsonify({"errors": validation_errors}), 400
+
+    try:
+        schedule = create_drive_schedule(
+            driver.id,
+            street_name,
+            data["weekdays"],
+            data["time"],
+            starts_on=starts_on,
+            ends_on=ends_on,
+            duration_minutes=data.get("duration_minutes", DEFAULT_DURATION_MINUTES),
+        )
+        return jsonify(schedule.get_json()), 201
+    except ValueError as e:
+        return jsonify({"errors": [str(e)]}), 400
+
+
+@driver_views.route("/api/drivers/schedules/<int:schedule_id>", methods=["PUT"])
+@jwt_required()
+def update_drive_schedule_route(schedule_id):
+    """
+    Edits a whole series at once; any of weekdays, time, street_name and
+    ends_on ("" clears it) may be given. Future drives follow the change.
+    """
+    driver = get_current_identity()
+
+    if driver.role != "driver":
+        return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
+
+    data = request.get_json()
+    weekdays, time_str = data.get("weekdays"), data.get("time")
+    street_name, ends_on = data.get("street_name"), data.get("ends_on")
+
+    # Validate the fields that were given
+    validation_errors = combine_validation_errors(
+        check_weekdays(weekdays) if weekdays is not None else None,
+        check_clock_time(time_str) if time_str is not None else None,
+        (
+            check_string_length(
+                street_name, "Street name", max_length=MAX_STREET_NAME_LENGTH
+            )
+            if street_name is not None
+            else None
+        ),
+        check_date_format(ends_on, "Ends on") if ends_on else None,
+    )
+
+    if validation_errors:
+        return jsonify({"errors": validation_errors}), 400
+
+    try:
+        schedule = update_drive_schedule(
+            schedule_id,
+            driver.id,
+            weekdays=weekdays,
+            time_str=time_str,
+            street_name=street_name,
+            ends_on=ends_on,
+        )
+        return jsonify(schedule.get_json()), 200
+    except ValueError as e:
+        status = 404 if str(e) == "Schedule not found" else 400
+        return jsonify({"errors": [str(e)]}), status
+
+
+@driver_views.route("/api/drivers/schedules/<int:schedule_id>", methods=["DELETE"])
+@jwt_required()
+def cancel_drive_schedule_route(schedule_id):
+    """Cancels a whole series, removing its future drives."""
+    driver = get_current_identity()
+
+    if driver.role != "driver":
+        return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
+
+    try:
+        removed = cancel_drive_schedule(schedule_id, driver.id)
+        return (
+            jsonify({"message": f"Schedule cancelled, {removed} drives removed"}),
+            200,
+        )
+    except ValueError as e:
+        return jsonify({"errors": [str(e)]}), 404
+
+
 # Route for a driver to update their status
 @driver_views.route("/api/drivers/status", methods=["PUT"])
 @jwt_required()
 def update_driver_status_route():
     """Allows an authenticated driver to update their status with validation."""
-    current_user_id = get_jwt_identity()
-    driver = Driver.query.get(current_user_id)
+    driver = get_current_identity()
 
-    if not driver or driver.role != "driver":
+    if driver.role != "driver":
         return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
 
     data = request.get_json()
     new_status = data.get("status")
     new_location = data.get("location")
+    latitude = data.get("latitude")
+    longitude = data.get("longitude")
 
     # Validate all fields
     validation_errors = combine_validation_errors(
         check_driver_status(new_status),
         check_string_length(new_location, "Location", max_length=120),
+        validate_optional_coordinates(latitude, longitude),
     )
 
     if validation_errors:
         return jsonify({"errors": validation_errors}), 400
 
     try:
-        result = update_driver_status(driver.id, new_status, new_location)
+        result = update_driver_status(
+            driver.id, new_status, new_location, latitude, longitude
+        )
         return jsonify({"message": result}), 200
     except ValueError as e:
         return jsonify({"errors": [str(e)]}), 400
 
 
+# Route for a driver app to report status frequently; written to the database in batches
+@driver_views.route("/api/drivers/status/ping", methods=["POST"])
+@jwt_required()
+def driver_status_ping_route():
+    """Accepts a status ping into the write-behind buffer with validation."""
+    driver = get_current_identity()
+
+    if driver.role != "driver":
+        return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
+
+    data = request.get_json()
+    new_status = data.get("status")
+    new_location = data.get("location")
+    latitude = data.get("latitude")
+    longitude = data.get("longitude")
+
+    # Validate all fields
+    validation_errors = combine_validation_errors(
+        check_driver_status(new_status),
+        check_string_length(new_location, "Location", max_length=120),
+        validate_optional_coordinates(latitude, longitude),
+    )
+
+    if validation_errors:
+        return jsonify({"errors": validation_errors}), 400
+
+    try:
+        result = record_driver_status_ping(
+            driver.id, new_status, new_location, latitude, longitude
+        )
+        return jsonify({"message": result}), 202
+    except ValueError as e:
+        return jsonify({"errors": [str(e)]}), 400
+
+
+# Route for a driver to get an optimized stop order for a drive or a whole day
+@driver_views.route("/api/drivers/route", methods=["GET"])
+@jwt_required()
+def plan_driver_route_route():
+    """Plans ?drive_id=, or every drive on ?date= (today by default), with ETAs."""
+    driver = get_current_identity()
+
+    if driver.role != "driver":
+        return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
+
+    drive_id = request.args.get("drive_id", type=int)
+    date_str = request.args.get("date")
+
+    # Validate all fields
+    validation_errors = combine_validation_errors(
+        check_id(drive_id, "Drive ID") if "drive_id" in request.args else None,
+        check_date_format(date_str) if date_str is not None else None,
+    )
+
+    if validation_errors:
+        return jsonify({"errors": validation_errors}), 400
+
+    day = datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else None
+    try:
+        return jsonify(plan_driver_route(driver.id, drive_id, day)), 200
+    except ValueError as e:
+        return jsonify({"errors": [str(e)]}), 404
+
+
 # Route for a driver to view their stop requests
 @driver_views.route("/api/drivers/requests", methods=["GET"])
 @jwt_required()
 def get_driver_requests_route():
     """Allows an authenticated driver to view their stop requests."""
-    current_user_id = get_jwt_identity()
-    driver = Driver.query.get(current_user_id)
+    driver = get_current_identity()
 
-    if not driver or driver.role != "driver":
+    if driver.role != "driver":
         return jsonify({"Error": "Access forbidden: Drivers only"}), 403
 
-    try:
-        requests = get_stop_requests_for_driver(driver.id)
-        return jsonify(requests), 200
-    except ValueError as e:
-        return jsonify({"Error": str(e)}), 400
+    def build():
+        try:
+            requests = get_stop_requests_for_driver(driver.id)
+            return jsonify(requests), 200
+        except ValueError as e:
+            return jsonify({"Error": str(e)}), 400
+
+    # Polls with a current If-None-Match get a 304 without building the list
+    return conditional_response(get_driver_requests_version(driver.id), build)
+
+
+@driver_views.route("/api/v2/drivers/requests", methods=["GET"])
+@jwt_required()
+def get_driver_requests_v2_route():
+    """Like /api/drivers/requests, with each stop request as an object."""
+    driver = get_current_identity()
+
+    if driver.role != "driver":
+        return jsonify({"errors": ["Access forbidden: Drivers only"]}), 403
+
+    def build():
+        try:
+            return jsonify(get_stop_requests_for_driver_data(driver.id)), 200
+        except ValueError as e:
+            return jsonify({"errors": [str(e)]}), 404
+
+    return conditional_response(get_driver_requests_version(driver.id), build)
+
+
+# Route to view where a driver has been; the driver themselves or an admin
+@driver_views.route("/api/drivers/<int:driver_id>/history", methods=["GET"])
+@jwt_required()
+def get_driver_location_history_route(driver_id):
+    """Returns a driver's recorded status and location between start and end."""
+    identity = get_current_identity()
+
+    if not is_admin(identity) and not (
+        identity.role == "driver" and identity.id == driver_id
+    ):
+        return jsonify({"errors": ["Access forbidden"]}), 403
+
+    start = request.args.get("start")
+    end = request.args.get("end")
+
+    # Validate all fields
+    validation_errors = combine_validation_errors(
+        check_time_format(start, "Start"),
+        check_time_format(end, "End"),
+    )
+
+    if validation_errors:
+        return jsonify({"errors": validation_errors}), 400
+
+    history = get_driver_location_history(
+        driver_id,
+        datetime.strptime(start, "%Y-%m-%d %H:%M"),
+        datetime.strptime(end, "%Y-%m-%d %H:%M"),
+    )
+    return jsonify(history), 200
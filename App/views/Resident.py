@@ -1,12 +1,25 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from App.controllers import get_resident_inbox, request_stop
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from flask_jwt_extended import jwt_required
+from App.controllers import get_resident_inbox, request_stop, get_current_identity
 from App.controllers.Resident import (
     get_all_residents_summary,
+    get_residents_summary_page,
+    iter_residents_summary,
+    get_all_residents_summary_data,
+    get_residents_summary_page_data,
+    iter_residents_summary_data,
+    get_resident_inbox_data,
+    get_upcoming_inbox_page_data,
     get_driver_status_and_location,
+    get_upcoming_inbox_page,
+    get_resident_inbox_version,
+    stream_driver_status,
+    stream_street_driver_status,
 )
-from App.models import Resident
+from App.utils.pagination import DEFAULT_PAGE_SIZE
+from App.utils.conditional import conditional_response
 from App.utils.validation import *
+from .listing import list_response, is_truthy_arg, limit_arg
 
 # Create a Blueprint for resident views
 resident_views = Blueprint("resident_views", __name__, template_folder="../templates")
@@ -15,27 +28,86 @@ resident_views = Blueprint("resident_views", __name__, template_folder="../templ
 # Route to get a summary of all residents
 @resident_views.route("/api/residents", methods=["GET"])
 def get_residents_summary_route():
-    """Provides a summary list of all residents."""
-    residents = get_all_residents_summary()
-    return jsonify(residents), 200
+    """Provides a summary list of all residents, optionally paginated or streamed."""
+    return list_response(
+        get_all_residents_summary, get_residents_summary_page, iter_residents_summary
+    )
+
+
+@resident_views.route("/api/v2/residents", methods=["GET"])
+def get_residents_summary_v2_route():
+    """Like /api/residents, with each resident as an object."""
+    return list_response(
+        get_all_residents_summary_data,
+        get_residents_summary_page_data,
+        iter_residents_summary_data,
+    )
 
 
 # Route for a resident to view their inbox
 @resident_views.route("/api/residents/inbox", methods=["GET"])
 @jwt_required()
 def get_resident_inbox_route():
-    """Allows an authenticated resident to view their inbox."""
-    current_user_id = get_jwt_identity()
-    resident = Resident.query.get(current_user_id)
+    """Allows an authenticated resident to view their inbox.
+
+    Pass ?upcoming=true to get only future drives, paginated with ?limit and ?cursor.
+    """
+    resident = get_current_identity()
 
-    if not resident or resident.role != "resident":
+    if resident.role != "resident":
         return jsonify({"Error": "Access forbidden: Residents only"}), 403
 
+    if is_truthy_arg("upcoming"):
+        return upcoming_inbox_response(
+            resident.id, get_upcoming_inbox_page, legacy_errors=True
+        )
+
+    def build():
+        try:
+            inbox_items = get_resident_inbox(resident.id)
+            return jsonify(inbox_items), 200
+        except ValueError as e:
+            return jsonify({"Error": str(e)}), 404
+
+    # Polls with a current If-None-Match get a 304 without building the inbox
+    return conditional_response(get_resident_inbox_version(resident.id), build)
+
+
+@resident_views.route("/api/v2/residents/inbox", methods=["GET"])
+@jwt_required()
+def get_resident_inbox_v2_route():
+    """Like /api/residents/inbox, with the street and each drive as objects."""
+    resident = get_current_identity()
+
+    if resident.role != "resident":
+        return jsonify({"errors": ["Access forbidden: Residents only"]}), 403
+
+    if is_truthy_arg("upcoming"):
+        return upcoming_inbox_response(resident.id, get_upcoming_inbox_page_data)
+
+    def build():
+        try:
+            return jsonify(get_resident_inbox_data(resident.id)), 200
+        except ValueError as e:
+            return jsonify({"errors": [str(e)]}), 404
+
+    return conditional_response(get_resident_inbox_version(resident.id), build)
+
+
+def upcoming_inbox_response(resident_id, get_page, legacy_errors=False):
+    """One page of future drives, read with ?limit and ?cursor."""
+    limit = limit_arg(current_app.config.get("INBOX_PAGE_SIZE", DEFAULT_PAGE_SIZE))
+    validation_errors = combine_validation_errors(check_page_size(limit))
+    if validation_errors:
+        return jsonify({"errors": validation_errors}), 400
     try:
-        inbox_items = get_resident_inbox(resident.id)
-        return jsonify(inbox_items), 200
+        page = get_page(resident_id, limit=limit, cursor=request.args.get("cursor"))
+        return jsonify(page), 200
     except ValueError as e:
-        return jsonify({"Error": str(e)}), 404
+        # v1 answers {"Error": "..."}, v2 a list of errors like other routes
+        if legacy_errors:
+            return jsonify({"Error": str(e)}), 400
+        return jsonify({"errors": [str(e)]}), 400
 
 
 # Route for a resident to request a stop
@@ -43,28 +115,30 @@ def get_resident_inbox_route():
 @jwt_required()
 def request_stop_route():
     """Allows an authenticated resident to request a stop with validation."""
-    current_user_id = get_jwt_identity()
-    resident = Resident.query.get(current_user_id)
+    resident = get_current_identity()
 
-    if not resident or resident.role != "resident":
+    if resident.role != "resident":
         return jsonify({"errors": ["Access forbidden: Residents only"]}), 403
 
     data = request.get_json()
     drive_id = data.get("drive_id")
     message = data.get("message")
+    latitude = data.get("latitude")
+    longitude = data.get("longitude")
 
     # Validate all fields
     validation_errors = combine_validation_errors(
         check_id(drive_id, "Drive ID"),
         check_required(message, "Message"),
         check_string_length(message, "Message", max_length=200),
+        validate_optional_coordinates(latitude, longitude),
     )
 
     if validation_errors:
         return jsonify({"errors": validation_errors}), 400
 
     try:
-        result = request_stop(resident.id, drive_id, message)
+        result = request_stop(resident.id, drive_id, message, latitude, longitude)
         return jsonify({"message": result}), 201
     except ValueError as e:
         return jsonify({"errors": [str(e)]}), 400
@@ -77,13 +151,58 @@ def request_stop_route():
 @jwt_required()
 def get_driver_status_route(driver_id):
     """Provides the status and location for a specific driver."""
-    current_user_id = get_jwt_identity()
-    resident = Resident.query.get(current_user_id)
+    resident = get_current_identity()
 
-    if not resident or resident.role != "resident":
+    if resident.role != "resident":
         return jsonify({"Error": "Access forbidden: Residents only"}), 403
     try:
         status = get_driver_status_and_location(driver_id)
         return jsonify({"Status": status}), 200
     except ValueError as e:
         return jsonify({"Error": str(e)}), 404
+
+
+def event_stream_response(frames):
+    return Response(
+        stream_with_context(frames),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Route for Resident to receive a specific driver's status as server-sent events
+@resident_views.route(
+    "/api/resident/driver-status-and-location/<int:driver_id>/stream", methods=["GET"]
+)
+@jwt_required()
+def stream_driver_status_route(driver_id):
+    """Pushes the driver's status and location every time it changes."""
+    resident = get_current_identity()
+
+    if resident.role != "resident":
+        return jsonify({"Error": "Access forbidden: Residents only"}), 403
+    try:
+        frames = stream_driver_status(
+            driver_id, heartbeat=current_app.config.get("SSE_HEARTBEAT_SECONDS", 15)
+        )
+        return event_stream_response(frames)
+    except ValueError as e:
+        return jsonify({"Error": str(e)}), 404
+
+
+# Route for Resident to receive status changes of every driver scheduled on their street today
+@resident_views.route("/api/residents/street/stream", methods=["GET"])
+@jwt_required()
+def stream_street_driver_status_route():
+    """Pushes status and location changes of drivers serving the resident's street."""
+    resident = get_current_identity()
+
+    if resident.role != "resident":
+        return jsonify({"Error": "Access forbidden: Residents only"}), 403
+    try:
+        frames = stream_street_driver_status(
+            resident.id, heartbeat=current_app.config.get("SSE_HEARTBEAT_SECONDS", 15)
+        )
+        return event_stream_response(frames)
+    except ValueError as e:
+        return jsonify({"Error": str(e)}), 404
@@ -5,8 +5,8 @@ from .Driver import driver_views
 from .Resident import resident_views
 from .index import index_views
 from .auth import auth_views
-from .admin import setup_admin
+from .admin import setup_admin, admin_views
 
 
-views = [user_views, index_views, auth_views, driver_views, resident_views]
+views = [user_views, index_views, auth_views, driver_views, resident_views, admin_views]
 # blueprints must be added to this list
@@ -1,9 +1,14 @@
+import csv
+import io
 from flask_admin.contrib.sqla import ModelView
 from flask_jwt_extended import jwt_required, current_user, unset_jwt_cookies, set_access_cookies
 from flask_admin import Admin
-from flask import flash, redirect, url_for, request
+from flask import Blueprint, current_app, flash, jsonify, redirect, url_for, request
 from App.database import db
 from App.models import User
+from App.controllers import import_file, detect_import_format, IMPORT_KINDS, IMPORT_FORMATS
+
+admin_views = Blueprint('admin_views', __name__, template_folder='../templates')
 
 class AdminView(ModelView):
 
@@ -18,4 +23,47 @@ class AdminView(ModelView):
 
 def setup_admin(app):
     admin = Admin(app, name='FlaskMVC', template_mode='bootstrap3')
-    admin.add_view(AdminView(User, db.session))
\ No newline at end of file
+    admin.add_view(AdminView(User, db.session))
+
+
+def is_admin(user):
+    # Anyone can create a plain user account through POST /api/users, so the
+    # role alone is not enough: admins are the accounts named in ADMIN_USERNAMES
+    return (
+        user is not None
+        and user.role == 'user'
+        and user.username in current_app.config.get('ADMIN_USERNAMES', ())
+    )
+
+
+# Bulk import of streets, drivers or residents from a CSV or JSONL upload,
+# sent either as a multipart 'file' field or as the raw request body
+@admin_views.route('/api/admin/import/<kind>', methods=['POST'])
+@jwt_required()
+def bulk_import_action(kind):
+    if not is_admin(current_user):
+        return jsonify({'errors': ['Access forbidden: Admins only']}), 403
+    if kind not in IMPORT_KINDS:
+        return jsonify({'errors': [f"Unsupported import kind '{kind}'"]}), 404
+
+    upload = request.files.get('file')
+    if upload:
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8')
+        filename, content_type = upload.filename, upload.content_type
+    else:
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+        filename, content_type = None, request.content_type
+
+    fmt = request.args.get('format') or detect_import_format(filename, content_type)
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'errors': [f"Unsupported import format '{fmt}'"]}), 400
+
+    # The whole file is parsed before the first chunk is written, so a bad
+    # upload is refused with nothing imported
+    try:
+        report = import_file(kind, stream, fmt)
+    except UnicodeDecodeError:
+        return jsonify({'errors': ['The upload must be UTF-8 text']}), 400
+    except csv.Error as e:
+        return jsonify({'errors': [f'Malformed CSV: {e}']}), 400
+    return jsonify(report), 200
@@ -1,5 +1,8 @@
-from flask import Blueprint, redirect, render_template, request, send_from_directory, jsonify
+from flask import Blueprint, Response, redirect, render_template, request, send_from_directory, jsonify
 from App.controllers import create_user, initialize
+from App.database import get_pool_stats
+from App.utils.replicas import use_primary
+from App.utils.metrics import CONTENT_TYPE, collect_metrics
 
 index_views = Blueprint('index_views', __name__, template_folder='../templates')
 
@@ -8,10 +11,19 @@ def index_page():
     return render_template('index.html')
 
 @index_views.route('/init', methods=['GET'])
+@use_primary
 def init():
     initialize()
     return jsonify(message='db initialized!')
 
 @index_views.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status':'healthy'})
\ No newline at end of file
+    return jsonify({'status':'healthy'})
+
+@index_views.route('/health/db', methods=['GET'])
+def database_health_check():
+    return jsonify(get_pool_stats())
+
+@index_views.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(collect_metrics(), content_type=CONTENT_TYPE)
\ No newline at end of file
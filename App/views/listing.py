@@ -0,0 +1,63 @@
+from flask import Response, jsonify, request, stream_with_context
+from App.utils.pagination import iter_json_array
+from App.utils.validation import check_page_size, combine_validation_errors
+
+
+def is_truthy_arg(name):
+    return request.args.get(name, "").lower() in ("1", "true", "yes")
+
+
+def int_arg(name, default=None):
+    """
+    ?name as an int, or default when absent. Anything else is returned as
+    given, so that validation rejects it rather than it meaning the default.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def float_arg(name, default=None):
+    """Like int_arg, for a float."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def limit_arg(default=None):
+    """?limit as an int, or default; anything else is left for check_page_size."""
+    return int_arg("limit", default)
+
+
+def list_response(get_all, get_page, iterate):
+    """
+    Serves a list endpoint in one of three modes:
+    ?stream=true streams a JSON array in chunks, ?limit/?cursor returns one
+    keyset page, and no arguments returns the whole list as before.
+    """
+    if is_truthy_arg("stream"):
+        return Response(
+            stream_with_context(iter_json_array(iterate())),
+            mimetype="application/json",
+        )
+
+    if "limit" in request.args or "cursor" in request.args:
+        limit = limit_arg()
+        validation_errors = combine_validation_errors(check_page_size(limit))
+        if validation_errors:
+            return jsonify({"errors": validation_errors}), 400
+        try:
+            page = get_page(limit=limit, cursor=request.args.get("cursor"))
+        except ValueError as e:
+            return jsonify({"errors": [str(e)]}), 400
+        return jsonify(page), 200
+
+    return jsonify(get_all()), 200
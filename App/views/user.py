@@ -16,12 +16,15 @@ from App.controllers import (
     create_user,
     get_all_users,
     get_all_users_json,
+    get_users_json_page,
+    iter_users_json,
     jwt_required,
     add_driver,
     add_resident,
 )
 
 from App.utils.validation import *
+from .listing import list_response
 
 user_views = Blueprint("user_views", __name__, template_folder="../templates")
 
@@ -42,8 +45,7 @@ def create_user_action():
 
 @user_views.route("/api/users", methods=["GET"])
 def get_users_action():
-    users = get_all_users_json()
-    return jsonify(users)
+    return list_response(get_all_users_json, get_users_json_page, iter_users_json)
 
 
 @user_views.route("/api/users", methods=["POST"])
@@ -1,5 +1,8 @@
 # gunicorn_config.py
 import multiprocessing
+import glob
+import os
+import tempfile
 
 # The socket to bind.
 # "0.0.0.0" to bind to all interfaces. 8000 is the port number.
@@ -11,9 +14,39 @@ workers = 4
 # Use the 'gevent' worker type for async performance.
 worker_class = 'gevent'
 
+# The most greenlets (concurrent requests) each gevent worker will run.
+# With DB_PROFILE=production the database pool is sized from this and workers.
+worker_connections = 1000
+
 # Log level
 loglevel = 'info'
 
 # Where to log to
 accesslog = '-'  # '-' means log to stdout
-errorlog = '-'  # '-' means log to stderr
\ No newline at end of file
+errorlog = '-'  # '-' means log to stderr
+
+def shared_directory(name):
+    # On tmpfs where there is one, so workers share state without touching disk;
+    # named after the port so two deployments on one host stay apart
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, f"bread-van-{name}-{bind.rsplit(':', 1)[-1]}")
+
+# Each worker writes its metrics to FLASK_METRICS_DIR and /metrics adds them
+# up across workers, and status updates are relayed between workers through
+# FLASK_PUBSUB_DIR; set either to an empty string to keep it per worker.
+def on_starting(server):
+    # Set before the workers fork, so they all invalidate each other's caches
+    os.environ.setdefault('FLASK_CACHE_VERSION_DIR', shared_directory('cache'))
+    os.environ.setdefault('FLASK_METRICS_DIR', shared_directory('metrics'))
+    # Status streams reach subscribers on every worker, not only the publisher's
+    os.environ.setdefault('FLASK_PUBSUB_DIR', shared_directory('pubsub'))
+    # Start from zero: the files of a previous run's workers would be summed in,
+    # and its workers' sockets sent to
+    for variable, pattern in (
+        ('FLASK_METRICS_DIR', 'metrics-*.json'),
+        ('FLASK_PUBSUB_DIR', 'worker-*.sock'),
+    ):
+        directory = os.environ[variable]
+        if directory:
+            for path in glob.glob(os.path.join(directory, pattern)):
+                os.remove(path)
@@ -1,25 +1,61 @@
+import os
 import sys
+import json
+import time
 import click
 import pytest
 from flask.cli import AppGroup
 from App.main import create_app
 from App.database import get_migrate
+from App.models import DEFAULT_DURATION_MINUTES
+from App.utils.loadtest import (
+    DEFAULT_COLLECTION,
+    DEFAULT_SCENARIOS,
+    AppTarget,
+    HTTPTarget,
+    run_load_test,
+)
+from App.utils.slowqueries import (
+    read_slow_queries,
+    slow_query_log_path,
+    summarize_slow_queries,
+)
+from App.utils.formatting import (
+    format_driver_summary,
+    format_resident_summary,
+    format_inbox_drive,
+    format_stop_request,
+    format_schedule,
+)
 from App.controllers import (
     initialize,
     create_user,
     get_all_users_json,
     get_all_users,
-    get_all_residents_summary,
-    get_all_drivers_summary,
+    get_all_residents_summary_data,
+    get_all_drivers_summary_data,
     add_driver,
     schedule_drive,
-    get_stop_requests_for_driver,
+    get_stop_requests_for_driver_data,
     update_driver_status,
     add_resident,
-    get_resident_inbox,
+    get_resident_inbox_data,
     request_stop,
     get_driver_status_and_location,
     get_all_streets,
+    compact_location_history,
+    plan_driver_route,
+    import_file,
+    detect_import_format,
+    IMPORT_FORMATS,
+    compare_list_serialization,
+    seed_database,
+    SEED_PASSWORD,
+    create_drive_schedule,
+    get_drive_schedules_for_driver,
+    update_drive_schedule,
+    cancel_drive_schedule,
+    materialize_drive_schedules,
 )
 
 # --- Flask app setup ---
@@ -36,6 +72,18 @@ def init():
     click.echo("Database initialized successfully.")
 
 
+@app.cli.command("seed", help="Bulk inserts a synthetic data set of about N residents and N drives")
+@click.option("--scale", default=1000, type=click.IntRange(min=1))
+@click.option("--password", default=SEED_PASSWORD, help="Password of every seeded user")
+@click.option("--seed", "random_seed", default=None, type=int)
+def seed_command(scale, password, random_seed):
+    started = time.perf_counter()
+    created = seed_database(scale, password=password, seed=random_seed)
+    elapsed = time.perf_counter() - started
+    click.echo(", ".join(f"{count} {table}" for table, count in created.items()))
+    click.echo(f"Seeded in {elapsed:.1f}s.")
+
+
 # ===========================================================
 # USER COMMANDS
 # ===========================================================
@@ -78,20 +126,32 @@ def create_driver_command(name, password):
 
 @driver_cli.command("list", help="Lists drivers in the database")
 def list_driver_command():
-    print_list_neatly(get_all_drivers_summary(), heading="Available Drivers")
+    print_list_neatly(
+        get_all_drivers_summary_data(),
+        heading="Available Drivers",
+        format_item=format_driver_summary,
+    )
+
+
+def input_duration_minutes():
+    duration = input(f"Enter the duration in minutes (blank for {DEFAULT_DURATION_MINUTES}): ")
+    return int(duration) if duration.strip() else DEFAULT_DURATION_MINUTES
 
 
 @driver_cli.command("schedule", help="Schedules a drive for a driver")
 def schedule_drive_command():
     try:
-        drivers = get_all_drivers_summary()
-        print_list_neatly(drivers, heading="Select a Driver")
+        drivers = get_all_drivers_summary_data()
+        print_list_neatly(
+            drivers, heading="Select a Driver", format_item=format_driver_summary
+        )
         driver_id = int(input("Enter driver ID: "))
         streets = get_all_streets()
         print_list_neatly(streets, heading="Available Streets")
         street_name = input("Enter street name: ")
         time_str = input("Enter the time (YYYY-MM-DD HH:MM): ")
-        click.echo(schedule_drive(driver_id, street_name, time_str))
+        duration = input_duration_minutes()
+        click.echo(schedule_drive(driver_id, street_name, time_str, duration))
     except Exception as e:
         click.echo(f"Error: {e}")
 
@@ -99,11 +159,15 @@ def schedule_drive_command():
 @driver_cli.command("view_requests", help="View stop requests for a driver")
 def view_stop_requests_command():
     try:
-        drivers = get_all_drivers_summary()
-        print_list_neatly(drivers, heading="Select a Driver")
+        drivers = get_all_drivers_summary_data()
+        print_list_neatly(
+            drivers, heading="Select a Driver", format_item=format_driver_summary
+        )
         driver_id = int(input("Enter driver ID: "))
         print_list_neatly(
-            get_stop_requests_for_driver(driver_id), heading="Stop Requests"
+            get_stop_requests_for_driver_data(driver_id)["requests"],
+            heading="Stop Requests",
+            format_item=format_stop_request,
         )
     except Exception as e:
         click.echo(f"Error: {e}")
@@ -112,8 +176,10 @@ def view_stop_requests_command():
 @driver_cli.command("update_status", help="Updates a driver's status and location")
 def update_driver_status_command():
     try:
-        drivers = get_all_drivers_summary()
-        print_list_neatly(drivers, heading="Select a Driver")
+        drivers = get_all_drivers_summary_data()
+        print_list_neatly(
+            drivers, heading="Select a Driver", format_item=format_driver_summary
+        )
         driver_id = int(input("Enter driver ID: "))
         new_status = input("Enter new status: ")
         new_location = input("Enter new location: ")
@@ -122,9 +188,148 @@ def update_driver_status_command():
         click.echo(f"Error: {e}")
 
 
+@driver_cli.command("route", help="Plans the stop order for a driver's day")
+def plan_route_command():
+    try:
+        drivers = get_all_drivers_summary_data()
+        print_list_neatly(
+            drivers, heading="Select a Driver", format_item=format_driver_summary
+        )
+        driver_id = int(input("Enter driver ID: "))
+        plan = plan_driver_route(driver_id)
+        stops = [
+            f"Drive ID: {drive['drive_id']} | Street: {drive['street']} | "
+            f"ETA: {stop['eta'].strftime('%I:%M %p') if stop['eta'] else 'Unknown'} | "
+            f"Resident: {stop['resident']} | Message: {stop['message']}"
+            for drive in plan["drives"]
+            for stop in drive["stops"]
+        ]
+        print_list_neatly(
+            stops or ["No stops to plan today"],
+            heading=f"Route ({plan['distance_km']} km)",
+        )
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
+
+@driver_cli.command(
+    "compact_history", help="Rolls old location history up into per-minute buckets"
+)
+def compact_history_command():
+    try:
+        compacted = compact_location_history()
+        click.echo(f"Compacted {compacted} location points.")
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
+
 app.cli.add_command(driver_cli)
 
 
+# ===========================================================
+# RECURRING SCHEDULE COMMANDS
+# ===========================================================
+schedule_cli = AppGroup("schedule", help="Recurring drive schedule commands")
+
+
+def select_driver_id():
+    drivers = get_all_drivers_summary_data()
+    print_list_neatly(drivers, heading="Select a Driver", format_item=format_driver_summary)
+    return int(input("Enter driver ID: "))
+
+
+@schedule_cli.command("create", help="Creates a weekly recurring drive")
+def create_schedule_command():
+    try:
+        driver_id = select_driver_id()
+        print_list_neatly(get_all_streets(), heading="Available Streets")
+        street_name = input("Enter street name: ")
+        weekdays = input("Enter weekdays (e.g. MO,WE,FR): ")
+        time_str = input("Enter the time (HH:MM): ")
+        ends_on = input("Enter the last date (YYYY-MM-DD, blank for none): ")
+        duration = input_duration_minutes()
+        schedule = create_drive_schedule(
+            driver_id,
+            street_name,
+            weekdays,
+            time_str,
+            ends_on=ends_on or None,
+            duration_minutes=duration,
+        )
+        click.echo(f"Schedule {schedule.id} created, drives planned until {schedule.materialized_until}.")
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
+
+@schedule_cli.command("list", help="Lists a driver's recurring drives")
+def list_schedules_command():
+    try:
+        driver_id = select_driver_id()
+        print_list_neatly(
+            get_drive_schedules_for_driver(driver_id),
+            heading="Recurring Drives",
+            format_item=format_schedule,
+        )
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
+
+@schedule_cli.command("update", help="Changes every future drive of a series")
+def update_schedule_command():
+    try:
+        driver_id = select_driver_id()
+        print_list_neatly(
+            get_drive_schedules_for_driver(driver_id),
+            heading="Select a Schedule",
+            format_item=format_schedule,
+        )
+        schedule_id = int(input("Enter schedule ID: "))
+        click.echo("Leave a field blank to keep it.")
+        weekdays = input("Enter weekdays (e.g. MO,WE,FR): ") or None
+        time_str = input("Enter the time (HH:MM): ") or None
+        street_name = input("Enter street name: ") or None
+        ends_on = input("Enter the last date (YYYY-MM-DD): ") or None
+        update_drive_schedule(
+            schedule_id,
+            driver_id,
+            weekdays=weekdays,
+            time_str=time_str,
+            street_name=street_name,
+            ends_on=ends_on,
+        )
+        click.echo(f"Schedule {schedule_id} updated.")
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
+
+@schedule_cli.command("cancel", help="Cancels a series and its future drives")
+def cancel_schedule_command():
+    try:
+        driver_id = select_driver_id()
+        print_list_neatly(
+            get_drive_schedules_for_driver(driver_id),
+            heading="Select a Schedule",
+            format_item=format_schedule,
+        )
+        schedule_id = int(input("Enter schedule ID: "))
+        removed = cancel_drive_schedule(schedule_id, driver_id)
+        click.echo(f"Schedule {schedule_id} cancelled, {removed} drives removed.")
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
+
+@schedule_cli.command(
+    "materialize", help="Creates the drives of every series over the horizon"
+)
+@click.option("--days", type=click.IntRange(min=1), default=None)
+def materialize_schedules_command(days):
+    created = materialize_drive_schedules(horizon_days=days)
+    click.echo(f"Created {created} drives.")
+
+
+app.cli.add_command(schedule_cli)
+
+
 # ===========================================================
 # RESIDENT COMMANDS
 # ===========================================================
@@ -147,16 +352,26 @@ def create_resident_command():
 
 @resident_cli.command("list", help="Lists residents in the database")
 def list_resident_command():
-    print_list_neatly(get_all_residents_summary(), heading="Available Residents")
+    print_list_neatly(
+        get_all_residents_summary_data(),
+        heading="Available Residents",
+        format_item=format_resident_summary,
+    )
 
 
 @resident_cli.command("inbox", help="Shows a resident's inbox")
 def resident_inbox_command():
     try:
-        residents = get_all_residents_summary()
-        print_list_neatly(residents, heading="Select a Resident")
+        residents = get_all_residents_summary_data()
+        print_list_neatly(
+            residents, heading="Select a Resident", format_item=format_resident_summary
+        )
         resident_id = int(input("Enter resident ID: "))
-        print_list_neatly(get_resident_inbox(resident_id), heading="Resident Inbox")
+        print_list_neatly(
+            get_resident_inbox_data(resident_id)["drives"],
+            heading="Resident Inbox",
+            format_item=format_inbox_drive,
+        )
     except Exception as e:
         click.echo(f"Error: {e}")
 
@@ -164,14 +379,16 @@ def resident_inbox_command():
 @resident_cli.command("request_stop", help="Request a stop for a drive")
 def request_stop_command():
     try:
-        residents = get_all_residents_summary()
-        print_list_neatly(residents, heading="Select a Resident")
+        residents = get_all_residents_summary_data()
+        print_list_neatly(
+            residents, heading="Select a Resident", format_item=format_resident_summary
+        )
         resident_id = int(input("Enter resident ID: "))
-        inbox = get_resident_inbox(resident_id)
-        if not inbox or "No upcoming drives" in inbox[0]:
+        drives = get_resident_inbox_data(resident_id)["drives"]
+        if not drives:
             click.echo("No drives available to request a stop for.")
             return
-        print_list_neatly(inbox, heading="Select a Drive")
+        print_list_neatly(drives, heading="Select a Drive", format_item=format_inbox_drive)
         drive_id = int(input("Enter drive ID: "))
         message = input("Enter request message: ")
         click.echo(request_stop(resident_id, drive_id, message))
@@ -182,8 +399,12 @@ def request_stop_command():
 @resident_cli.command("driver_status", help="Get a driver's status and location")
 def driver_status_and_location_command():
     try:
-        drivers = get_all_drivers_summary()
-        print_list_neatly(drivers, heading="Select a Driver to Check")
+        drivers = get_all_drivers_summary_data()
+        print_list_neatly(
+            drivers,
+            heading="Select a Driver to Check",
+            format_item=format_driver_summary,
+        )
         driver_id = int(input("Enter driver ID: "))
         status = get_driver_status_and_location(driver_id)
         click.echo("\n------ Driver Status ------")
@@ -196,6 +417,144 @@ def driver_status_and_location_command():
 app.cli.add_command(resident_cli)
 
 
+# ===========================================================
+# IMPORT COMMANDS
+# ===========================================================
+import_cli = AppGroup("import", help="Bulk import commands (CSV or JSONL)")
+
+
+def run_import(kind, file, fmt):
+    fmt = fmt or detect_import_format(filename=file.name)
+    report = import_file(kind, file, fmt)
+    for error in report["errors"]:
+        click.echo(f"Row {error['row']}: {'; '.join(error['errors'])}")
+    click.echo(
+        f"Imported {report['created']} {kind}, {len(report['errors'])} rows rejected."
+    )
+
+
+@import_cli.command("streets", help="Imports streets (columns: name, optional latitude and longitude)")
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(IMPORT_FORMATS), default=None)
+def import_streets_command(file, fmt):
+    run_import("streets", file, fmt)
+
+
+@import_cli.command(
+    "drivers",
+    help="Imports drivers (columns: username, password, status, current_location)",
+)
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(IMPORT_FORMATS), default=None)
+def import_drivers_command(file, fmt):
+    run_import("drivers", file, fmt)
+
+
+@import_cli.command(
+    "residents", help="Imports residents (columns: username, password, street_name)"
+)
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(IMPORT_FORMATS), default=None)
+def import_residents_command(file, fmt):
+    run_import("residents", file, fmt)
+
+
+app.cli.add_command(import_cli)
+
+
+# ===========================================================
+# PERFORMANCE COMMANDS
+# ===========================================================
+perf_cli = AppGroup("perf", help="Performance measurement commands")
+
+
+@perf_cli.command(
+    "serialization",
+    help="Times list queries to JSON: ORM objects with get_json vs projected rows",
+)
+@click.option("--repeat", default=5, type=click.IntRange(min=1))
+def perf_serialization_command(repeat):
+    report = compare_list_serialization(repeat)
+    click.echo(f"{'list':<15}{'rows':>8}{'orm ms':>12}{'projected ms':>15}{'speedup':>10}")
+    for name, timing in report.items():
+        click.echo(
+            f"{name:<15}{timing['rows']:>8}{timing['orm_ms']:>12}"
+            f"{timing['projected_ms']:>15}{str(timing['speedup']) + 'x':>10}"
+        )
+
+
+def parse_scenario_weights(ctx, param, values):
+    scenarios = dict(DEFAULT_SCENARIOS)
+    for value in values:
+        name, _, weight = value.partition("=")
+        if name not in scenarios or not weight.isdigit():
+            raise click.BadParameter(
+                f"expected NAME=WEIGHT with NAME one of {', '.join(scenarios)}"
+            )
+        scenarios[name] = (int(weight), scenarios[name][1])
+    return {name: s for name, s in scenarios.items() if s[0]}
+
+
+@perf_cli.command(
+    "load",
+    help="Replays the Postman collection as weighted scenarios under load and "
+    "reports latency percentiles and requests per second as JSON",
+)
+@click.option("--url", default=None, help="Running server to load, e.g. a local gunicorn (default: this app's test client)")
+@click.option("--collection", default=DEFAULT_COLLECTION, type=click.Path(exists=True, dir_okay=False))
+@click.option("--concurrency", default=4, type=click.IntRange(min=1))
+@click.option("--requests", "total", default=None, type=click.IntRange(min=1), help="Scenarios to run in total")
+@click.option("--duration", default=None, type=click.FloatRange(min=0, min_open=True), help="Seconds to run for")
+@click.option("--scenario", multiple=True, callback=parse_scenario_weights, help="Override a weight, e.g. inbox=80 (0 disables)")
+@click.option("--seed", default=None, type=int)
+@click.option("--output", default=None, type=click.File("w"), help="Write the report here instead of stdout")
+def perf_load_command(url, collection, concurrency, total, duration, scenario, seed, output):
+    if total is None and duration is None:
+        total = 1000
+    target = HTTPTarget(url) if url else AppTarget(app)
+    report = run_load_test(
+        target,
+        collection,
+        scenario,
+        concurrency=concurrency,
+        total=total,
+        duration=duration,
+        seed=seed,
+    )
+    click.echo(json.dumps(report, indent=2), file=output)
+
+
+@perf_cli.command(
+    "slow-queries",
+    help="Summarizes the slow-query log: the worst statements by total time, "
+    "with the controllers that ran them and their EXPLAIN plans",
+)
+@click.option("--log", "path", default=None, type=click.Path(dir_okay=False), help="Slow-query log to read (default: SLOW_QUERY_LOG)")
+@click.option("--limit", default=10, type=click.IntRange(min=1))
+@click.option("--json", "as_json", is_flag=True, help="Print the summary as JSON")
+def perf_slow_queries_command(path, limit, as_json):
+    path = path or slow_query_log_path(app)
+    if not path or not os.path.exists(path):
+        click.echo(f"No slow-query log at {path}; nothing has been slower than the threshold")
+        return
+    worst = summarize_slow_queries(read_slow_queries(path), limit)
+    if as_json:
+        click.echo(json.dumps(worst, indent=2))
+        return
+    click.echo(f"{'total ms':>12}{'count':>8}{'mean ms':>10}{'max ms':>10}  controllers")
+    for summary in worst:
+        click.echo(
+            f"{summary['total_ms']:>12}{summary['count']:>8}{summary['mean_ms']:>10}"
+            f"{summary['max_ms']:>10}  {', '.join(summary['controllers']) or '-'}"
+        )
+        click.echo(f"    {summary['statement'][:200]}")
+        for line in summary["plan"] or ():
+            click.echo(f"      {line}")
+
+
+app.cli.add_command(perf_cli)
+
+
 # ===========================================================
 # TEST COMMANDS
 # ===========================================================
@@ -228,19 +587,32 @@ def run_integration_tests_command():
     sys.exit(exit_code)
 
 
+@test.command("benchmarks", help="Run the controller benchmarks against seeded data")
+@click.option("--scales", default="1000", help="Comma separated seed scales, e.g. 1000,100000,1000000")
+@click.option("--update-baselines", is_flag=True, help="Store this run's medians as the baselines")
+def run_benchmarks_command(scales, update_baselines):
+    """Runs pytest on test_benchmarks.py, which compares each case with its stored baseline."""
+    print(f"Running benchmarks at scales {scales}...")
+    os.environ["BENCHMARK_SCALES"] = scales
+    if update_baselines:
+        os.environ["BENCHMARK_UPDATE_BASELINES"] = "1"
+    exit_code = pytest.main(["App/tests/test_benchmarks.py"])
+    sys.exit(exit_code)
+
+
 app.cli.add_command(test)
 
 
 # ===========================================================
 # UTILITY
 # ===========================================================
-def print_list_neatly(items, heading="Items"):
+def print_list_neatly(items, heading="Items", format_item=str):
     if not items:
         click.echo(f"\n--- {heading.strip()} ---")
         click.echo("No items to display.")
         click.echo("-" * (len(heading) + 4) + "\n")
         return
-    item_strings = [str(item) for item in items]
+    item_strings = [format_item(item) for item in items]
     max_item_length = max(len(s) for s in item_strings)
     heading_length = max(len(heading), max_item_length, 30)
     print("\n" + heading.center(heading_length, "-"))